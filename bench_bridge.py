@@ -0,0 +1,420 @@
+#!/usr/bin/env python
+
+# Round-trip latency and throughput of the R <-> Python bridge
+# -----------------------------------------------------------------------------
+# Drives the request patterns the examples use, against a Python stand-in
+# for the R peer (no R needed), for every payload size and transport:
+#
+#   stats     bare float64 array -> JSON stats reply   (Example 1)
+#   envelope  envelope data field -> envelope stats      (send_data_to_r)
+#   json      JSON request with a data list -> JSON      (JSON command path)
+#   pubsub    Pub0 -> Sub0 one-way, timestamped frames   (Examples 2 and 5)
+#   pair      Pair0 echo                                  (Example 3)
+#
+# Transports are tcp://, ipc:// and inproc://. The peer runs in a separate
+# process for tcp and ipc and in a thread for inproc (which cannot cross a
+# process boundary). Payload sizes default to 8 B .. 512 MB.
+#
+# Results are JSON: per (pattern, transport, size) the p50/p95/p99 latency
+# in microseconds, messages/s and MB/s of payload, with run metadata. For
+# pubsub the rates count delivered frames over the subscriber's receive
+# window (Pub/Sub drops frames a lagging subscriber has no room for), with
+# the fraction delivered and the publish rate alongside.
+# Use --iterations for fixed iteration counts, so runs are comparable, and
+# --compare to flag regressions against an earlier result file.
+#
+#   python bench_bridge.py --max-size 16M --out bench.json
+#   python bench_bridge.py --patterns stats,pair --transports ipc --compare bench.json
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pynng
+
+import envelope
+from stats_server import compute_stats, handle_request
+
+PATTERNS = ("stats", "envelope", "json", "pubsub", "pair")
+TRANSPORTS = ("tcp", "ipc", "inproc")
+DEFAULT_SIZES = [8 * 8 ** i for i in range(9)] + [512 * 1024 ** 2]  # 8 B .. 128 MB, 512 MB
+JSON_MAX_SIZE = 16 * 1024 ** 2  # JSON text of larger arrays takes minutes and GBs
+
+STOP = b"__stop__"
+TOPIC = b"bench\0"
+END_TOPIC = b"end\0"
+HELLO_TOPIC = b"hello\0"  # repeated until the subscriber is connected
+PROBE_TOPIC = b"probe\0"  # not subscribed: sizes the run without reaching the subscriber
+TIMESTAMP = struct.Struct("<d")
+
+
+def parse_size(text):
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def format_size(n):
+    for unit, scale in (("G", 1024 ** 3), ("M", 1024 ** 2), ("K", 1024)):
+        if n >= scale and n % scale == 0:
+            return f"{n // scale}{unit}"
+    return f"{n}B"
+
+
+def make_address(transport, name, port):
+    if transport == "tcp":
+        return f"tcp://127.0.0.1:{port}"
+    if transport == "ipc":
+        return f"ipc:///tmp/nng_bench_{name}_{os.getpid()}"
+    return f"inproc://bench_{name}"
+
+
+# -- stand-in peer -------------------------------------------------------------
+
+def serve_reqrep(pattern, address, ready):
+    socket = pynng.Rep0(listen=address)
+    socket.recv_max_size = 0
+    ready.set()
+    while True:
+        raw_data = socket.recv()
+        if raw_data == STOP:
+            socket.send(STOP)
+            break
+        if pattern == "json":
+            request = json.loads(raw_data)
+            reply = json.dumps(compute_stats(np.asarray(request["data"], dtype=np.float64))).encode()
+        else:
+            reply = handle_request(raw_data)  # envelope or bare float64, like the R server
+        socket.send(reply)
+    socket.close()
+
+
+def serve_pair(address, ready):
+    socket = pynng.Pair0(listen=address)
+    socket.recv_max_size = 0
+    ready.set()
+    while True:
+        raw_data = socket.recv()
+        socket.send(raw_data)
+        if raw_data == STOP:
+            break
+    socket.close()
+
+
+def serve_sub(pub_address, control_address, ready):
+    """Subscribe, record one-way latencies, hand them back over a control socket"""
+    sub = pynng.Sub0(recv_buffer_size=1024)
+    sub.recv_max_size = 0
+    sub.dial(pub_address, block=False)  # the publisher may not be listening yet
+    for topic in (TOPIC, END_TOPIC, HELLO_TOPIC):
+        sub.subscribe(topic)
+    control = pynng.Rep0(listen=control_address)
+    ready.set()
+
+    while True:
+        command = control.recv()
+        if command == STOP:
+            control.send(STOP)
+            break
+
+        # "run": confirm once the publisher's hellos arrive, record frames
+        # until the end marker, then reply with the latencies
+        while not sub.recv().startswith(HELLO_TOPIC):
+            pass
+        control.send(b"ok")
+        latencies = []
+        last = float("nan")
+        while True:
+            frame = sub.recv()
+            now = time.perf_counter()
+            if frame.startswith(END_TOPIC):
+                break
+            if frame.startswith(TOPIC):
+                latencies.append(now - TIMESTAMP.unpack_from(frame, len(TOPIC))[0])
+                last = now
+        control.recv()
+        # Time of the last frame, then the latencies (never an empty message)
+        control.send(np.asarray([last] + latencies, dtype=np.float64).tobytes())
+
+    control.close()
+    sub.close()
+
+
+def start_peer(pattern, address, control_address, in_process):
+    """Start the stand-in peer; returns a join() callable"""
+    if pattern == "pair":
+        target, args = serve_pair, (address,)
+    elif pattern == "pubsub":
+        target, args = serve_sub, (address, control_address)
+    else:
+        target, args = serve_reqrep, (pattern, address)
+
+    if in_process:
+        ready = threading.Event()
+        worker = threading.Thread(target=target, args=args + (ready,), daemon=True)
+    else:
+        # spawn, not fork: the parent already has nng's I/O threads running
+        context = multiprocessing.get_context("spawn")
+        ready = context.Event()
+        worker = context.Process(target=target, args=args + (ready,), daemon=True)
+    worker.start()
+    if not ready.wait(10):
+        raise RuntimeError(f"{pattern} peer did not start on {address}")
+    return worker
+
+
+# -- client side ---------------------------------------------------------------
+
+def make_payload(pattern, size, rng):
+    values = rng.random(max(1, size // 8))
+    if pattern == "stats":
+        return values.tobytes()
+    if pattern == "envelope":
+        return envelope.encode(envelope.MSG_DATA, {"data": values})
+    if pattern == "json":
+        return json.dumps({"action": "stats", "data": values.tolist()}).encode()
+    if pattern == "pubsub":
+        return TOPIC + bytes(max(size, TIMESTAMP.size))
+    return bytes(size)
+
+
+def iteration_count(first_round_trip, budget, fixed, min_iterations, max_iterations):
+    if fixed:
+        return fixed
+    estimate = int(budget / max(first_round_trip, 1e-9))
+    return max(min_iterations, min(max_iterations, estimate))
+
+
+def time_roundtrips(socket, payload, args):
+    """Warm up, then time iterations of send + recv; returns (latencies, elapsed)"""
+    start = time.perf_counter()
+    socket.send(payload)
+    socket.recv()
+    iterations = iteration_count(time.perf_counter() - start, args.budget, args.iterations,
+                                 args.min_iterations, args.max_iterations)
+
+    for _ in range(min(args.warmup, iterations)):
+        socket.send(payload)
+        socket.recv()
+
+    latencies = np.empty(iterations)
+    begin = time.perf_counter()
+    for i in range(iterations):
+        start = time.perf_counter()
+        socket.send(payload)
+        socket.recv()
+        latencies[i] = time.perf_counter() - start
+    return latencies, time.perf_counter() - begin
+
+
+def request_while_publishing(pub, control, request, frame):
+    """Send a control request, publishing `frame` every 20 ms until it is answered"""
+    control.send(request)
+    done = threading.Event()
+
+    def publish():
+        while not done.wait(0.02):
+            pub.send(frame)
+
+    publisher = threading.Thread(target=publish, daemon=True)
+    publisher.start()
+    reply = control.recv()
+    done.set()
+    publisher.join()
+    return reply
+
+
+def time_pubsub(pub, control, payload, args):
+    """Publish timestamped frames; the subscriber reports one-way latencies
+
+    Returns (latencies, receive window, publish time, frames sent); the
+    window runs from the first send to the last frame received (perf_counter
+    is system-wide, as the latencies already assume).
+    """
+    buffer = bytearray(payload)
+    probe = time.perf_counter()
+    pub.send(PROBE_TOPIC + bytes(buffer[len(TOPIC):]))
+    iterations = iteration_count(time.perf_counter() - probe, args.budget, args.iterations,
+                                 args.min_iterations, args.max_iterations)
+
+    # Slow joiner: the run starts once the subscriber has seen a hello
+    request_while_publishing(pub, control, b"run", HELLO_TOPIC)
+    begin = time.perf_counter()
+    for _ in range(iterations):
+        TIMESTAMP.pack_into(buffer, len(TOPIC), time.perf_counter())
+        pub.send(bytes(buffer))
+    elapsed = time.perf_counter() - begin
+
+    reply = np.frombuffer(request_while_publishing(pub, control, b"latencies", END_TOPIC),
+                          dtype=np.float64)
+    return reply[1:], reply[0] - begin, elapsed, iterations
+
+
+def run_case(pattern, transport, size, port, args):
+    name = f"{pattern}_{transport}"
+    address = make_address(transport, name, port)
+    control_address = make_address(transport, name + "_ctl", port + 1)
+    payload = make_payload(pattern, size, np.random.default_rng(args.seed))
+    peer = start_peer(pattern, address, control_address, in_process=transport == "inproc")
+
+    sent = iterations = None
+    try:
+        if pattern == "pubsub":
+            pub = pynng.Pub0(listen=address)
+            control = pynng.Req0(dial=control_address)
+            latencies, elapsed, published, sent = time_pubsub(pub, control, payload, args)
+            control.send(STOP)
+            control.recv()
+            control.close()
+            pub.close()
+        else:
+            socket = pynng.Pair0(dial=address) if pattern == "pair" else pynng.Req0(dial=address)
+            socket.recv_max_size = 0
+            latencies, elapsed = time_roundtrips(socket, payload, args)
+            socket.send(STOP)
+            socket.recv()
+            socket.close()
+    finally:
+        peer.join(timeout=10)
+
+    iterations = len(latencies)
+    if not iterations:
+        elapsed = float("inf")  # nothing arrived: no receive window
+    result = {
+        "pattern": pattern,
+        "transport": transport,
+        "size": size,
+        "wire_bytes": len(payload),
+        "iterations": iterations,
+        "p50_us": float(np.percentile(latencies, 50) * 1e6) if iterations else None,
+        "p95_us": float(np.percentile(latencies, 95) * 1e6) if iterations else None,
+        "p99_us": float(np.percentile(latencies, 99) * 1e6) if iterations else None,
+        "mean_us": float(latencies.mean() * 1e6) if iterations else None,
+        "msgs_per_s": iterations / elapsed,
+        "mb_per_s": iterations * size / elapsed / 1e6
+    }
+    if sent is not None:
+        result["delivered"] = iterations / sent  # Pub/Sub drops when the subscriber lags
+        result["published_per_s"] = sent / published
+    return result
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit or None,
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pynng": getattr(pynng, "__version__", None),
+        "iterations": args.iterations,
+        "budget": args.budget,
+        "seed": args.seed
+    }
+
+
+def compare(results, baseline_path, threshold):
+    """Print cases that got slower than the baseline by more than threshold %
+
+    For pubsub a drop in the fraction of frames delivered counts too.
+    """
+    with open(baseline_path) as f:
+        baseline = {(r["pattern"], r["transport"], r["size"]): r for r in json.load(f)["results"]}
+
+    regressions = 0
+    for r in results:
+        old = baseline.get((r["pattern"], r["transport"], r["size"]))
+        if old is None or "skipped" in r or "skipped" in old or not old["iterations"]:
+            continue
+        label = f"REGRESSION {r['pattern']:<9}{r['transport']:<7}{format_size(r['size']):>6}  "
+        delivered = ""
+        lost = 0.0
+        if "delivered" in r and "delivered" in old:
+            lost = 100 * (1 - r["delivered"] / old["delivered"])
+            delivered = f", delivered {old['delivered']:.0%} -> {r['delivered']:.0%}"
+        if not r["iterations"]:
+            regressions += 1
+            print(f"{label}nothing arrived{delivered}", file=sys.stderr)
+            continue
+        p50 = 100 * (r["p50_us"] / old["p50_us"] - 1)
+        rate = 100 * (1 - r["msgs_per_s"] / old["msgs_per_s"])
+        if p50 > threshold or rate > threshold or lost > threshold:
+            regressions += 1
+            print(f"{label}p50 {old['p50_us']:.1f} -> {r['p50_us']:.1f} us ({p50:+.0f}%), "
+                  f"msgs/s {old['msgs_per_s']:.0f} -> {r['msgs_per_s']:.0f}{delivered}", file=sys.stderr)
+    print(f"{regressions} regression(s) over {threshold:.0f}% against {baseline_path}", file=sys.stderr)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="R-Python bridge latency/throughput benchmark")
+    parser.add_argument("--patterns", default=",".join(PATTERNS))
+    parser.add_argument("--transports", default=",".join(TRANSPORTS))
+    parser.add_argument("--sizes", default=None,
+                        help="comma-separated payload sizes, e.g. 8,4K,1M (default 8B..512M)")
+    parser.add_argument("--max-size", default=None, help="drop default sizes above this")
+    parser.add_argument("--iterations", type=int, default=0,
+                        help="fixed iterations per case (default: fill --budget)")
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds per case")
+    parser.add_argument("--min-iterations", type=int, default=5)
+    parser.add_argument("--max-iterations", type=int, default=10000)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=5600, help="first tcp port to use")
+    parser.add_argument("--out", default=None, help="write JSON here (default: stdout)")
+    parser.add_argument("--compare", default=None, help="earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=20.0, help="regression threshold in %%")
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(s) for s in args.sizes.split(",")] if args.sizes else DEFAULT_SIZES
+    if args.max_size:
+        sizes = [s for s in sizes if s <= parse_size(args.max_size)]
+
+    results = []
+    port = args.port
+    for pattern in args.patterns.split(","):
+        for transport in args.transports.split(","):
+            for size in sizes:
+                if pattern == "json" and size > JSON_MAX_SIZE:
+                    results.append({"pattern": pattern, "transport": transport, "size": size,
+                                    "skipped": f"JSON payloads are capped at {format_size(JSON_MAX_SIZE)}"})
+                    continue
+                result = run_case(pattern, transport, size, port, args)
+                port += 2
+                results.append(result)
+                if result["iterations"]:
+                    print(f"{pattern:<9}{transport:<7}{format_size(size):>6}  "
+                          f"p50 {result['p50_us']:>11.1f} us  p99 {result['p99_us']:>11.1f} us  "
+                          f"{result['msgs_per_s']:>10.1f} msg/s  {result['mb_per_s']:>9.1f} MB/s"
+                          + (f"  delivered {result['delivered']:.0%}" if "delivered" in result else ""),
+                          file=sys.stderr)
+
+    report = json.dumps({"meta": metadata(args), "results": results}, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+    if args.compare:
+        sys.exit(1 if compare(results, args.compare, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+# JSON records vs columnar replies for the same filtered DataFrame
+# -----------------------------------------------------------------------------
+# Builds an Example 6 style table (id, value, category, label, timestamp),
+# filters it with the filter_data predicates and times encoding the reply
+# envelope plus decoding it back into a DataFrame, for both formats.
+#
+#   python bench_columnar.py --rows 1000000 --repeat 5
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import columnar
+import envelope
+from csv_filter import build_mask, normalize_filters
+
+
+def sample_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "id": np.arange(1, rows + 1),
+        "value": rng.normal(50, 15, rows),
+        "category": rng.choice(["A", "B", "C"], rows),
+        "label": np.char.add("item_", rng.integers(0, 5000, rows).astype(str)),
+        # As read back by pd.read_csv (filter_data serves parsed CSV files)
+        "timestamp": pd.date_range("2024-01-01", periods=rows, freq="s").astype(str)
+    })
+
+
+def best_of(repeat, fn):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def bench(df, fmt, repeat):
+    encode = lambda: envelope.pack_reply({"status": "success", "data": columnar.table(df, fmt)}, True)
+    encode_s, reply = best_of(repeat, encode)
+
+    if fmt == "json":
+        decode = lambda: pd.DataFrame(envelope.decode(reply).fields["data"])
+    else:
+        decode = lambda: columnar.decode_frame(envelope.decode(reply).fields["data"])
+    decode_s, _ = best_of(repeat, decode)
+
+    return {"format": fmt, "bytes": len(reply), "encode_ms": encode_s * 1000,
+            "decode_ms": decode_s * 1000}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON vs columnar DataFrame replies")
+    parser.add_argument("--rows", type=int, default=1000000, help="rows before filtering")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (best is kept)")
+    args = parser.parse_args(argv)
+
+    df = sample_frame(args.rows)
+    filters = {"value": {"op": "between", "value": [40, 60]}, "category": {"op": "in", "value": ["A", "B"]}}
+    filtered = df[build_mask(df, normalize_filters(filters, df.columns))]
+    print(f"Filtered {len(filtered):,} of {len(df):,} rows\n")
+
+    results = [bench(filtered, fmt, args.repeat) for fmt in columnar.FORMATS]
+    print(f"{'format':<10}{'size MB':>10}{'encode ms':>12}{'decode ms':>12}")
+    for r in results:
+        print(f"{r['format']:<10}{r['bytes'] / 1e6:>10.2f}{r['encode_ms']:>12.1f}{r['decode_ms']:>12.1f}")
+
+    json_r, col_r = results
+    print(f"\ncolumnar is {json_r['bytes'] / col_r['bytes']:.1f}x smaller, "
+          f"{(json_r['encode_ms'] + json_r['decode_ms']) / (col_r['encode_ms'] + col_r['decode_ms']):.1f}x "
+          f"faster end to end")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+# Socket copies vs shared-memory descriptors for Example 3 sized arrays
+# -----------------------------------------------------------------------------
+# A peer process plays the Example 3 processor on a Pair0 ipc:// socket: it
+# receives a float64 array, doubles it and sends the result back. The same
+# round trip is timed with the arrays inside the envelope ("socket") and
+# with shared-memory descriptors ("shm", shm_transport.py), where both sides
+# write into pooled /dev/shm segments and read each other's in place.
+#
+#   python bench_shm.py --sizes-mb 1 16 128 512 --repeat 5
+import argparse
+import multiprocessing
+import statistics
+import time
+
+import numpy as np
+import pynng
+
+import envelope
+from shm_transport import SegmentPool, ShmChannel
+
+ADDRESS = "ipc:///tmp/rpy_bench_shm"
+MODES = ("socket", "shm")
+
+
+def serve_peer(address):
+    pool = SegmentPool()
+    channel = ShmChannel(pool, threshold=0)
+    with pynng.Pair0(listen=address, recv_max_size=0) as socket:
+        while True:
+            raw_data = socket.recv()
+            channel.complete()
+            message = envelope.decode(raw_data)
+            if message.msg_type == envelope.MSG_CONTROL:
+                break
+            fields, via_shm = channel.unpack(message.fields)
+            data = fields["data"]
+            if via_shm:
+                # Write the result straight into our own segment
+                segment, doubled = pool.empty(data.shape, data.dtype)
+                np.multiply(data, 2, out=doubled)
+                reply = {"data": channel.share(segment, doubled)}
+            else:
+                reply = {"data": data * 2}
+            socket.send(envelope.result(**reply))
+    pool.close()
+
+
+def round_trip(socket, channel, data, mode):
+    fields = channel.pack({"data": data}) if mode == "shm" else {"data": data}
+    socket.send(envelope.encode(envelope.MSG_DATA, fields))
+    reply = envelope.decode(socket.recv())
+    result, _ = channel.unpack(reply.fields)
+    checksum = float(result["data"][-1])  # touch the reply
+    channel.complete()
+    return checksum
+
+
+def bench(socket, channel, size_mb, mode, repeat):
+    data = np.random.default_rng(0).random(int(size_mb * 1e6) // 8)
+    round_trip(socket, channel, data, mode)  # warm-up: maps segments, sizes buffers
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        checksum = round_trip(socket, channel, data, mode)
+        times.append(time.perf_counter() - start)
+    assert checksum == data[-1] * 2
+    return {"mode": mode, "size_mb": size_mb, "median_ms": statistics.median(times) * 1000,
+            "best_ms": min(times) * 1000}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Socket vs shared-memory array transport")
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 16, 128, 512])
+    parser.add_argument("--repeat", type=int, default=5, help="timed round trips per size")
+    parser.add_argument("--address", default=ADDRESS)
+    args = parser.parse_args(argv)
+
+    peer = multiprocessing.get_context("spawn").Process(target=serve_peer, args=(args.address,))
+    peer.start()
+    pool = SegmentPool()
+    channel = ShmChannel(pool, threshold=0)
+    socket = pynng.Pair0(recv_max_size=0)
+    socket.dial(args.address, block=False)
+
+    try:
+        print(f"{'size MB':>8}{'mode':>8}{'median ms':>12}{'best ms':>10}{'GB/s':>8}")
+        for size_mb in args.sizes_mb:
+            for mode in MODES:
+                r = bench(socket, channel, size_mb, mode, args.repeat)
+                rate = 2 * size_mb / 1000 / (r["median_ms"] / 1000)  # both directions
+                print(f"{size_mb:>8g}{mode:>8}{r['median_ms']:>12.2f}{r['best_ms']:>10.2f}{rate:>8.2f}")
+        print(f"\nsegment pool: {pool.stats()}")
+    finally:
+        socket.send(envelope.encode(envelope.MSG_CONTROL, {"action": "shutdown"}))
+        peer.join(timeout=10)
+        socket.close()
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+# Startup time and memory of every from_p.py server subcommand
+# -----------------------------------------------------------------------------
+# Each subcommand is started in a fresh interpreter on a private address,
+# once lazily and once with --preload. The benchmark dials it until the
+# listener answers ("listen" = time from exec to accepting connections) and
+# then reads the process's resident set size from /proc (Linux). Every
+# server is stopped with SIGINT before the next one starts.
+#
+#   python bench_startup.py --repeat 3
+#   python bench_startup.py --commands stats ml --out startup.json
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pynng
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# subcommand -> (extra arguments, address to dial, socket to dial it with)
+COMMANDS = {
+    "stats": (["--listen", "tcp://127.0.0.1:5655"], "tcp://127.0.0.1:5655", pynng.Req0),
+    "pub": (["--listen", "tcp://127.0.0.1:5658"], "tcp://127.0.0.1:5658", pynng.Sub0),
+    "pipeline": (["--listen", "ipc:///tmp/rpy_bench_pipeline"], "ipc:///tmp/rpy_bench_pipeline",
+                 pynng.Pair0),
+    "ml": (["--listen", "tcp://127.0.0.1:5657"], "tcp://127.0.0.1:5657", pynng.Req0),
+    "files": (["--listen", "ipc:///tmp/rpy_bench_files"], "ipc:///tmp/rpy_bench_files", pynng.Req0),
+}
+
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def wait_listening(socket_type, address, process, timeout):
+    """Seconds until a dial to address succeeds"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        with socket_type() as socket:
+            try:
+                socket.dial(address, block=True)
+                return time.perf_counter() - start
+            except pynng.exceptions.ConnectionRefused:
+                pass
+        time.sleep(0.005)
+    raise TimeoutError(f"nothing listening on {address} after {timeout}s")
+
+
+def measure(command, preload, workdir, timeout=60.0):
+    extra, address, socket_type = COMMANDS[command]
+    argv = [sys.executable, os.path.join(HERE, "from_p.py")]
+    argv += ["--preload"] if preload else []
+    argv += [command] + extra
+    if command == "pipeline":
+        argv += ["--pipelines", os.path.join(workdir, "pipelines")]
+
+    start = time.perf_counter()
+    process = subprocess.Popen(argv, cwd=workdir, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, env=dict(os.environ, PYTHONPATH=HERE))
+    try:
+        wait_listening(socket_type, address, process, timeout)
+        listen = time.perf_counter() - start
+        rss = rss_mb(process.pid)
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    return listen, rss
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="from_p.py subcommand startup time and RSS")
+    parser.add_argument("--commands", nargs="+", choices=sorted(COMMANDS), default=list(COMMANDS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default=None, help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'command':<10}{'mode':<9}{'listen ms':>11}{'RSS MB':>9}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for command in args.commands:
+            for preload in (False, True):
+                runs = [measure(command, preload, workdir) for _ in range(args.repeat)]
+                row = {
+                    "command": command,
+                    "mode": "preload" if preload else "lazy",
+                    "listen_ms": statistics.median(r[0] for r in runs) * 1000,
+                    "rss_mb": statistics.median(r[1] for r in runs)
+                }
+                results.append(row)
+                print(f"{command:<10}{row['mode']:<9}{row['listen_ms']:>11.0f}{row['rss_mb']:>9.1f}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
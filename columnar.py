@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+# Columnar binary encoding for DataFrame replies
+# -----------------------------------------------------------------------------
+# A frame is written as its own envelope (envelope.py) with one contiguous
+# typed buffer per column and a JSON schema field describing them:
+#
+#   schema   {"rows": n, "columns": [{"name", "type"}, ...]}
+#   c<i>     column i values
+#   c<i>.dict  dictionary for string / category columns (c<i> holds the codes)
+#   c<i>.valid validity mask of nullable Int64 / boolean columns (False = NA)
+#
+#   type      buffer                         missing values
+#   float     f8 or f4                       NaN
+#   int       i4 or i8                       c<i>.valid (nullable Int64 etc.)
+#   bool      bool                           c<i>.valid (nullable boolean)
+#   datetime  i8 nanoseconds since epoch     INT64_MIN (NaT)
+#   string    i4 codes into a STR dict       code -1
+#   category  i4 codes into a STR dict       code -1
+#
+# Replies carry the encoded frame as a u1 field, so a request picks the
+# encoding with `format = "columnar"` and JSON records stay the default.
+# columnar.R is the matching R decoder (read_frame()).
+import numpy as np
+
+import envelope
+from lazy_imports import lazy_import
+
+pd = lazy_import("pandas")  # imported by the first request, not at startup
+
+FORMATS = ("json", "columnar")
+
+
+def _encode_column(series):
+    """(type, values, dictionary or None, validity mask or None) for one column"""
+    dtype = series.dtype
+    types = pd.api.types
+
+    if isinstance(dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy().astype("<i4")
+        return "category", codes, [str(c) for c in dtype.categories], None
+    if types.is_extension_array_dtype(dtype) and types.is_float_dtype(dtype):
+        return "float", series.to_numpy(dtype="<f8", na_value=np.nan), None, None
+    if types.is_extension_array_dtype(dtype) and types.is_bool_dtype(dtype):
+        return "bool", series.to_numpy(dtype=bool, na_value=False), None, series.notna().to_numpy()
+    if types.is_extension_array_dtype(dtype) and types.is_integer_dtype(dtype):
+        return "int", series.to_numpy(dtype="<i8", na_value=0), None, series.notna().to_numpy()
+    if types.is_bool_dtype(dtype):
+        return "bool", series.to_numpy(dtype=bool), None, None
+    if types.is_float_dtype(dtype):
+        return "float", series.to_numpy(), None, None
+    if types.is_integer_dtype(dtype):
+        values = series.to_numpy()
+        if values.dtype not in (np.dtype("i4"), np.dtype("i8")):
+            values = values.astype("<i8")
+        return "int", values, None, None
+    if types.is_datetime64_any_dtype(dtype):
+        # tz-aware columns go as UTC
+        values = series.dt.tz_convert("UTC").dt.tz_localize(None) if series.dt.tz else series
+        return "datetime", values.to_numpy(dtype="datetime64[ns]").view("<i8"), None, None
+
+    # object / string columns (and anything without a typed buffer) are dictionary-encoded
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    return "string", codes.astype("<i4"), [str(u) for u in uniques], None
+
+
+def encode_frame(df, index=False):
+    """Encode a DataFrame as a columnar envelope (index=True keeps the index as a column)"""
+    if index:
+        df = df.reset_index()
+
+    schema = {"rows": len(df), "columns": []}
+    fields = {"schema": schema}
+    for i, name in enumerate(df.columns):
+        kind, values, dictionary, valid = _encode_column(df.iloc[:, i])
+        schema["columns"].append({"name": str(name), "type": kind})
+        fields[f"c{i}"] = np.ascontiguousarray(values)
+        if dictionary is not None:
+            fields[f"c{i}.dict"] = dictionary
+        if valid is not None:
+            fields[f"c{i}.valid"] = np.ascontiguousarray(valid)
+    return envelope.encode(envelope.MSG_DATA, fields)
+
+
+def decode_frame(buf):
+    """Decode a columnar envelope back into a DataFrame"""
+    fields = envelope.decode(buf).fields
+    schema = fields["schema"]
+
+    columns = {}
+    for i, column in enumerate(schema["columns"]):
+        values = np.asarray(fields[f"c{i}"]).reshape(-1)
+        kind = column["type"]
+        if kind in ("string", "category"):
+            dictionary = np.asarray(fields[f"c{i}.dict"], dtype=object).reshape(-1)
+            if kind == "string":
+                # Missing values come back as None
+                values = np.append(dictionary, None)[values]
+            else:
+                values = pd.Categorical.from_codes(values, dictionary)
+        elif kind == "datetime":
+            values = values.view("datetime64[ns]")
+        elif f"c{i}.valid" in fields:
+            missing = ~np.asarray(fields[f"c{i}.valid"], dtype=bool).reshape(-1)
+            masked = pd.arrays.BooleanArray if kind == "bool" else pd.arrays.IntegerArray
+            values = masked(values.copy(), missing)
+        columns[column["name"]] = values
+    return pd.DataFrame(columns, index=pd.RangeIndex(schema["rows"]))
+
+
+def table(df, fmt="json", index=False):
+    """A DataFrame as a reply field: JSON records, or a columnar u1 buffer"""
+    if fmt == "json":
+        return df.reset_index().to_dict("records") if index else df.to_dict("records")
+    if fmt == "columnar":
+        return np.frombuffer(encode_frame(df, index=index), dtype=np.uint8)
+    raise ValueError(f"Unknown format: {fmt} (expected one of {', '.join(FORMATS)})")
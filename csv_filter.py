@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+
+# Streaming filter engine with paged cursors for filter_data (Example 6)
+# -----------------------------------------------------------------------------
+# The CSV is read in chunks of `chunk_rows` rows (only the projected and
+# filtered columns are parsed). All predicates are combined into one
+# vectorized boolean mask per chunk. Matching rows are handed out in pages
+# of `page_size` rows: the first page comes back as soon as enough rows have
+# matched, together with a cursor id, and `next_page` continues the scan
+# from where it stopped. Server memory is bounded by one chunk plus one page.
+#
+#   filters = {col: {op, value}} or {col: [{op, value}, ...]}
+#   ops     : gt, lt, ge, le, eq, ne, between ([lo, hi], inclusive), in ([...])
+#   columns : optional projection (list of output columns)
+#
+# Filters on columns the file does not have are ignored, as before.
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from lazy_imports import lazy_import
+
+pd = lazy_import("pandas")  # imported by the first request, not at startup
+
+DEFAULT_PAGE_SIZE = 10000
+DEFAULT_CHUNK_ROWS = 100000
+
+COMPARISONS = {
+    "gt": lambda s, v: s > v,
+    "lt": lambda s, v: s < v,
+    "ge": lambda s, v: s >= v,
+    "le": lambda s, v: s <= v,
+    "eq": lambda s, v: s == v,
+    "ne": lambda s, v: s != v,
+    "between": lambda s, v: s.between(v[0], v[1]),
+    "in": lambda s, v: s.isin(list(v) if np.ndim(v) else [v]),
+}
+
+
+def normalize_filters(filters, available):
+    """[(column, op, value)] for the columns the file actually has"""
+    predicates = []
+    for col, conditions in (filters or {}).items():
+        if col not in available:
+            continue
+        if isinstance(conditions, dict):
+            conditions = [conditions]
+        for condition in conditions:
+            op = condition["op"]
+            if op not in COMPARISONS:
+                raise ValueError(f"Unknown filter op: {op}")
+            predicates.append((col, op, condition.get("value")))
+    return predicates
+
+
+def build_mask(chunk, predicates):
+    """One boolean mask for all predicates (rows with NaN never match)"""
+    mask = np.ones(len(chunk), dtype=bool)
+    for col, op, value in predicates:
+        mask &= COMPARISONS[op](chunk[col], value).to_numpy(dtype=bool, na_value=False)
+    return mask
+
+
+class FilterCursor:
+    def __init__(self, filepath, filters=None, columns=None, page_size=DEFAULT_PAGE_SIZE,
+                 chunk_rows=DEFAULT_CHUNK_ROWS, frame=None):
+        self.id = uuid.uuid4().hex
+        self.filepath = filepath
+        self.page_size = max(1, int(page_size))
+        self.chunk_rows = max(1, int(chunk_rows))  # R sends numbers as doubles
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+        header = frame.columns if frame is not None else pd.read_csv(filepath, nrows=0).columns
+        self.predicates = normalize_filters(filters, header)
+
+        # Projection: parse only the output columns plus the filtered ones
+        # (R sends a single column as a scalar string)
+        if columns is None:
+            self.columns = list(header)
+        else:
+            self.columns = [columns] if isinstance(columns, str) else list(columns)
+        missing = [c for c in self.columns if c not in header]
+        if missing:
+            raise ValueError(f"Unknown columns: {', '.join(missing)}")
+        filter_columns = {col for col, _, _ in self.predicates}
+        usecols = [c for c in header if c in filter_columns or c in self.columns]
+
+        if frame is not None:
+            # Already parsed (frame cache): walk it in slices instead of the file
+            frame = frame[usecols]
+            step = self.chunk_rows
+            self.chunks = (frame.iloc[i:i + step] for i in range(0, len(frame), step))
+        else:
+            self.chunks = pd.read_csv(filepath, usecols=usecols, chunksize=self.chunk_rows)
+
+        self.pending = []
+        self.pending_rows = 0
+        self.exhausted = False
+        self.scanned_rows = 0
+        self.matched_rows = 0
+        self.returned_rows = 0
+
+    @property
+    def done(self):
+        return self.exhausted and self.pending_rows == 0
+
+    def next_page(self):
+        """Scan until a full page has matched (or the file ends); return it"""
+        with self.lock:
+            self.last_used = time.monotonic()
+
+            while self.pending_rows < self.page_size and not self.exhausted:
+                chunk = next(self.chunks, None)
+                if chunk is None:
+                    self.exhausted = True
+                    self.chunks.close()
+                    break
+                self.scanned_rows += len(chunk)
+                matched = chunk.loc[build_mask(chunk, self.predicates), self.columns]
+                if len(matched):
+                    self.pending.append(matched)
+                    self.pending_rows += len(matched)
+                    self.matched_rows += len(matched)
+
+            if self.pending:
+                buffered = self.pending[0] if len(self.pending) == 1 else pd.concat(self.pending)
+            else:
+                buffered = pd.DataFrame(columns=self.columns)
+            page = buffered.iloc[:self.page_size]
+            rest = buffered.iloc[self.page_size:]
+
+            self.pending = [rest] if len(rest) else []
+            self.pending_rows = len(rest)
+            self.returned_rows += len(page)
+            return page
+
+    def close(self):
+        """Release the CSV reader (its file handle) before the scan is done"""
+        with self.lock:
+            self.exhausted = True
+            self.pending = []
+            self.pending_rows = 0
+            self.chunks.close()
+
+
+class CursorStore:
+    def __init__(self, ttl=300, max_cursors=64):
+        self.ttl = ttl
+        self.max_cursors = max_cursors
+        self.cursors = {}
+        self.lock = threading.Lock()
+
+    def add(self, cursor):
+        with self.lock:
+            self._prune()
+            if len(self.cursors) >= self.max_cursors:
+                # Drop the least recently used cursor to make room
+                oldest = min(self.cursors.values(), key=lambda c: c.last_used)
+                del self.cursors[oldest.id]
+                oldest.close()
+            self.cursors[cursor.id] = cursor
+        return cursor.id
+
+    def _prune(self):
+        now = time.monotonic()
+        for cursor_id in [k for k, c in self.cursors.items() if now - c.last_used > self.ttl]:
+            self.cursors.pop(cursor_id).close()
+
+    def get(self, cursor_id):
+        with self.lock:
+            self._prune()
+            cursor = self.cursors.get(cursor_id)
+        if cursor is None:
+            raise KeyError(f"Unknown or expired cursor: {cursor_id}")
+        return cursor
+
+    def close(self, cursor_id):
+        with self.lock:
+            cursor = self.cursors.pop(cursor_id, None)
+        if cursor is None:
+            return False
+        cursor.close()
+        return True
+
+
+def iter_filtered(filepath, filters=None, columns=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """All matching rows as a stream of DataFrames (for local use)"""
+    cursor = FilterCursor(filepath, filters, columns, page_size=chunk_rows, chunk_rows=chunk_rows)
+    while not cursor.done:
+        page = cursor.next_page()
+        if len(page):
+            yield page
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+
+# Self-describing binary envelope for R <-> Python messages
+# -----------------------------------------------------------------------------
+# Replaces bare float64 payloads and JSON replies. Every message carries a
+# magic, a version, a message type and a list of named, typed fields:
+#
+#   header  : "RPYE"  u8 version  u8 msg_type  u16 reserved  u32 n_fields
+#   field   : u16 name_len  u8 dtype  u8 ndim  u32 reserved  u64 nbytes
+#             name (padded to 8)  ndim x i64 shape  data (padded to 8)
+#
+# All integers are little-endian and every block starts on an 8-byte
+# boundary, so decode() hands back NumPy arrays that are views straight into
+# the received buffer (no copy). Arrays are stored row-major (C order).
+# Strings are UTF-8, NUL-terminated; nested structures fall back to a JSON
+# field. envelope.R is the matching pure-R reader/writer.
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b"RPYE"
+VERSION = 1
+
+# Message types
+MSG_DATA = 1      # array(s) to compute on
+MSG_COMMAND = 2   # R command text
+MSG_RESULT = 3    # named result fields
+MSG_ERROR = 4     # field "message"
+MSG_CONTROL = 5   # field "action", e.g. "shutdown"
+
+# Field dtypes
+DT_F8 = 1
+DT_F4 = 2
+DT_I4 = 3
+DT_I8 = 4
+DT_U1 = 5
+DT_BOOL = 6
+DT_STR = 7
+DT_JSON = 8
+
+NUMPY_DTYPES = {
+    DT_F8: np.dtype("<f8"),
+    DT_F4: np.dtype("<f4"),
+    DT_I4: np.dtype("<i4"),
+    DT_I8: np.dtype("<i8"),
+    DT_U1: np.dtype("u1"),
+    DT_BOOL: np.dtype("?"),
+}
+DTYPE_CODES = {dtype: code for code, dtype in NUMPY_DTYPES.items()}
+
+HEADER = struct.Struct("<4sBBHI")
+FIELD = struct.Struct("<HBBIQ")
+
+
+class EnvelopeError(ValueError):
+    pass
+
+
+class Message:
+    def __init__(self, msg_type, fields=None):
+        self.msg_type = msg_type
+        self.fields = fields if fields is not None else {}
+
+    def __getitem__(self, name):
+        return self.fields[name]
+
+    def get(self, name, default=None):
+        return self.fields.get(name, default)
+
+    def __repr__(self):
+        return f"Message(msg_type={self.msg_type}, fields={list(self.fields)})"
+
+
+def is_envelope(buf):
+    """True if buf starts with the envelope magic"""
+    return len(buf) >= HEADER.size and bytes(buf[:4]) == MAGIC
+
+
+def message_type(buf):
+    """Message type from the header alone (None if buf is not an envelope)"""
+    if not is_envelope(buf):
+        return None
+    return HEADER.unpack_from(buf, 0)[2]
+
+
+def _padding(n):
+    return (-n) % 8
+
+
+def _is_flat_numeric(values):
+    """Lists of numbers (or equal-length lists of numbers) become arrays"""
+    rows = [len(v) for v in values if isinstance(v, (list, tuple))]
+    if rows and (len(rows) != len(values) or len(set(rows)) > 1):
+        return False
+    for v in values:
+        if isinstance(v, (list, tuple)):
+            if not _is_flat_numeric(v):
+                return False
+        elif not isinstance(v, (bool, int, float, np.number, np.bool_)):
+            return False
+    return True
+
+
+def _as_field(value):
+    """Map a Python value to (dtype code, shape, data buffer)"""
+    if isinstance(value, str):
+        return DT_STR, (), value.encode("utf-8") + b"\0"
+
+    if isinstance(value, (list, tuple)) and value and all(isinstance(v, str) for v in value):
+        data = b"".join(v.encode("utf-8") + b"\0" for v in value)
+        return DT_STR, (len(value),), data
+
+    if isinstance(value, (bool, np.bool_)):
+        value = np.array(value, dtype="?")
+    elif isinstance(value, (int, np.integer)):
+        value = np.array(value, dtype="<i8")
+    elif isinstance(value, (float, np.floating)):
+        value = np.array(value, dtype="<f8")
+    elif isinstance(value, (list, tuple)):
+        try:
+            array = np.asarray(value) if _is_flat_numeric(value) else None
+        except ValueError:  # ragged deeper down
+            array = None
+        if array is None or array.dtype.kind not in "biuf":
+            return _as_json(value)
+        value = array
+
+    if not isinstance(value, np.ndarray):
+        return _as_json(value)
+
+    if value.dtype.kind in "USO":
+        # Character vectors (e.g. predicted class labels) go as strings,
+        # anything else that is not numeric as JSON
+        if value.ndim == 1 and all(isinstance(v, (str, bytes, np.str_, np.bytes_)) for v in value):
+            return _as_field([v.decode("utf-8") if isinstance(v, bytes) else str(v) for v in value])
+        return _as_json(value.tolist())
+
+    if value.dtype.kind == "f" and value.dtype.itemsize not in (4, 8):
+        value = value.astype("<f8")
+    elif value.dtype.kind in "iu" and value.dtype not in DTYPE_CODES:
+        value = value.astype("<i8")
+    dtype = value.dtype.newbyteorder("<") if value.dtype.byteorder == ">" else value.dtype
+    value = np.asarray(value, dtype=dtype, order="C")
+    if value.dtype not in DTYPE_CODES:
+        raise EnvelopeError(f"Unsupported dtype: {value.dtype}")
+
+    return DTYPE_CODES[value.dtype], value.shape, memoryview(value.reshape(-1)).cast("B")
+
+
+def _as_json(value):
+    return DT_JSON, (), json.dumps(value, default=_json_default).encode("utf-8")
+
+
+def encode_parts(msg_type, fields=None):
+    """Encode to a list of buffers (array data is referenced, not copied)"""
+    fields = fields or {}
+    parts = [HEADER.pack(MAGIC, VERSION, msg_type, 0, len(fields))]
+
+    for name, value in fields.items():
+        code, shape, data = _as_field(value)
+        name_bytes = name.encode("utf-8")
+        nbytes = len(data)
+
+        parts.append(FIELD.pack(len(name_bytes), code, len(shape), 0, nbytes))
+        parts.append(name_bytes + b"\0" * _padding(len(name_bytes)))
+        if shape:
+            parts.append(struct.pack(f"<{len(shape)}q", *shape))
+        parts.append(data)
+        if _padding(nbytes):
+            parts.append(b"\0" * _padding(nbytes))
+
+    return parts
+
+
+def encode(msg_type, fields=None):
+    """Encode a message; the only copy is the final join into one buffer"""
+    return b"".join(encode_parts(msg_type, fields))
+
+
+def _decode_value(buf, code, shape, offset, nbytes):
+    if code == DT_STR:
+        strings = bytes(buf[offset:offset + nbytes]).split(b"\0")[:-1]
+        strings = [s.decode("utf-8") for s in strings]
+        return strings[0] if not shape else strings
+
+    if code == DT_JSON:
+        return json.loads(bytes(buf[offset:offset + nbytes]).decode("utf-8"))
+
+    if code not in NUMPY_DTYPES:
+        raise EnvelopeError(f"Unknown field dtype code: {code}")
+
+    dtype = NUMPY_DTYPES[code]
+    array = np.frombuffer(buf, dtype=dtype, count=nbytes // dtype.itemsize, offset=offset)
+    if not shape:
+        return array[0].item()
+    return array.reshape(shape)
+
+
+def decode(buf):
+    """Decode an envelope; numeric fields are zero-copy views into buf"""
+    if not is_envelope(buf):
+        raise EnvelopeError("Not an envelope message")
+
+    _, version, msg_type, _, n_fields = HEADER.unpack_from(buf, 0)
+    if version > VERSION:
+        raise EnvelopeError(f"Unsupported envelope version {version} (max {VERSION})")
+
+    offset = HEADER.size
+    fields = {}
+    for _ in range(n_fields):
+        name_len, code, ndim, _, nbytes = FIELD.unpack_from(buf, offset)
+        offset += FIELD.size
+
+        name = bytes(buf[offset:offset + name_len]).decode("utf-8")
+        offset += name_len + _padding(name_len)
+
+        shape = struct.unpack_from(f"<{ndim}q", buf, offset) if ndim else ()
+        offset += 8 * ndim
+
+        if offset + nbytes > len(buf):
+            raise EnvelopeError(f"Truncated field '{name}'")
+        fields[name] = _decode_value(buf, code, shape, offset, nbytes)
+        offset += nbytes + _padding(nbytes)
+
+    return Message(msg_type, fields)
+
+
+def result(**fields):
+    return encode(MSG_RESULT, fields)
+
+
+def error(message):
+    return encode(MSG_ERROR, {"message": str(message)})
+
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def unpack_request(raw_data):
+    """Decode an envelope or a legacy JSON request into (fields, is_envelope)"""
+    if is_envelope(raw_data):
+        return decode(raw_data).fields, True
+    return json.loads(bytes(raw_data).decode("utf-8")), False
+
+
+def pack_reply(fields, as_envelope):
+    """Encode a reply in the same format the request came in"""
+    if as_envelope:
+        msg_type = MSG_ERROR if fields.get("status") == "error" else MSG_RESULT
+        return encode(msg_type, fields)
+    return json.dumps(fields, default=_json_default).encode("utf-8")
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+# Example 6 file processor (from_p.py)
+# -----------------------------------------------------------------------------
+# Actions (envelope or legacy JSON requests, replies in the same format):
+#
+#   process_csv   filepath            shape, columns, dtypes, summary, missing
+#   filter_data   filepath, filters,  first page of matching rows + cursor
+#                 [columns, page_size, chunk_rows]
+#   next_page     cursor              the next page (cursor is null when done)
+#   close_cursor  cursor              drop a cursor before reaching the end
+#   status / result / cancel  job     for requests sent with async = TRUE
+#   cache_stats                       parsed-DataFrame cache counters
+#
+# process_csv, filter_data and next_page accept `format`: "json" (default)
+# returns rows as records, "columnar" returns tables (`data`, `summary`) as
+# one typed buffer per column (columnar.py, decoded in R by columnar.R).
+# The columnar format needs an envelope request.
+#
+# Long CSV jobs sent with `async = TRUE` go to a bounded job queue
+# (job_queue.py) and the socket keeps answering other requests meanwhile.
+# Parsed files and their summaries are cached (frame_cache.py) until the
+# file changes, so repeated questions about the same CSV skip the reparse.
+# filter_data streams the file in chunks instead (csv_filter.py): only the
+# needed columns are parsed, all predicates (gt, lt, ge, le, eq, ne, between,
+# in) are applied as one vectorized mask, and rows come back in pages, so
+# the first page is ready long before a large file has been scanned.
+#
+#   python file_server.py --job-workers 2 --notify tcp://127.0.0.1:5560
+#   python file_server.py --cache-mb 1024
+#   python file_server.py --metrics tcp://127.0.0.1:5592   # per-request timings
+import argparse
+import os
+
+import pynng
+
+import columnar
+import envelope
+from csv_filter import DEFAULT_CHUNK_ROWS, DEFAULT_PAGE_SIZE, CursorStore, FilterCursor
+from frame_cache import FrameCache
+from job_queue import JOB_ACTIONS, JobQueue
+from metrics import NULL_METRICS, NULL_TIMER, create_metrics
+
+
+class FileServer:
+    def __init__(self, address="ipc:///tmp/file_processor", jobs=None, cache=None,
+                 metrics=NULL_METRICS):
+        self.address = address
+        self.jobs = jobs
+        self.metrics = metrics
+        self.cache = cache if cache is not None else FrameCache()
+        self.cursors = CursorStore()
+
+    def process_csv(self, request):
+        filepath = request["filepath"]
+
+        if not os.path.exists(filepath):
+            return {"status": "error", "message": "File not found"}
+
+        # Read (or reuse) the parsed CSV, once for the whole request
+        entry = self.cache.entry(filepath)
+        df = entry.frame
+
+        # Basic analysis, cached alongside the frame
+        def derived(name, fn):
+            return self.cache.derived(entry, name, fn)
+
+        fmt = request.get("format", "json")
+        if fmt == "json":
+            summary = derived("describe", lambda d: d.describe().to_dict())
+        else:
+            describe = derived("describe_frame", lambda d: d.describe().rename_axis("stat"))
+            summary = columnar.table(describe, fmt, index=True)
+        return {
+            "status": "success",
+            "shape": list(df.shape),
+            "columns": df.columns.tolist(),
+            "dtypes": derived("dtypes", lambda d: d.dtypes.astype(str).to_dict()),
+            "summary": summary,
+            "missing_values": derived("missing", lambda d: d.isnull().sum().to_dict())
+        }
+
+    def filter_data(self, request):
+        # Open a cursor over the matching rows and return its first page
+        filepath = request["filepath"]
+
+        if not os.path.exists(filepath):
+            return {"status": "error", "message": "File not found"}
+
+        # A file that is already parsed is filtered in memory, others are streamed
+        cursor = FilterCursor(
+            filepath,
+            filters=request.get("filters", {}),
+            columns=request.get("columns"),
+            page_size=request.get("page_size", DEFAULT_PAGE_SIZE),
+            chunk_rows=request.get("chunk_rows", DEFAULT_CHUNK_ROWS),
+            frame=self.cache.peek(filepath)
+        )
+        return self.page(cursor, request.get("format", "json"))
+
+    def next_page(self, request):
+        cursor_id = request.get("cursor")
+        if cursor_id is None:
+            return {"status": "error", "message": "'next_page' needs a cursor id"}
+        return self.page(self.cursors.get(cursor_id), request.get("format", "json"))
+
+    def close_cursor(self, request):
+        closed = self.cursors.close(request.get("cursor"))
+        return {"status": "success", "closed": closed}
+
+    def page(self, cursor, fmt="json"):
+        """One page of a cursor; the cursor is kept only while rows remain"""
+        if fmt not in columnar.FORMATS:
+            return {"status": "error", "message": f"Unknown format: {fmt}"}
+        df = cursor.next_page()
+        if cursor.done:
+            self.cursors.close(cursor.id)
+        else:
+            self.cursors.add(cursor)
+
+        return {
+            "status": "success",
+            "data": columnar.table(df, fmt),
+            "page_rows": len(df),
+            "filtered_rows": cursor.returned_rows,
+            "scanned_rows": cursor.scanned_rows,
+            "cursor": None if cursor.done else cursor.id,
+            "done": cursor.done
+        }
+
+    def handle(self, request):
+        """Dispatch one decoded request to its action"""
+        action = request.get("action")
+
+        if action in JOB_ACTIONS:
+            if self.jobs is None:
+                return {"status": "error", "message": "Async jobs are not enabled"}
+            return self.jobs.handle(request)
+
+        if action == "cache_stats":
+            return dict(self.cache.stats(), status="success")
+
+        if action == "next_page":
+            try:
+                return self.next_page(request)
+            except KeyError as e:
+                return {"status": "error", "message": str(e.args[0])}
+        if action == "close_cursor":
+            return self.close_cursor(request)
+
+        handlers = {"process_csv": self.process_csv, "filter_data": self.filter_data}
+        if action not in handlers:
+            return {"status": "error", "message": f"Invalid action: {action}"}
+
+        if request.get("async", False) and self.jobs is not None:
+            return self.jobs.accept(action, handlers[action], request)
+        return handlers[action](request)
+
+    def serve_forever(self):
+        socket = pynng.Rep0(listen=self.address)
+        print("Python file processor ready")
+
+        while True:
+            use_envelope = False
+            raw_data, timer = b"", NULL_TIMER
+            try:
+                # Receive file processing request (envelope or legacy JSON)
+                raw_data = socket.recv()
+                timer = self.metrics.start()
+                request, use_envelope = envelope.unpack_request(raw_data)
+                timer.mark("decode")
+                if request.get("format", "json") != "json" and not use_envelope:
+                    result = {"status": "error", "message": "The columnar format needs an envelope request"}
+                else:
+                    result = self.handle(request)
+            except KeyboardInterrupt:
+                break
+            except Exception as e:
+                result = {"status": "error", "message": str(e)}
+            timer.mark("compute")
+            try:
+                reply = envelope.pack_reply(result, use_envelope)
+            except Exception as e:
+                # One reply that cannot be encoded must not stop the server
+                result = {"status": "error", "message": f"Could not encode reply: {e}"}
+                reply = envelope.pack_reply(result, use_envelope)
+            timer.mark("serialize")
+
+            # Send response
+            try:
+                socket.send(reply)
+            except pynng.Closed:
+                timer.finish(received=len(raw_data), error=True)
+                break
+            except pynng.NNGException as e:
+                print(f"Error: {e}")
+                timer.finish(received=len(raw_data), error=True)
+                continue
+            timer.mark("send")
+            timer.finish(sent=len(reply), received=len(raw_data),
+                         error=result.get("status") == "error")
+
+        socket.close()
+        if self.jobs is not None:
+            self.jobs.shutdown()
+
+
+def serve_files(address="ipc:///tmp/file_processor", job_workers=2, notify=None, cache_mb=512,
+                metrics_address=None):
+    jobs = JobQueue(workers=job_workers, notify_address=notify)
+    cache = FrameCache(max_bytes=int(cache_mb * 1024 * 1024))
+    metrics, endpoint = create_metrics(metrics_address is not None, metrics_address)
+    try:
+        FileServer(address, jobs, cache, metrics).serve_forever()
+    finally:
+        if endpoint is not None:
+            endpoint.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Example 6 file processor")
+    parser.add_argument("--listen", default="ipc:///tmp/file_processor")
+    parser.add_argument("--job-workers", type=int, default=2, help="concurrent async jobs")
+    parser.add_argument("--notify", default=None,
+                        help="Pub0 address for job completion notifications")
+    parser.add_argument("--cache-mb", type=float, default=512,
+                        help="memory budget for parsed CSV files")
+    parser.add_argument("--metrics", default=None, metavar="ADDRESS",
+                        help="time every request and serve the metrics on this address")
+    args = parser.parse_args(argv)
+
+    serve_files(args.listen, job_workers=args.job_workers, notify=args.notify,
+                cache_mb=args.cache_mb, metrics_address=args.metrics)
+
+
+if __name__ == "__main__":
+    main()
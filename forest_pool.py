@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+
+# Process-pool compute backend for the Example 4 RandomForest (ml_server.py)
+# -----------------------------------------------------------------------------
+# Training and large predict batches run on a pool of worker processes
+# instead of one core inside the socket loop:
+#
+#   train    the n_estimators trees are split into one chunk per process;
+#            every process fits a sub-forest with its own seed and the
+#            parent concatenates their estimators_ into one forest
+#   predict  rows are sharded into contiguous blocks; every process writes
+#            its block of predict_proba straight into a shared output array
+#
+# Feature matrices reach the workers through shared memory (shm_transport.py):
+# the parent copies them into a pooled segment once and sends descriptors,
+# so nothing large is pickled. Models are never pickled per call either:
+# workers load the registry artifact with joblib's mmap_mode="r" the first
+# time they see it and keep it (artifacts are immutable per version), so
+# every process shares the trees' pages through the page cache.
+#
+#   pool = ForestPool(processes=4)
+#   model = pool.fit(X, y, n_estimators=100, random_state=42)
+#   predictions, probabilities = pool.predict(model, X_new, artifact=path)
+#
+# Workers are started with "forkserver": the ML server is multi-threaded by
+# the time the pool is used, and forking a threaded process is unsafe.
+#
+#   python forest_pool.py --rows 200000 --processes 1 2 4
+import argparse
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from shm_transport import SHM_DIR, SegmentPool, is_descriptor
+
+MAX_SEED = np.iinfo(np.int32).max
+WORKER_MODELS = 4  # artifacts each worker keeps loaded
+
+# Per-process state of a worker
+_segments = None
+_models = OrderedDict()
+
+
+def _init_worker():
+    global _segments
+    _segments = SegmentPool()
+
+
+def _attach(value):
+    return _segments.attach(value) if is_descriptor(value) else value
+
+
+def _model(artifact):
+    model = _models.get(artifact)
+    if model is None:
+        model = _models[artifact] = joblib.load(artifact, mmap_mode="r")
+        model.n_jobs = 1
+        while len(_models) > WORKER_MODELS:
+            _models.popitem(last=False)
+    _models.move_to_end(artifact)
+    return model
+
+
+def _fit_chunk(X, y, n_estimators, seed, params):
+    forest = RandomForestClassifier(n_estimators=n_estimators, random_state=seed, n_jobs=1, **params)
+    return forest.fit(_attach(X), _attach(y))
+
+
+def _predict_rows(artifact, X, out, start, stop):
+    out = _attach(out)
+    out[start:stop] = _model(artifact).predict_proba(_attach(X)[start:stop])
+    return stop - start
+
+
+class ForestPool:
+    def __init__(self, processes=None, min_rows=20000):
+        self.processes = processes or os.cpu_count()
+        self.min_rows = min_rows  # smaller predict batches stay in-process
+        self.segments = SegmentPool(prefix=f"rpy-forest-{os.getpid()}")
+        self.executor = ProcessPoolExecutor(max_workers=self.processes,
+                                            mp_context=multiprocessing.get_context("forkserver"),
+                                            initializer=_init_worker)
+
+    def warm(self):
+        """Start every worker process now rather than on the first request"""
+        list(self.executor.map(abs, range(self.processes)))
+
+    def _share(self, array):
+        """(segment or None, descriptor or the array itself)"""
+        if isinstance(array, np.ndarray) and array.dtype.kind in "biuf":
+            return self.segments.put(np.ascontiguousarray(array))
+        return None, array
+
+    def fit(self, X, y, n_estimators=100, random_state=None, **params):
+        """A RandomForestClassifier whose trees were built across the pool"""
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y)
+        chunks = [n for n in np.array_split(np.arange(n_estimators), self.processes) if len(n)]
+        seeds = np.random.RandomState(random_state).randint(MAX_SEED, size=len(chunks))
+
+        shared = [self._share(X), self._share(y)]
+        try:
+            futures = [self.executor.submit(_fit_chunk, shared[0][1], shared[1][1], len(chunk),
+                                            int(seed), params)
+                       for chunk, seed in zip(chunks, seeds)]
+            forests = [future.result() for future in futures]
+        finally:
+            for segment, _ in shared:
+                if segment is not None:
+                    self.segments.release(segment)
+
+        forest = forests[0]
+        for other in forests[1:]:
+            forest.estimators_ += other.estimators_
+        forest.n_estimators = len(forest.estimators_)
+        forest.random_state = random_state
+        return forest
+
+    def predict(self, model, X, artifact=None):
+        """(predictions, probabilities), sharded by rows when X is large enough
+
+        artifact is the model's joblib file, which the workers map; without
+        one (or below min_rows) the model runs in this process.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if artifact is None or len(X) < self.min_rows:
+            probabilities = model.predict_proba(X)
+        else:
+            x_segment, x_descriptor = self.segments.put(X)
+            out_segment, out = self.segments.empty((len(X), len(model.classes_)))
+            try:
+                bounds = np.linspace(0, len(X), self.processes + 1).astype(int)
+                futures = [self.executor.submit(_predict_rows, artifact, x_descriptor,
+                                                self.segments.describe(out_segment, out),
+                                                int(start), int(stop))
+                           for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+                for future in futures:
+                    future.result()
+                probabilities = out.copy()
+            finally:
+                self.segments.release(x_segment)
+                self.segments.release(out_segment)
+        # What RandomForestClassifier.predict does with the probabilities
+        return model.classes_.take(np.argmax(probabilities, axis=1)), probabilities
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        self.segments.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train / predict wall time by process count")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--features", type=int, default=8)
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, os.cpu_count()])
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(42)
+    X = rng.normal(size=(args.rows, args.features))
+    y = (X[:, 0] + X[:, 1] ** 2 + rng.normal(0, 0.5, args.rows) > 1).astype(np.int64)
+    artifact = os.path.join(SHM_DIR, f"forest-bench-{os.getpid()}.joblib")
+
+    print(f"{args.rows} rows x {args.features} features, {args.trees} trees")
+    print(f"{'processes':>10}{'train s':>10}{'predict s':>11}")
+    try:
+        for processes in args.processes:
+            pool = ForestPool(processes, min_rows=0)
+            pool.warm()
+            start = time.perf_counter()
+            model = pool.fit(X, y, n_estimators=args.trees, random_state=42)
+            trained = time.perf_counter() - start
+            joblib.dump(model, artifact)
+            pool.predict(model, X[:processes], artifact)  # workers load the artifact
+            start = time.perf_counter()
+            pool.predict(model, X, artifact)
+            predicted = time.perf_counter() - start
+            pool.shutdown()
+            print(f"{processes:>10}{trained:>10.2f}{predicted:>11.2f}")
+    finally:
+        if os.path.exists(artifact):
+            os.remove(artifact)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+# Parsed-DataFrame cache for the Example 6 file processor
+# -----------------------------------------------------------------------------
+# pd.read_csv results are kept in an LRU keyed by the file's real path and
+# validated against (size, mtime) on every lookup, so an edited file is
+# re-read automatically. The budget is in bytes of real memory
+# (memory_usage(deep=True)), not a number of entries. Derived summaries
+# (describe(), isnull().sum(), ...) are cached next to their frame, count
+# toward the same budget and die with it. A frame bigger than the whole
+# budget is not kept, but its entry still carries its summaries for as long
+# as the caller holds it, so one request parses the file only once:
+#
+#   entry = cache.entry(path)
+#   summary = cache.derived(entry, "describe", lambda d: d.describe())
+#
+# Cached frames are shared: callers must not modify them in place.
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+from lazy_imports import lazy_import
+
+pd = lazy_import("pandas")  # imported by the first parse, not at startup
+
+
+def _nbytes(value):
+    """Approximate memory of a derived summary"""
+    if hasattr(value, "memory_usage"):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, "sum") else usage)
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class CacheEntry:
+    def __init__(self, path, key, frame, nbytes):
+        self.path = path
+        self.key = key
+        self.frame = frame
+        self.nbytes = nbytes
+        self.derived = {}
+
+
+class FrameCache:
+    def __init__(self, max_bytes=512 * 1024 * 1024, loader=None):
+        self.max_bytes = max_bytes
+        self.loader = loader  # None: pd.read_csv
+
+        self.entries = OrderedDict()  # real path -> CacheEntry
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def file_key(path):
+        st = os.stat(path)
+        return (st.st_size, st.st_mtime_ns)
+
+    def _lookup(self, path, key):
+        entry = self.entries.get(path)
+        if entry is None:
+            return None
+        if entry.key != key:
+            # File changed on disk since it was parsed
+            self._drop(path)
+            return None
+        self.entries.move_to_end(path)
+        return entry
+
+    def _drop(self, path):
+        entry = self.entries.pop(path)
+        self.bytes -= entry.nbytes
+
+    def _shrink(self):
+        while self.bytes > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def entry(self, filepath):
+        """CacheEntry for filepath, parsing the file if needed (hold it for derived())"""
+        path = os.path.realpath(filepath)
+        key = self.file_key(path)
+
+        with self.lock:
+            entry = self._lookup(path, key)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Parse outside the lock so other files stay servable meanwhile
+        frame = (self.loader or pd.read_csv)(path)
+        entry = CacheEntry(path, key, frame, int(frame.memory_usage(deep=True).sum()))
+
+        with self.lock:
+            if entry.nbytes > self.max_bytes:
+                return entry  # too big to keep, serve it uncached
+
+            if path in self.entries:
+                self._drop(path)
+            self.entries[path] = entry
+            self.bytes += entry.nbytes
+            self._shrink()
+        return entry
+
+    def get(self, filepath):
+        """Parsed DataFrame for filepath (shared, do not modify)"""
+        return self.entry(filepath).frame
+
+    def peek(self, filepath):
+        """Parsed DataFrame if it is already cached and current, else None (never parses)"""
+        path = os.path.realpath(filepath)
+        key = self.file_key(path)
+        with self.lock:
+            entry = self._lookup(path, key)
+            return None if entry is None else entry.frame
+
+    def derived(self, entry, name, fn):
+        """fn(entry.frame) computed once per parsed version of the file"""
+        with self.lock:
+            if name in entry.derived:
+                return entry.derived[name]
+        value = fn(entry.frame)
+        nbytes = _nbytes(value)
+        with self.lock:
+            if name in entry.derived:
+                return entry.derived[name]
+            entry.derived[name] = value
+            if self.entries.get(entry.path) is entry:
+                entry.nbytes += nbytes
+                self.bytes += nbytes
+                self._shrink()
+        return value
+
+    def invalidate(self, filepath=None):
+        with self.lock:
+            if filepath is None:
+                self.entries.clear()
+                self.bytes = 0
+            elif os.path.realpath(filepath) in self.entries:
+                self._drop(os.path.realpath(filepath))
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
@@ -5,363 +5,357 @@
 # Date                     Programmer
 #----------   --------------------------------------------------------------
 # Oct-29-2025    Md Yousuf Ali (MdYousuf.Ali@fda.hhs.gov)
-import pynng
-import numpy as np
+#
+# The Python side of the examples in rfile.R, one subcommand per server:
+#
+#   python from_p.py stats                # Example 1   tcp://127.0.0.1:5555
+#   python from_p.py send                 # Example 1_1 (client of the R server)
+#   python from_p.py pub --example 2      # Example 2   tcp://127.0.0.1:5556
+#   python from_p.py pipeline             # Example 3   ipc:///tmp/r_python_pipeline
+#   python from_p.py ml                   # Example 4   tcp://127.0.0.1:5557
+#   python from_p.py pub --example 5      # Example 5   tcp://127.0.0.1:5558
+#   python from_p.py files                # Example 6   ipc:///tmp/file_processor
+#
+# Heavy dependencies (scikit-learn, pandas) are only imported by the
+# subcommands that use them, and only when their first request needs them
+# (lazy_imports.py), so `stats` and `pub` listen in a fraction of a second.
+# --preload imports them before listening instead, so the first request
+# does not wait. `python bench_startup.py` measures time-to-listen and RSS
+# for every subcommand, with and without --preload.
+#
+# --metrics ADDRESS times every request (decode, compute, serialize, send)
+# and serves the histograms and counters on that side socket (metrics.py).
+import argparse
 import json
-import time
-import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
-from sklearn.preprocessing import StandardScaler
-import pickle
-import os
-
-# Example 1: Basic Data Exchange Server
-
-socket = pynng.Rep0(listen="tcp://127.0.0.1:5555")
-print("Python server listening on tcp://127.0.0.1:5555")
+import logging
 
-try:
-    while True:
-        # Receive request from R
-        raw_data = socket.recv()
-
-        # Convert to numpy array
-        data = np.frombuffer(raw_data, dtype=np.float64)
-        print(f"Received from R: {data}")
-
-        # Check for shutdown signal
-        if len(data) == 1 and data[0] == -999:
-            print("Received shutdown signal from R")
-            break
-
-        # Process data (example: calculate statistics)
-        result = {
-            "mean": float(np.mean(data)),
-            "std": float(np.std(data)),
-            "min": float(np.min(data)),
-            "max": float(np.max(data)),
-            "length": len(data)
-        }
-
-        # Send JSON response back to R
-        response = json.dumps(result).encode('utf-8')
-        socket.send(response)
-
-except Exception as e:
-    print(f"Error: {e}")
-finally:
-    socket.close()
-    print("Socket closed")
-
-# socket = pynng.Rep0(listen="tcp://127.0.0.1:5555")
-# print("Python server listening on tcp://127.0.0.1:5555")
-
-# while True:
-#     try:
-#         # Receive request from R
-#         raw_data = socket.recv()
-
-#         # Convert to numpy array
-#         data = np.frombuffer(raw_data, dtype=np.float64)
-#         print(f"Received from R: {data}")
-
-#         # Process data (example: calculate statistics)
-#         result = {
-#             "mean": float(np.mean(data)),
-#             "std": float(np.std(data)),
-#             "min": float(np.min(data)),
-#             "max": float(np.max(data)),
-#             "length": len(data)
-#         }
-
-#         # Send JSON response back to R
-#         response = json.dumps(result).encode('utf-8')
-#         socket.send(response)
-
-#     except KeyboardInterrupt:
-#         break
-
-# socket.close()
-
-# 1_1 send from data python to R
-import pynng
 import numpy as np
-import json
-
-# Create a request socket (client)
-socket = pynng.Req0(dial="tcp://127.0.0.1:5555")
-print("Python client connected to tcp://127.0.0.1:5555")
-
-# Generate some test data in Python
-test_data = np.random.normal(100, 15, 500)  # 500 random numbers
-print(f"Generated {len(test_data)} data points in Python")
-print(f"Sample data: {test_data[:5]}...")
-
-# Send data to R as raw bytes
-data_bytes = test_data.tobytes()
-socket.send(data_bytes)
-print("Data sent to R server")
-
-# Receive response from R
-response = socket.recv()
-result = json.loads(response.decode('utf-8'))
-
-print("Response from R:")
-print(f"  R calculated mean: {result['r_mean']:.3f}")
-print(f"  R calculated sd: {result['r_sd']:.3f}")
-print(f"  R calculated median: {result['r_median']:.3f}")
-print(f"  R calculated summary: {result['r_summary']}")
-print(f"  Data length confirmed: {result['length']}")
-
-socket.close()
-
-
-# Example 2: Real-time Data Streaming Publisher
-pub = pynng.Pub0(listen="tcp://127.0.0.1:5556")
-print("Python publisher started on tcp://127.0.0.1:5556")
+import pynng
 
-sensor_id = 0
-while True:
-    try:
-        # Generate simulated sensor data
-        timestamp = time.time()
-        temperature = 20 + 10 * np.sin(timestamp / 100) + np.random.normal(0, 2)
-        humidity = 60 + 20 * np.cos(timestamp / 150) + np.random.normal(0, 5)
-
-        # Create data packet
-        data = {
-            "sensor_id": sensor_id,
-            "timestamp": timestamp,
-            "temperature": round(temperature, 2),
-            "humidity": round(humidity, 2)
-        }
-
-        # Send with topic "sensor_data"
-        topic = "sensor_data"
-        message = topic.encode() + b'\0' + json.dumps(data).encode()
-        pub.send(message)
-
-        print(f"Sent: {data}")
-        sensor_id += 1
-        time.sleep(1)  # Send every second
+import envelope
+from lazy_imports import preload
+from metrics import NULL_METRICS, NULL_TIMER, create_metrics
 
-    except KeyboardInterrupt:
-        break
+# Modules worth importing ahead of time with --preload
+PRELOAD = {
+    "stats": (),
+    "send": (),
+    "pub": (),
+    "pipeline": ("sklearn.preprocessing", "stream_pipeline"),
+    "ml": ("sklearn.ensemble", "sklearn.model_selection", "sklearn.metrics"),
+    "files": ("pandas",),
+}
 
-pub.close()
-
-# Example 3: Bidirectional Data Processing Pipeline
-socket = pynng.Pair0(listen="ipc:///tmp/r_python_pipeline")
-print("Python data processor ready")
 
-scaler = StandardScaler()
+# Example 1: Basic Data Exchange Server
+# (one request at a time; stats_server.py serves the same protocol to many
+#  R sessions at once: python stats_server.py --workers 8 [--processes])
+def serve_basic_stats(address="tcp://127.0.0.1:5555", metrics=NULL_METRICS):
+    socket = pynng.Rep0(listen=address)
+    print(f"Python server listening on {address}")
 
-while True:
     try:
-        # Receive data from R
-        raw_data = socket.recv()
-
-        # Deserialize numpy array
-        data = np.frombuffer(raw_data, dtype=np.float64).reshape(-1, 1)
-        print(f"Received {len(data)} data points from R")
-
-        # Process with scikit-learn
-        if len(data) > 1:
-            # Fit scaler and transform data
-            scaled_data = scaler.fit_transform(data)
-
-            # Calculate additional metrics
+        while True:
+            # Receive request from R
+            raw_data = socket.recv()
+            timer = metrics.start()
+
+            # Envelope (field "data") or legacy bare float64 payload
+            if envelope.is_envelope(raw_data):
+                message = envelope.decode(raw_data)
+                if message.msg_type == envelope.MSG_CONTROL and message.get("action") == "shutdown":
+                    print("Received shutdown signal from R")
+                    timer.finish(received=len(raw_data))
+                    break
+                data = np.atleast_1d(np.asarray(message["data"], dtype=np.float64))
+            else:
+                message = None
+                data = np.frombuffer(raw_data, dtype=np.float64)
+            timer.mark("decode")
+            print(f"Received from R: {data}")
+
+            # Check for shutdown signal
+            if len(data) == 1 and data[0] == -999:
+                print("Received shutdown signal from R")
+                timer.finish(received=len(raw_data))
+                break
+
+            # Process data (example: calculate statistics)
             result = {
-                'scaled_data': scaled_data.flatten().tolist(),
-                'original_mean': float(np.mean(data)),
-                'original_std': float(np.std(data)),
-                'scaled_mean': float(np.mean(scaled_data)),
-                'scaled_std': float(np.std(scaled_data)),
-                'n_points': len(data)
+                "mean": float(np.mean(data)),
+                "std": float(np.std(data)),
+                "min": float(np.min(data)),
+                "max": float(np.max(data)),
+                "length": len(data)
             }
+            timer.mark("compute")
 
-            # Send processed data back
-            response = json.dumps(result).encode()
+            # Reply in the format the request came in
+            if message is not None:
+                response = envelope.result(**result)
+            else:
+                response = json.dumps(result).encode('utf-8')
+            timer.mark("serialize")
             socket.send(response)
-            print("Sent processed data back to R")
+            timer.mark("send")
+            timer.finish(sent=len(response), received=len(raw_data))
 
     except KeyboardInterrupt:
-        break
+        pass
     except Exception as e:
         print(f"Error: {e}")
-        # Send error signal
-        socket.send(b"ERROR")
-
-socket.close()
-
-# Example 4: Asynchronous Machine Learning Pipeline
-socket = pynng.Rep0(listen="tcp://127.0.0.1:5557")
-print("ML Model Server ready on tcp://127.0.0.1:5557")
+    finally:
+        socket.close()
+        print("Socket closed")
 
-model = RandomForestClassifier(n_estimators=100, random_state=42)
-is_trained = False
 
-while True:
-    try:
-        # Receive request
-        request = json.loads(socket.recv().decode())
-        action = request.get("action")
-
-        if action == "train":
-            # Train model
-            X = np.array(request["features"])
-            y = np.array(request["labels"])
-
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.2, random_state=42
-            )
-
-            model.fit(X_train, y_train)
-            y_pred = model.predict(X_test)
-            accuracy = accuracy_score(y_test, y_pred)
-
-            is_trained = True
-            response = {
-                "status": "success",
-                "accuracy": float(accuracy),
-                "n_features": X.shape[1],
-                "n_samples": len(X)
-            }
-
-        elif action == "predict" and is_trained:
-            # Make predictions
-            X_new = np.array(request["features"])
-            predictions = model.predict(X_new).tolist()
-            probabilities = model.predict_proba(X_new).tolist()
-
-            response = {
-                "status": "success",
-                "predictions": predictions,
-                "probabilities": probabilities
-            }
-
-        else:
-            response = {
-                "status": "error",
-                "message": "Model not trained or invalid action"
-            }
-
-        # Send response
-        socket.send(json.dumps(response).encode())
+# 1_1 send from data python to R
+def send_test_data(address="tcp://127.0.0.1:5555"):
+    # Create a request socket (client)
+    socket = pynng.Req0(dial=address)
+    print(f"Python client connected to {address}")
+
+    # Generate some test data in Python
+    test_data = np.random.normal(100, 15, 500)  # 500 random numbers
+    print(f"Generated {len(test_data)} data points in Python")
+    print(f"Sample data: {test_data[:5]}...")
+
+    # Send data to R as an envelope
+    socket.send(envelope.encode(envelope.MSG_DATA, {"data": test_data}))
+    print("Data sent to R server")
+
+    # Receive response from R
+    result = envelope.decode(socket.recv()).fields
+
+    print("Response from R:")
+    print(f"  R calculated mean: {result['r_mean']:.3f}")
+    print(f"  R calculated sd: {result['r_sd']:.3f}")
+    print(f"  R calculated median: {result['r_median']:.3f}")
+    print(f"  R calculated summary: {result['r_summary']}")
+    print(f"  Data length confirmed: {result['length']}")
 
-    except KeyboardInterrupt:
-        break
-    except Exception as e:
-        response = {"status": "error", "message": str(e)}
-        socket.send(json.dumps(response).encode())
+    socket.close()
 
-socket.close()
 
+# Example 2: Real-time Data Streaming Publisher
+# Columnar "sensor_data" frames (sensor_id, timestamp, temperature, humidity);
+# one sample per second as before, see sensor_publisher.py for higher rates
+#
 # Example 5: Real-time Data Visualization Pipeline
-pub = pynng.Pub0(listen="tcp://127.0.0.1:5558")
-print("Python data generator started")
-
-streams = ["temperature", "pressure", "vibration"]
-
-while True:
-    try:
-        for stream_type in streams:
-            # Generate realistic sensor data
-            timestamp = time.time()
-
-            if stream_type == "temperature":
-                # Temperature with daily cycle + noise
-                value = 20 + 10 * np.sin(timestamp / 3600) + np.random.normal(0, 2)
-                topic = "temp"
-            elif stream_type == "pressure":
-                # Pressure with some trend + noise
-                value = 1013 + 5 * np.sin(timestamp / 7200) + np.random.normal(0, 3)
-                topic = "press"
-            else:  # vibration
-                # Vibration with occasional spikes
-                base = np.random.normal(0.1, 0.02)
-                spike = np.random.exponential(0.5) if np.random.random() < 0.05 else 0
-                value = base + spike
-                topic = "vib"
-
-            # Create message
-            data = {
-                "timestamp": timestamp,
-                "value": round(float(value), 3),
-                "sensor_type": stream_type
-            }
+# Temperature / pressure / vibration frames on "temp", "press", "vib",
+# generated with NumPy and sent once per 100 ms window (10 Hz per topic;
+# --rate 100000 for high-rate streams)
+def publish(example, rate=None, window=None, address=None):
+    from sensor_publisher import run_example
 
-            # Send with topic prefix
-            message = topic.encode() + b'\0' + json.dumps(data).encode()
-            pub.send(message)
+    if example == 2:
+        run_example(2, rate=rate or 1.0, window=window or 1.0, address=address)
+    else:
+        run_example(5, rate=rate or 10.0, window=window or 0.1, address=address)
 
-        time.sleep(0.1)  # 10 Hz data rate
 
-    except KeyboardInterrupt:
-        break
-
-pub.close()
-
-# Example 6: Async File Processing
-socket = pynng.Rep0(listen="ipc:///tmp/file_processor")
-print("Python file processor ready")
-
-while True:
-    try:
-        # Receive file processing request
-        request = json.loads(socket.recv().decode())
-        action = request["action"]
-
-        if action == "process_csv":
-            filepath = request["filepath"]
-
-            if os.path.exists(filepath):
-                # Read and process CSV
-                df = pd.read_csv(filepath)
+# Example 3: Bidirectional Data Processing Pipeline
+# Arrays may arrive as shared-memory descriptors (shm.R / shm_transport.py):
+# they are mapped in place, and big replies go back the same way.
+# Messages with a "stream" field go to a stateful pipeline instead of a fresh
+# fit_transform: each stream's scaler (plus optional "steps") is updated with
+# partial_fit, snapshotted under pipelines/, and inspect / reset / snapshot /
+# list control envelopes manage it (stream_pipeline.py)
+def serve_pipeline(address="ipc:///tmp/r_python_pipeline", directory="pipelines",
+                   metrics=NULL_METRICS):
+    from shm_transport import SegmentPool, ShmChannel
+
+    socket = pynng.Pair0(listen=address)
+    print("Python data processor ready")
+
+    shm_pool = SegmentPool()
+    channel = ShmChannel(shm_pool)
+    pipelines = None  # scikit-learn is imported with the first message that needs it
+
+    def stream_pipelines():
+        nonlocal pipelines
+        if pipelines is None:
+            from stream_pipeline import PipelineStore
+            pipelines = PipelineStore(directory)
+        return pipelines
 
-                # Basic analysis
+    while True:
+        # Set before recv so a failed receive still reaches the error reply
+        raw_data = b""
+        timer = NULL_TIMER
+        try:
+            # Receive data from R
+            raw_data = socket.recv()
+            timer = metrics.start()
+            # R sent a new message, so it is done with our last reply's segments
+            channel.complete()
+
+            # Deserialize numpy array (envelope, maybe via shared memory, or legacy bare float64)
+            use_envelope = envelope.is_envelope(raw_data)
+            via_shm = False
+            stream = None
+            if use_envelope:
+                message = envelope.decode(raw_data)
+                if message.msg_type == envelope.MSG_CONTROL:
+                    # inspect / reset / snapshot / list a stream
+                    reply = envelope.pack_reply(stream_pipelines().handle_control(message.fields), True)
+                    socket.send(reply)
+                    timer.finish(sent=len(reply), received=len(raw_data))
+                    continue
+                fields, via_shm = channel.unpack(message.fields)
+                values = fields["data"]
+                stream = fields.get("stream")
+            else:
+                values = np.frombuffer(raw_data, dtype=np.float64)
+            data = np.asarray(values, dtype=np.float64).reshape(-1, 1)
+            timer.mark("decode")
+            print(f"Received {len(data)} data points from R")
+
+            if stream is not None:
+                from stream_pipeline import batch_result
+
+                # Cumulative scaling: partial_fit on this batch only
+                steps = fields.get("steps")
+                steps = [steps] if isinstance(steps, str) else steps
+                batch = np.asarray(values, dtype=np.float64)
+                batch = batch if batch.ndim == 2 else batch.reshape(-1, 1)
+                transformed, pipeline = stream_pipelines().process(stream, batch, steps)
+                result = batch_result(stream, batch, transformed, pipeline)
+                timer.mark("compute")
+
+                reply = envelope.pack_reply(channel.pack(result) if via_shm else result, use_envelope)
+                timer.mark("serialize")
+                socket.send(reply)
+                timer.mark("send")
+                timer.finish(sent=len(reply), received=len(raw_data))
+                print(f"Stream {stream}: {pipeline.n_samples_seen} samples seen")
+
+            # Process with scikit-learn
+            elif len(data) > 1:
+                from sklearn.preprocessing import StandardScaler
+
+                # Fit scaler and transform data
+                scaled_data = StandardScaler().fit_transform(data)
+
+                # Calculate additional metrics
                 result = {
-                    "status": "success",
-                    "shape": df.shape,
-                    "columns": df.columns.tolist(),
-                    "dtypes": df.dtypes.astype(str).to_dict(),
-                    "summary": df.describe().to_dict(),
-                    "missing_values": df.isnull().sum().to_dict()
+                    'scaled_data': scaled_data.ravel(),
+                    'original_mean': float(np.mean(data)),
+                    'original_std': float(np.std(data)),
+                    'scaled_mean': float(np.mean(scaled_data)),
+                    'scaled_std': float(np.std(scaled_data)),
+                    'n_points': len(data)
                 }
+                timer.mark("compute")
+
+                # Send processed data back (the envelope keeps scaled_data binary)
+                reply = envelope.pack_reply(channel.pack(result) if via_shm else result, use_envelope)
+                timer.mark("serialize")
+                socket.send(reply)
+                timer.mark("send")
+                timer.finish(sent=len(reply), received=len(raw_data))
+                print("Sent processed data back to R")
             else:
-                result = {"status": "error", "message": "File not found"}
+                timer.finish(received=len(raw_data))
 
-        elif action == "filter_data":
-            # Apply filters and return processed data
-            filepath = request["filepath"]
-            filters = request.get("filters", {})
+        except KeyboardInterrupt:
+            break
+        except Exception as e:
+            print(f"Error: {e}")
+            timer.finish(received=len(raw_data), error=True)
+            # Send error signal
+            if envelope.is_envelope(raw_data):
+                socket.send(envelope.error(e))
+            else:
+                socket.send(b"ERROR")
 
-            df = pd.read_csv(filepath)
+    socket.close()
+    shm_pool.close()
+    if pipelines is not None:
+        pipelines.close()
 
-            # Apply filters
-            for col, condition in filters.items():
-                if col in df.columns:
-                    if condition["op"] == "gt":
-                        df = df[df[col] > condition["value"]]
-                    elif condition["op"] == "lt":
-                        df = df[df[col] < condition["value"]]
 
-            # Return filtered data
-            result = {
-                "status": "success",
-                "data": df.to_dict("records"),
-                "filtered_rows": len(df)
-            }
+# Example 4: Asynchronous Machine Learning Pipeline
+# Trained models are saved to a versioned registry under models/ and loaded
+# lazily on predict, so a restarted server does not need retraining
+# (actions: train, predict, list, load, evict; see ml_server.py)
+def serve_models(address="tcp://127.0.0.1:5557", metrics_address=None):
+    from ml_server import serve_ml
 
-        # Send response
-        socket.send(json.dumps(result).encode())
+    serve_ml(address, models="models", max_resident=4, metrics_address=metrics_address)
 
-    except KeyboardInterrupt:
-        break
-    except Exception as e:
-        error_response = {"status": "error", "message": str(e)}
-        socket.send(json.dumps(error_response).encode())
 
-socket.close()
+# Example 6: Async File Processing
+# process_csv / filter_data; add async = TRUE to get a job id back at once
+# and poll status / result (see file_server.py)
+def serve_file_processor(address="ipc:///tmp/file_processor", metrics_address=None):
+    from file_server import serve_files
+
+    serve_files(address, job_workers=2, metrics_address=metrics_address)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Python servers for the rfile.R examples")
+    parser.add_argument("--preload", action="store_true",
+                        help="import the subcommand's heavy dependencies before listening")
+    parser.add_argument("--metrics", default=None, metavar="ADDRESS",
+                        help="time every request and serve the metrics on this address")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    stats = commands.add_parser("stats", help="Example 1: statistics of a numeric vector")
+    stats.add_argument("--listen", default="tcp://127.0.0.1:5555")
+
+    send = commands.add_parser("send", help="Example 1_1: send test data to the R server")
+    send.add_argument("--dial", default="tcp://127.0.0.1:5555")
+
+    pub = commands.add_parser("pub", help="Examples 2 and 5: sensor publisher")
+    pub.add_argument("--example", type=int, choices=(2, 5), default=5)
+    pub.add_argument("--listen", default=None, help="override the example's address")
+    pub.add_argument("--rate", type=float, default=None, help="samples per second per topic")
+    pub.add_argument("--window", type=float, default=None, help="frame window in seconds")
+
+    pipeline = commands.add_parser("pipeline", help="Example 3: scaling pipeline (Pair)")
+    pipeline.add_argument("--listen", default="ipc:///tmp/r_python_pipeline")
+    pipeline.add_argument("--pipelines", default="pipelines", help="stream snapshot directory")
+
+    ml = commands.add_parser("ml", help="Example 4: RandomForest train / predict")
+    ml.add_argument("--listen", default="tcp://127.0.0.1:5557")
+    ml.add_argument("--verbose", action="store_true", help="log model loads and evictions")
+
+    files = commands.add_parser("files", help="Example 6: CSV processing")
+    files.add_argument("--listen", default="ipc:///tmp/file_processor")
+
+    args = parser.parse_args(argv)
+
+    if args.preload and PRELOAD[args.command]:
+        for name, seconds in preload(PRELOAD[args.command]).items():
+            print(f"Preloaded {name} in {seconds * 1000:.0f} ms")
+
+    if args.command == "stats":
+        metrics, endpoint = create_metrics(args.metrics is not None, args.metrics)
+        try:
+            serve_basic_stats(args.listen, metrics)
+        finally:
+            if endpoint is not None:
+                endpoint.close()
+    elif args.command == "send":
+        send_test_data(args.dial)
+    elif args.command == "pub":
+        publish(args.example, rate=args.rate, window=args.window, address=args.listen)
+    elif args.command == "pipeline":
+        metrics, endpoint = create_metrics(args.metrics is not None, args.metrics)
+        try:
+            serve_pipeline(args.listen, args.pipelines, metrics)
+        finally:
+            if endpoint is not None:
+                endpoint.close()
+    elif args.command == "ml":
+        if args.verbose:
+            logging.basicConfig(level=logging.INFO, format="%(message)s")
+        serve_models(args.listen, metrics_address=args.metrics)
+    elif args.command == "files":
+        serve_file_processor(args.listen, metrics_address=args.metrics)
+
+
+if __name__ == "__main__":
+    main()
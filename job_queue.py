@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+# Asynchronous job queue for long-running server actions
+# -----------------------------------------------------------------------------
+# A request with `async = TRUE` (train in the ML server, process_csv /
+# filter_data in the file server) is queued on a bounded worker pool and
+# answered immediately with {"status": "accepted", "job": id}. The client
+# then uses the job actions:
+#
+#   status  job   queued / running / done / failed / cancelled
+#   result  job   the action's normal reply once the job has finished
+#   cancel  job   cancels a job that has not started yet
+#
+# With a notify address, every finished job is also announced on a Pub0
+# socket as  b"job\0" + envelope {job, kind, state}, so clients can wait
+# for the notification instead of polling.
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+import pynng
+
+import envelope
+
+JOB_ACTIONS = ("status", "result", "cancel")
+
+
+class JobQueueFull(RuntimeError):
+    pass
+
+
+class Job:
+    def __init__(self, job_id, kind):
+        self.id = job_id
+        self.kind = kind
+        self.state = "queued"
+        self.future = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    def info(self):
+        info = {"job": self.id, "kind": self.kind, "state": self.state, "submitted": self.submitted}
+        if self.started is not None:
+            info["started"] = self.started
+        if self.finished is not None:
+            info["finished"] = self.finished
+        return info
+
+
+class JobQueue:
+    def __init__(self, workers=2, max_pending=64, max_finished=256, notify_address=None):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.counter = itertools.count(1)
+
+        self.pub = None
+        if notify_address:
+            self.pub = pynng.Pub0(listen=notify_address)
+            print(f"Job notifications on {notify_address}")
+
+    def pending(self):
+        return sum(1 for job in self.jobs.values() if job.state in ("queued", "running"))
+
+    def submit(self, kind, fn, *args):
+        """Queue fn(*args) and return the job id"""
+        with self.lock:
+            if self.pending() >= self.max_pending:
+                raise JobQueueFull(f"Job queue is full ({self.max_pending} pending jobs)")
+            job = Job(f"{next(self.counter)}-{uuid.uuid4().hex[:8]}", kind)
+            self.jobs[job.id] = job
+            self._trim()
+
+        job.future = self.executor.submit(self._run, job, fn, args)
+        job.future.add_done_callback(lambda future: self._finished(job))
+        return job.id
+
+    def _run(self, job, fn, args):
+        job.state = "running"
+        job.started = time.time()
+        return fn(*args)
+
+    def _finished(self, job):
+        job.finished = time.time()
+        if job.future.cancelled():
+            job.state = "cancelled"
+        elif job.future.exception() is not None:
+            job.state = "failed"
+        elif isinstance(job.future.result(), dict) and job.future.result().get("status") == "error":
+            job.state = "failed"
+        else:
+            job.state = "done"
+
+        if self.pub is not None:
+            try:
+                self.pub.send(b"job\0" + envelope.encode(envelope.MSG_RESULT, {
+                    "job": job.id, "kind": job.kind, "state": job.state
+                }))
+            except pynng.Closed:
+                pass
+
+    def _trim(self):
+        """Forget the oldest finished jobs beyond max_finished"""
+        finished = [k for k, job in self.jobs.items()
+                    if job.state not in ("queued", "running")]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            raise KeyError(f"Unknown job: {job_id}")
+        return job
+
+    def status(self, job_id):
+        return dict(self.get(job_id).info(), status="success")
+
+    def result(self, job_id):
+        job = self.get(job_id)
+        if not job.future.done():
+            return dict(job.info(), status="pending")
+        try:
+            result = job.future.result()
+        except CancelledError:
+            return dict(job.info(), status="error", message="Job was cancelled")
+        except Exception as e:
+            return dict(job.info(), status="error", message=str(e))
+        return dict(result, job=job.id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        cancelled = job.future.cancel()
+        message = "Job cancelled" if cancelled else f"Job is {job.state} and cannot be cancelled"
+        return dict(job.info(), status="success" if cancelled else "error", message=message)
+
+    def handle(self, request):
+        """Answer a status / result / cancel request"""
+        action = request.get("action")
+        job_id = request.get("job")
+        if job_id is None:
+            return {"status": "error", "message": f"'{action}' needs a job id"}
+        try:
+            return getattr(self, action)(job_id)
+        except KeyError as e:
+            return {"status": "error", "message": str(e.args[0])}
+
+    def accept(self, kind, fn, *args):
+        """Queue a job and build the immediate "accepted" reply"""
+        try:
+            job_id = self.submit(kind, fn, *args)
+        except JobQueueFull as e:
+            return {"status": "error", "message": str(e)}
+        return {"status": "accepted", "job": job_id}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.pub is not None:
+            self.pub.close()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+# Deferred imports for the example servers (from_p.py)
+# -----------------------------------------------------------------------------
+# pandas costs about half a second and 40 MB, scikit-learn nearly two seconds
+# and over 100 MB, before a server can listen. Modules that only need them
+# inside request handlers bind them lazily:
+#
+#   pd = lazy_import("pandas")      # nothing runs yet
+#   pd.read_csv(path)               # the first attribute access imports pandas
+#
+# The proxy is thread-safe (the servers answer on several contexts at once),
+# which importlib.util.LazyLoader is not before Python 3.12.
+#
+# scikit-learn is imported inside the functions that use it instead:
+# `import sklearn` itself is the expensive part, so a lazy `sklearn.ensemble`
+# would pay it on the first lookup anyway.
+#
+# preload() imports modules now, on purpose, so the first request does not
+# pay for them (from_p.py --preload).
+import importlib
+import sys
+import threading
+import time
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Stands in for a module until one of its attributes is needed"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self._lock = threading.Lock()
+        self._module = None
+
+    def __getattr__(self, attr):
+        # Only called for names not yet copied onto the proxy
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self.__name__)
+        value = getattr(self._module, attr)
+        setattr(self, attr, value)
+        return value
+
+
+def lazy_import(name):
+    """The module `name` if already imported, else a proxy that imports it on first use"""
+    return sys.modules.get(name) or LazyModule(name)
+
+
+def preload(names):
+    """Import every module in names now; returns {name: seconds}"""
+    timings = {}
+    for name in names:
+        start = time.perf_counter()
+        importlib.import_module(name)
+        timings[name] = time.perf_counter() - start
+    return timings
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+# Bounded, batched log view for the Tk console (python_gui_app.py)
+# -----------------------------------------------------------------------------
+# write() may be called from any thread; it only appends to a fixed-capacity
+# ring buffer. On every tick the Tk thread takes what has arrived and
+# applies it as ONE insert, trims the widget back to `max_lines` and scrolls
+# once (only if the user is already at the bottom).
+#
+# The frame budget adapts: if rendering took longer than `frame_budget`,
+# fewer lines are drawn per frame and the tick interval grows; when there is
+# headroom it shrinks back. Lines that are not drawn (ring overflow or over
+# the per-frame limit) are replaced with one "N messages dropped/coalesced"
+# marker, so a flood of log lines can never stall the main loop.
+import threading
+import time
+from collections import deque
+
+import tkinter as tk
+
+
+class LogView:
+    def __init__(self, widget, capacity=10000, max_lines=5000, frame_budget=0.016,
+                 min_interval=0.05, max_interval=0.5, max_lines_per_frame=2000):
+        self.widget = widget
+        self.max_lines = max_lines
+        self.frame_budget = frame_budget
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.line_cap = max_lines_per_frame
+
+        self.buffer = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.received = 0  # messages written since the last tick
+
+        self.interval = min_interval
+        self.lines_per_frame = max_lines_per_frame
+        self.dropped_total = 0
+
+    def write(self, message):
+        """Queue one line (thread-safe, never blocks on the UI)"""
+        with self.lock:
+            self.buffer.append(message)
+            self.received += 1
+
+    def take(self):
+        """(lines to draw, lines dropped or coalesced) since the last tick"""
+        with self.lock:
+            lines = list(self.buffer)
+            received = self.received
+            self.buffer.clear()
+            self.received = 0
+
+        skipped = received - len(lines)  # overwritten in the ring buffer
+        if len(lines) > self.lines_per_frame:
+            # Keep the newest lines; older ones are folded into the marker
+            skipped += len(lines) - self.lines_per_frame
+            lines = lines[-self.lines_per_frame:]
+        return lines, skipped
+
+    def render(self, lines, skipped):
+        text = self.widget
+        at_bottom = text.yview()[1] >= 0.999
+
+        chunk = "\n".join(lines) + "\n" if lines else ""
+        if skipped:
+            chunk = f"… {skipped} messages dropped/coalesced\n" + chunk
+        text.insert(tk.END, chunk)
+
+        # Trim the oldest lines beyond max_lines
+        line_count = int(text.index("end-1c").split(".")[0]) - 1
+        if line_count > self.max_lines:
+            text.delete("1.0", f"{line_count - self.max_lines + 1}.0")
+
+        if at_bottom:
+            text.see(tk.END)
+
+    def adapt(self, elapsed):
+        """Adjust lines per frame and the tick interval to the last render time"""
+        if elapsed > self.frame_budget:
+            self.lines_per_frame = max(100, self.lines_per_frame // 2)
+            self.interval = min(self.max_interval, self.interval * 1.5)
+        elif elapsed < self.frame_budget / 2:
+            self.lines_per_frame = min(self.line_cap, int(self.lines_per_frame * 1.25) + 1)
+            self.interval = max(self.min_interval, self.interval / 1.5)
+
+    def tick(self):
+        lines, skipped = self.take()
+        if lines or skipped:
+            start = time.perf_counter()
+            self.render(lines, skipped)
+            self.adapt(time.perf_counter() - start)
+            self.dropped_total += skipped
+        self.widget.after(int(self.interval * 1000), self.tick)
+
+    def start(self):
+        self.widget.after(int(self.interval * 1000), self.tick)
+
+    def clear(self):
+        with self.lock:
+            self.buffer.clear()
+            self.received = 0
+        self.widget.delete("1.0", tk.END)
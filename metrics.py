@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+
+# Per-request phase timing, rolling histograms and a metrics side socket
+# -----------------------------------------------------------------------------
+#   metrics = Metrics()                 # or NULL_METRICS when disabled
+#   timer = metrics.start()             # one per request, in_flight += 1
+#   ...serialize...;  timer.mark("serialize")
+#   ...send...;       timer.mark("send")
+#   timer.finish(sent=len(payload), received=len(reply), error=False)
+#
+# mark(phase) records the time since the previous mark (or start) into that
+# phase's histogram; finish() also records "total" and updates the counters
+# (requests, errors, bytes_sent, bytes_received). Histograms keep the last
+# `window` samples in a NumPy ring, so recording is O(1) and percentiles are
+# only computed when a snapshot is asked for.
+#
+# Phases used by the client (net_core.py, python_gui_app.py):
+#   serialize  array -> envelope bytes     send     queued, then handed to the socket
+#   remote     send done -> reply arrived  receive  reply copied out of nng
+#   decode     envelope / JSON -> Python
+# and by the servers (stats_server.py, ml_server.py, file_server.py, from_p.py),
+# timed from the moment a request has been received:
+#   decode, compute, serialize, send
+#
+# NULL_METRICS has the same interface and does nothing, so instrumented
+# code pays one no-op method call per mark when metrics are disabled.
+#
+# MetricsServer answers any request on its own Rep0 socket with a snapshot
+# (envelope or JSON, mirroring the request), e.g.:
+#   python -c "import pynng, json; s = pynng.Req0(dial='tcp://127.0.0.1:5590'); \
+#              s.send(b'{}'); print(json.loads(s.recv()))"
+import threading
+import time
+
+import numpy as np
+import pynng
+
+import envelope
+
+
+class RollingHistogram:
+    def __init__(self, window=4096):
+        self.samples = np.zeros(window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.samples[self.count % len(self.samples)] = seconds
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def summary(self):
+        """count / mean over all samples; percentiles over the rolling window (ms)"""
+        recent = self.samples[:min(self.count, len(self.samples))]
+        if not len(recent):
+            return {"count": 0}
+        p50, p95, p99 = np.percentile(recent, [50, 95, 99]) * 1000
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": self.max * 1000
+        }
+
+
+class RequestTimer:
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.start = self.last = time.perf_counter()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.metrics.record(phase, now - self.last)
+        self.last = now
+
+    def finish(self, sent=0, received=0, error=False):
+        self.metrics.done(time.perf_counter() - self.start, sent, received, error)
+
+
+class Metrics:
+    enabled = True
+
+    def __init__(self, window=4096):
+        self.window = window
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {"requests": 0, "errors": 0, "bytes_sent": 0, "bytes_received": 0}
+        self.in_flight = 0
+        self.started = time.time()
+
+    def start(self):
+        with self.lock:
+            self.in_flight += 1
+        return RequestTimer(self)
+
+    def record(self, phase, seconds):
+        with self.lock:
+            histogram = self.histograms.get(phase)
+            if histogram is None:
+                histogram = self.histograms[phase] = RollingHistogram(self.window)
+            histogram.record(seconds)
+
+    def done(self, seconds, sent, received, error):
+        self.record("total", seconds)
+        with self.lock:
+            self.in_flight -= 1
+            self.counters["requests"] += 1
+            self.counters["errors"] += bool(error)
+            self.counters["bytes_sent"] += sent
+            self.counters["bytes_received"] += received
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "uptime_s": time.time() - self.started,
+                "in_flight": self.in_flight,
+                "counters": dict(self.counters),
+                "phases": {name: h.summary() for name, h in self.histograms.items()}
+            }
+
+
+class NullTimer:
+    def mark(self, phase):
+        pass
+
+    def finish(self, sent=0, received=0, error=False):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class NullMetrics:
+    enabled = False
+
+    def start(self):
+        return NULL_TIMER
+
+    def record(self, phase, seconds):
+        pass
+
+    def snapshot(self):
+        return {"enabled": False}
+
+
+NULL_METRICS = NullMetrics()
+
+
+class MetricsServer:
+    def __init__(self, metrics, address):
+        self.metrics = metrics
+        self.address = address
+        self.socket = pynng.Rep0(listen=address)
+        self.thread = threading.Thread(target=self.serve, name="metrics", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        print(f"Metrics on {self.address}")
+        return self
+
+    def serve(self):
+        while True:
+            try:
+                raw_data = self.socket.recv()
+            except pynng.Closed:
+                break
+            as_envelope = envelope.is_envelope(raw_data)
+            try:
+                self.socket.send(envelope.pack_reply(self.metrics.snapshot(), as_envelope))
+            except pynng.Closed:
+                break
+
+    def close(self):
+        self.socket.close()
+
+
+def create_metrics(enabled=True, address=None):
+    """(metrics, endpoint): NULL_METRICS when disabled, a MetricsServer when address is given"""
+    if not enabled:
+        return NULL_METRICS, None
+    metrics = Metrics()
+    return metrics, MetricsServer(metrics, address).start() if address else None
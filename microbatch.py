@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+# Micro-batching for ML server predict requests
+# -----------------------------------------------------------------------------
+# Concurrent predict requests (from the ML server's contexts) are queued and
+# collected for up to `max_delay` seconds or `max_rows` rows, stacked into
+# one matrix per model, and run through predict_proba once. Predictions are
+# derived from the probabilities (argmax over classes_, which is what
+# RandomForestClassifier.predict does), so one pass over the forest serves
+# both. Each caller gets back only its own rows.
+import queue
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import Future
+
+import numpy as np
+
+PendingRequest = namedtuple("PendingRequest", ["key", "model", "features", "future"])
+
+
+class PredictBatcher:
+    def __init__(self, max_delay=0.005, max_rows=1024):
+        self.max_delay = max_delay
+        self.max_rows = max_rows
+
+        self.queue = queue.Queue()
+        self.thread = None
+
+        # Counters for the batch sizes actually achieved
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.rows = 0
+        self.size_histogram = Counter()  # requests per batch, power-of-two buckets
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.queue.put(None)
+        if self.thread is not None:
+            self.thread.join()
+
+    def submit(self, key, model, features):
+        """Queue one request; the Future resolves to (predictions, probabilities)"""
+        future = Future()
+        self.queue.put(PendingRequest(key, model, features, future))
+        return future
+
+    def collect(self, first):
+        """Gather requests until the delay or row budget runs out"""
+        batch = [first]
+        rows = len(first.features)
+        deadline = time.monotonic() + self.max_delay
+
+        while rows < self.max_rows:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                self.queue.put(None)  # let run() see the stop signal
+                break
+            batch.append(item)
+            rows += len(item.features)
+
+        return batch
+
+    def run(self):
+        while True:
+            first = self.queue.get()
+            if first is None:
+                break
+
+            batch = self.collect(first)
+
+            # One stacked pass per model (and feature width)
+            groups = {}
+            for item in batch:
+                groups.setdefault((item.key, item.features.shape[1]), []).append(item)
+            for items in groups.values():
+                self.run_group(items)
+
+    def run_group(self, items):
+        try:
+            model = items[0].model
+            X = items[0].features if len(items) == 1 else np.vstack([i.features for i in items])
+            probabilities = model.predict_proba(X)
+            predictions = model.classes_.take(np.argmax(probabilities, axis=1))
+        except Exception as e:
+            for item in items:
+                item.future.set_exception(e)
+            return
+
+        with self.lock:
+            self.requests += len(items)
+            self.batches += 1
+            self.rows += len(X)
+            self.size_histogram[1 << (len(items) - 1).bit_length()] += 1
+
+        # Scatter the result rows back to each caller
+        start = 0
+        for item in items:
+            stop = start + len(item.features)
+            item.future.set_result((predictions[start:stop], probabilities[start:stop]))
+            start = stop
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "rows": self.rows,
+                "mean_requests_per_batch": self.requests / self.batches if self.batches else 0.0,
+                "mean_rows_per_batch": self.rows / self.batches if self.batches else 0.0,
+                "batch_size_histogram": {str(k): v for k, v in sorted(self.size_histogram.items())},
+                "max_delay_ms": self.max_delay * 1000,
+                "max_rows": self.max_rows
+            }
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+
+# Example 4 ML server (from_p.py) with a persistent model registry
+# -----------------------------------------------------------------------------
+# Actions (envelope or legacy JSON requests, replies in the same format):
+#
+#   train    features, labels, [model]    fit, save as the next version
+#   predict  features, [model, version]   loads the model lazily if needed
+#   list                                  models on disk, versions, resident
+#   load     [model, version]             load into memory ahead of time
+#   evict    [model, version]             drop from memory
+#   batch_stats                           micro-batching counters
+#   status / result / cancel  job         for train requests sent with async = TRUE
+#
+# `model` defaults to "default" and `version` to the latest one, so the
+# original R client in rfile.R works unchanged. Restarting the server does
+# not require retraining: saved models are picked up from the registry.
+#
+# Requests are served on a pool of Rep0 contexts (like stats_server.py), so
+# several R clients can be in flight at once. With --batch, their predict
+# requests are micro-batched (microbatch.py): collected for up to
+# --batch-delay-ms or --batch-rows rows and run as one stacked pass.
+#
+#   python ml_server.py --models models --max-resident 4 --warm
+#   python ml_server.py --batch --batch-delay-ms 5 --batch-rows 1024
+#
+# `train` with async = TRUE is queued on a bounded job queue (job_queue.py)
+# and answered with a job id straight away.
+#
+# --processes N trains and predicts on a pool of N processes (forest_pool.py):
+# the trees are split across them, and predict batches of at least
+# --shard-rows rows are sharded by rows. Workers map the saved model
+# artifact instead of receiving a pickled copy.
+#
+#   python ml_server.py --processes 4 --shard-rows 20000
+#
+# --metrics ADDRESS times every request (decode, compute, serialize, send;
+# metrics.py) and serves the histograms and counters on that side socket.
+import argparse
+import logging
+import threading
+
+import numpy as np
+import pynng
+
+import envelope
+from job_queue import JOB_ACTIONS, JobQueue
+from metrics import NULL_METRICS, create_metrics
+from microbatch import PredictBatcher
+from model_registry import ModelRegistry
+
+DEFAULT_MODEL = "default"
+
+
+class MLServer:
+    def __init__(self, address="tcp://127.0.0.1:5557", registry=None, workers=8, batcher=None,
+                 jobs=None, metrics=NULL_METRICS, forest_pool=None):
+        self.address = address
+        self.registry = registry or ModelRegistry()
+        self.workers = workers
+        self.batcher = batcher
+        self.jobs = jobs
+        self.metrics = metrics
+        self.forest_pool = forest_pool
+
+        self.socket = None
+        self.contexts = []
+        self.threads = []
+        self.stop_event = threading.Event()
+
+    def train(self, request):
+        # scikit-learn takes seconds to import: only the first train pays for it
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.metrics import accuracy_score
+        from sklearn.model_selection import train_test_split
+
+        X = np.asarray(request["features"], dtype=np.float64)
+        y = np.asarray(request["labels"])
+        name = request.get("model", DEFAULT_MODEL)
+
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42
+        )
+
+        if self.forest_pool is not None:
+            model = self.forest_pool.fit(X_train, y_train, n_estimators=100, random_state=42)
+        else:
+            model = RandomForestClassifier(n_estimators=100, random_state=42)
+            model.fit(X_train, y_train)
+        y_pred = model.predict(X_test)
+        accuracy = accuracy_score(y_test, y_pred)
+
+        metadata = {
+            "accuracy": float(accuracy),
+            "n_features": int(X.shape[1]),
+            "n_samples": len(X)
+        }
+        version = self.registry.save(name, model, metadata)
+
+        return dict(metadata, status="success", model=name, version=version)
+
+    def predict(self, request):
+        name = request.get("model", DEFAULT_MODEL)
+        model, version = self.registry.get(name, request.get("version"))
+
+        X_new = np.asarray(request["features"], dtype=np.float64)
+        if X_new.ndim == 1:
+            X_new = X_new.reshape(1, -1)
+
+        if self.forest_pool is not None and len(X_new) >= self.forest_pool.min_rows:
+            predictions, probabilities = self.forest_pool.predict(
+                model, X_new, self.registry.artifact(name, version))
+        elif self.batcher is not None:
+            future = self.batcher.submit((name, version), model, X_new)
+            predictions, probabilities = future.result()
+        else:
+            predictions = model.predict(X_new)
+            probabilities = model.predict_proba(X_new)
+
+        if predictions.dtype.kind not in "biuf":
+            # Models trained on R factors / character labels predict strings
+            predictions = predictions.tolist()
+
+        return {
+            "status": "success",
+            "model": name,
+            "version": version,
+            "predictions": predictions,
+            "probabilities": probabilities
+        }
+
+    def handle(self, request):
+        """Dispatch one decoded request to its action"""
+        action = request.get("action")
+        name = request.get("model", DEFAULT_MODEL)
+
+        if action in JOB_ACTIONS:
+            if self.jobs is None:
+                return {"status": "error", "message": "Async jobs are not enabled"}
+            return self.jobs.handle(request)
+
+        if action == "train":
+            if request.get("async", False) and self.jobs is not None:
+                return self.jobs.accept("train", self.train, request)
+            return self.train(request)
+        elif action == "predict":
+            return self.predict(request)
+        elif action == "list":
+            return {"status": "success", "models": self.registry.list()}
+        elif action == "load":
+            version = self.registry.load(name, request.get("version"))
+            return {"status": "success", "model": name, "version": version}
+        elif action == "evict":
+            evicted = self.registry.evict(name, request.get("version"))
+            return {"status": "success", "model": name, "evicted": evicted}
+        elif action == "batch_stats":
+            if self.batcher is None:
+                return {"status": "error", "message": "Micro-batching is not enabled"}
+            return dict(self.batcher.stats(), status="success")
+
+        return {"status": "error", "message": f"Invalid action: {action}"}
+
+    def context_loop(self, context):
+        """Serve requests on one context until the socket is closed"""
+        while not self.stop_event.is_set():
+            try:
+                raw_data = context.recv()
+            except pynng.Closed:
+                break
+
+            timer = self.metrics.start()
+            use_envelope = False
+            try:
+                request, use_envelope = envelope.unpack_request(raw_data)
+                timer.mark("decode")
+                response = self.handle(request)
+            except Exception as e:
+                response = {"status": "error", "message": str(e)}
+            timer.mark("compute")
+            try:
+                reply = envelope.pack_reply(response, use_envelope)
+            except Exception as e:
+                # A reply that cannot be encoded must still answer the request
+                response = {"status": "error", "message": f"Could not encode reply: {e}"}
+                reply = envelope.pack_reply(response, use_envelope)
+            timer.mark("serialize")
+
+            try:
+                context.send(reply)
+            except pynng.Closed:
+                timer.finish(received=len(raw_data), error=True)
+                break
+            timer.mark("send")
+            timer.finish(sent=len(reply), received=len(raw_data),
+                         error=response.get("status") == "error")
+
+    def serve_forever(self):
+        self.socket = pynng.Rep0(listen=self.address)
+        self.socket.recv_max_size = 0
+        if self.batcher is not None:
+            self.batcher.start()
+        if self.forest_pool is not None:
+            self.forest_pool.warm()
+        print(f"ML Model Server ready on {self.address} ({self.workers} workers"
+              f"{', micro-batching' if self.batcher is not None else ''}"
+              f"{f', {self.forest_pool.processes} processes' if self.forest_pool is not None else ''})")
+
+        for _ in range(self.workers):
+            context = self.socket.new_context()
+            self.contexts.append(context)
+            thread = threading.Thread(target=self.context_loop, args=(context,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+        try:
+            self.stop_event.wait()
+        except KeyboardInterrupt:
+            print("Interrupted")
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        self.stop_event.set()
+        for context in self.contexts:
+            context.close()
+        if self.socket:
+            self.socket.close()
+        for thread in self.threads:
+            thread.join()
+        if self.batcher is not None:
+            self.batcher.stop()
+        if self.jobs is not None:
+            self.jobs.shutdown()
+        if self.forest_pool is not None:
+            self.forest_pool.shutdown()
+        print("ML server stopped")
+
+
+def serve_ml(address="tcp://127.0.0.1:5557", models="models", max_resident=4, warm=False,
+             workers=8, batch=False, batch_delay_ms=5.0, batch_rows=1024, job_workers=2,
+             notify=None, metrics_address=None, processes=0, shard_rows=20000):
+    registry = ModelRegistry(models, max_resident=max_resident)
+    if warm:
+        registry.warm_start()
+    batcher = PredictBatcher(batch_delay_ms / 1000, batch_rows) if batch else None
+    jobs = JobQueue(workers=job_workers, notify_address=notify)
+    metrics, endpoint = create_metrics(metrics_address is not None, metrics_address)
+    forest_pool = None
+    if processes:
+        from forest_pool import ForestPool
+        forest_pool = ForestPool(processes, min_rows=shard_rows)
+    try:
+        MLServer(address, registry, workers=workers, batcher=batcher, jobs=jobs,
+                 metrics=metrics, forest_pool=forest_pool).serve_forever()
+    finally:
+        if endpoint is not None:
+            endpoint.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Example 4 ML model server")
+    parser.add_argument("--listen", default="tcp://127.0.0.1:5557")
+    parser.add_argument("--models", default="models", help="registry directory")
+    parser.add_argument("--max-resident", type=int, default=4,
+                        help="models kept in memory (LRU)")
+    parser.add_argument("--warm", action="store_true",
+                        help="load the latest version of each model at startup")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent request contexts")
+    parser.add_argument("--batch", action="store_true", help="micro-batch predict requests")
+    parser.add_argument("--batch-delay-ms", type=float, default=5.0,
+                        help="longest a predict request waits for its batch")
+    parser.add_argument("--batch-rows", type=int, default=1024, help="rows that close a batch early")
+    parser.add_argument("--job-workers", type=int, default=2, help="concurrent async train jobs")
+    parser.add_argument("--notify", default=None,
+                        help="Pub0 address for job completion notifications")
+    parser.add_argument("--metrics", default=None, metavar="ADDRESS",
+                        help="time every request and serve the metrics on this address")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="train and predict on a pool of N processes (0: in the server)")
+    parser.add_argument("--shard-rows", type=int, default=20000,
+                        help="predict batches of at least this many rows are sharded over the pool")
+    parser.add_argument("--verbose", action="store_true", help="log model loads and evictions")
+    args = parser.parse_args(argv)
+
+    if args.verbose:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+    serve_ml(args.listen, models=args.models, max_resident=args.max_resident, warm=args.warm,
+             workers=args.workers, batch=args.batch, batch_delay_ms=args.batch_delay_ms,
+             batch_rows=args.batch_rows, job_workers=args.job_workers, notify=args.notify,
+             metrics_address=args.metrics, processes=args.processes, shard_rows=args.shard_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+# Persistent model registry for the Example 4 ML server
+# -----------------------------------------------------------------------------
+# Trained models are saved as named, versioned artifacts:
+#
+#   models/<name>/v0001.joblib   the fitted estimator
+#   models/<name>/v0001.json     metadata (accuracy, n_features, ...)
+#
+# Models are loaded lazily on first use (or warmed at startup) and kept in an
+# LRU of at most `max_resident` models. joblib memory-maps the NumPy arrays
+# inside the artifact (the trees' node and value arrays), so a loaded forest
+# shares pages with the file instead of copying it onto the heap. Loads and
+# evictions are logged to the "model_registry" logger (ml_server.py --verbose).
+# The latest version of each name is remembered (and updated by save()), so a
+# predict does not scan the model's folder.
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import joblib
+
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+$")
+VERSION_PATTERN = re.compile(r"^v(\d+)\.joblib$")
+
+log = logging.getLogger("model_registry")
+
+
+class RegistryError(LookupError):
+    pass
+
+
+class ModelRegistry:
+    def __init__(self, root="models", max_resident=4, mmap=True):
+        self.root = root
+        self.max_resident = max(1, max_resident)
+        self.mmap_mode = "r" if mmap else None
+
+        self.resident = OrderedDict()  # (name, version) -> model
+        self.latest = {}  # name -> latest saved version
+        self.lock = threading.RLock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _check_name(self, name):
+        if not NAME_PATTERN.match(name or ""):
+            raise RegistryError(f"Invalid model name: {name!r}")
+
+    def _path(self, name, version, ext):
+        return os.path.join(self.root, name, f"v{version:04d}.{ext}")
+
+    def names(self):
+        return sorted(d for d in os.listdir(self.root)
+                      if os.path.isdir(os.path.join(self.root, d)) and NAME_PATTERN.match(d))
+
+    def versions(self, name):
+        self._check_name(name)
+        folder = os.path.join(self.root, name)
+        if not os.path.isdir(folder):
+            return []
+        found = (VERSION_PATTERN.match(f) for f in os.listdir(folder))
+        return sorted(int(m.group(1)) for m in found if m)
+
+    def resolve(self, name, version=None):
+        """Return the requested version, or the latest one"""
+        with self.lock:
+            if version is None and name in self.latest:
+                return self.latest[name]
+            if version is not None and (name, int(version)) in self.resident:
+                return int(version)
+            versions = self.versions(name)
+            if versions:
+                self.latest[name] = versions[-1]
+        if not versions:
+            raise RegistryError(f"No trained model named {name!r}")
+        if version is None:
+            return versions[-1]
+        version = int(version)
+        if version not in versions:
+            raise RegistryError(f"Model {name!r} has no version {version}")
+        return version
+
+    def metadata(self, name, version):
+        try:
+            with open(self._path(name, version, "json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save(self, name, model, metadata=None):
+        """Persist a trained model as the next version and keep it resident"""
+        self._check_name(name)
+        os.makedirs(os.path.join(self.root, name), exist_ok=True)
+
+        with self.lock:
+            versions = self.versions(name)
+            version = versions[-1] + 1 if versions else 1
+
+            # Write to temporary files first so a crash never leaves half a model
+            model_path = self._path(name, version, "joblib")
+            joblib.dump(model, model_path + ".tmp")
+            os.replace(model_path + ".tmp", model_path)
+
+            meta = dict(metadata or {}, name=name, version=version, created=time.time())
+            meta_path = self._path(name, version, "json")
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump(meta, f)
+            os.replace(meta_path + ".tmp", meta_path)
+
+            self._remember((name, version), model)
+            self.latest[name] = version
+        return version
+
+    def _remember(self, key, model):
+        self.resident[key] = model
+        self.resident.move_to_end(key)
+        while len(self.resident) > self.max_resident:
+            evicted, _ = self.resident.popitem(last=False)
+            log.info("Evicted model %s v%d (LRU)", *evicted)
+
+    def get(self, name, version=None):
+        """Return (model, version), loading it from disk on first use"""
+        with self.lock:
+            version = self.resolve(name, version)
+            key = (name, version)
+            if key in self.resident:
+                self.resident.move_to_end(key)
+                return self.resident[key], version
+
+            model = joblib.load(self._path(name, version, "joblib"), mmap_mode=self.mmap_mode)
+            self._remember(key, model)
+            log.info("Loaded model %s v%d", name, version)
+            return model, version
+
+    def artifact(self, name, version):
+        """Path of a saved version's joblib file"""
+        self._check_name(name)
+        return self._path(name, int(version), "joblib")
+
+    def load(self, name, version=None):
+        return self.get(name, version)[1]
+
+    def evict(self, name, version=None):
+        """Drop a model (all versions when version is None) from memory"""
+        with self.lock:
+            keys = [k for k in self.resident
+                    if k[0] == name and (version is None or k[1] == int(version))]
+            for key in keys:
+                del self.resident[key]
+        return [k[1] for k in keys]
+
+    def warm_start(self):
+        """Load the latest version of each model, up to the LRU cap"""
+        for name in self.names()[:self.max_resident]:
+            if self.versions(name):
+                self.get(name)
+
+    def list(self):
+        models = {}
+        with self.lock:
+            for name in self.names():
+                models[name] = [
+                    dict(self.metadata(name, v), version=v, resident=(name, v) in self.resident)
+                    for v in self.versions(name)
+                ]
+        return models
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+
+# asyncio network core for the Tk client (python_gui_app.py)
+# -----------------------------------------------------------------------------
+# One event loop on one background thread owns the Req0 socket. The UI never
+# touches the socket: it submits work and gets a callback later.
+#
+#   core = NetworkCore(deliver=lambda fn: root.after(0, fn))
+#   core.start()
+#   core.connect("tcp://127.0.0.1:5556", on_connected)
+#   handle = core.request(payload, on_reply, timeout=10)
+#   handle.cancel()
+#
+# Submitted requests go through a FIFO queue. Up to `max_in_flight` of them
+# run at once, each on its own Req0 context (asend / arecv), so a burst of
+# clicks is pipelined to the server instead of interleaving send/recv on a
+# shared socket. Every request has its own timeout and can be cancelled
+# whether it is still queued or already in flight. Results and errors come
+# back as callback(result, error), run on the UI thread through `deliver`.
+# request() marks the send / remote / receive phases on an optional
+# metrics.py timer; the caller marks serialize and decode around it.
+import asyncio
+import itertools
+import threading
+import time
+
+import pynng
+
+from metrics import NULL_TIMER
+
+
+class RequestCancelled(Exception):
+    pass
+
+
+class RequestHandle:
+    def __init__(self, core, request_id, fn, callback, timeout, description, idempotent=True,
+                 pinned=False):
+        self.core = core
+        self.id = request_id
+        self.fn = fn
+        self.callback = callback
+        self.timeout = timeout
+        self.description = description
+        self.idempotent = idempotent  # safe to send again (e.g. to another server)
+        self.pinned = pinned  # needs R's session state: a pool keeps it on one server
+        self.submitted = time.monotonic()
+        self.task = None
+        self.cancelled = False
+        self.attempts = 0
+        self.redistribute = False  # set by a pool moving the request to another server
+
+    def cancel(self):
+        """Cancel the request (queued or in flight); callback gets RequestCancelled"""
+        self.core.cancel(self)
+
+
+class NetworkCore:
+    def __init__(self, deliver, max_in_flight=8, timeout=10.0):
+        self.deliver = deliver
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name="net-core", daemon=True)
+        self.ready = threading.Event()
+        self.counter = itertools.count(1)
+
+        self.socket = None
+        self.address = None
+        self.queue = None
+        self.slots = None
+        self.handles = {}  # id -> RequestHandle, queued or in flight
+        self.closing = False
+
+    # -- event loop thread ----------------------------------------------------
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._dispatch())
+        self.loop.close()
+
+    async def _dispatch(self):
+        """Take requests off the queue and start them as slots free up"""
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(self.max_in_flight)
+        self.ready.set()
+
+        while True:
+            handle = await self.queue.get()
+            if handle is None:
+                break
+            if handle.cancelled:
+                continue
+            await self.slots.acquire()
+            if handle.cancelled:
+                self.slots.release()
+                continue
+            handle.task = asyncio.ensure_future(self._execute(handle))
+            handle.task.add_done_callback(lambda task, h=handle: self._cancelled_early(task, h))
+
+        # Shutting down: stop whatever is still in flight
+        tasks = [h.task for h in self.handles.values() if h.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _execute(self, handle):
+        result, error = None, None
+        try:
+            if self.socket is None:
+                raise ConnectionError("Not connected to R server")
+            context = self.socket.new_context()
+            try:
+                result = await asyncio.wait_for(handle.fn(context), handle.timeout)
+            finally:
+                context.close()
+        except asyncio.CancelledError:
+            error = RequestCancelled(f"{handle.description} cancelled")
+        except asyncio.TimeoutError:
+            error = TimeoutError(f"{handle.description} timed out after {handle.timeout}s")
+        except Exception as e:
+            error = e
+        finally:
+            self.slots.release()
+            self.handles.pop(handle.id, None)
+        self._deliver(handle.callback, result, error)
+
+    def _cancelled_early(self, task, handle):
+        """A task cancelled before its first step never ran _execute's cleanup"""
+        if task.cancelled():
+            self.slots.release()
+            self.handles.pop(handle.id, None)
+            self._deliver(handle.callback, None, RequestCancelled(f"{handle.description} cancelled"))
+
+    def _deliver(self, callback, result, error):
+        if callback is not None and not self.closing:
+            self.deliver(lambda: callback(result, error))
+
+    async def _connect(self, address, attempts, retry_delay, progress):
+        error = None
+        for attempt in range(1, attempts + 1):
+            if progress is not None:
+                self.deliver(lambda attempt=attempt: progress(attempt, attempts))
+            try:
+                if self.socket is not None:
+                    self.socket.close()
+                    self.socket = None
+                socket = pynng.Req0()
+                socket.recv_max_size = 0
+                socket.dial(address, block=True)
+                self.socket, self.address = socket, address
+                return address
+            except pynng.NNGException as e:
+                socket.close()
+                error = e
+                if attempt < attempts:
+                    await asyncio.sleep(retry_delay)
+        raise ConnectionError(f"Connection failed after {attempts} attempts: {error}")
+
+    # -- any thread -----------------------------------------------------------
+
+    def start(self):
+        self.thread.start()
+        self.ready.wait()
+        return self
+
+    def connect(self, address, callback, attempts=3, retry_delay=1.0, progress=None):
+        """Dial address on the loop; callback(address, error) when done"""
+        future = asyncio.run_coroutine_threadsafe(
+            self._connect(address, attempts, retry_delay, progress), self.loop
+        )
+        future.add_done_callback(
+            lambda f: self._deliver(callback, None if f.exception() else f.result(), f.exception())
+        )
+
+    def submit(self, fn, callback, timeout=None, description="request", idempotent=True,
+               pinned=False):
+        """Queue `await fn(context)`; callback(result, error) runs on the UI thread"""
+        handle = RequestHandle(self, next(self.counter), fn, callback,
+                               self.timeout if timeout is None else timeout, description, idempotent,
+                               pinned)
+        self.handles[handle.id] = handle
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, handle)
+        return handle
+
+    def request(self, payload, callback, timeout=None, description="request", idempotent=True,
+                timer=NULL_TIMER, pinned=False):
+        """Send one message and wait for its reply (raw bytes); timer gets send / remote / receive"""
+        async def exchange(context):
+            await context.asend(payload)
+            timer.mark("send")
+            message = await context.arecv_msg()
+            timer.mark("remote")
+            reply = message.bytes
+            timer.mark("receive")
+            return reply
+
+        return self.submit(exchange, callback, timeout, description, idempotent, pinned)
+
+    def cancel(self, handle):
+        def cancel_in_loop():
+            if handle.task is not None:
+                handle.task.cancel()
+            elif not handle.cancelled:
+                # Still queued: the dispatcher will skip it
+                handle.cancelled = True
+                self.handles.pop(handle.id, None)
+                self._deliver(handle.callback, None,
+                              RequestCancelled(f"{handle.description} cancelled"))
+
+        self.loop.call_soon_threadsafe(cancel_in_loop)
+
+    def cancel_all(self):
+        for handle in list(self.handles.values()):
+            self.cancel(handle)
+
+    def pending(self):
+        return len(self.handles)
+
+    def close(self, final_message=None):
+        """Stop the loop; optionally send one last message (no reply expected)"""
+        self.closing = True
+        if self.queue is not None:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+            self.thread.join(timeout=5)
+        if self.socket is not None:
+            try:
+                if final_message is not None:
+                    self.socket.send(final_message)
+            except pynng.NNGException:
+                pass
+            self.socket.close()
+            self.socket = None
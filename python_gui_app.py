@@ -5,25 +5,103 @@
 
 import tkinter as tk
 from tkinter import ttk, scrolledtext
-import pynng
 import numpy as np
 import json
 import time
-import threading
-import queue
+
+import envelope
+from log_view import LogView
+from metrics import NULL_TIMER, create_metrics
+from net_core import RequestCancelled
+from r_batch import arun_batch
+from r_pool import RPool
+from result_cache import ResultCache
+from stream_plot import StreamPlot
+from streaming_stats import DEFAULT_CHUNK_SIZE, astream_chunks, iter_chunks
+
+# R servers to balance requests over; with SPAWN_R_WORKERS > 0 the app starts
+# that many Rscript workers itself (ports 5570, 5571, ...) instead
+R_SERVER_ADDRESSES = ["tcp://127.0.0.1:5556"]
+SPAWN_R_WORKERS = 0
+REQUESTS_PER_WORKER = 2
+
+# Arrays above this many values are streamed to R in chunks
+STREAM_THRESHOLD = 1_000_000
+
+# Seconds before a request (or a whole stream) is given up
+REQUEST_TIMEOUT = 30.0
+STREAM_TIMEOUT = 600.0
+
+# Connection supervision (r_pool.py): every R server is pinged on a side
+# socket each HEARTBEAT_INTERVAL seconds; an idle one that misses
+# HEARTBEAT_MISSES replies of HEARTBEAT_TIMEOUT seconds in a row is down, a
+# busy one (R only answers between requests) HEARTBEAT_BUSY_MISSES, and a
+# dropped connection is noticed at once. Down servers are probed again with
+# backoff up to RECONNECT_MAX_BACKOFF seconds and their idempotent requests
+# move to the others
+HEARTBEAT_INTERVAL = 1.0
+HEARTBEAT_TIMEOUT = 1.0
+HEARTBEAT_MISSES = 2
+HEARTBEAT_BUSY_MISSES = 30
+RECONNECT_MAX_BACKOFF = 4.0
+
+# Console: lines buffered between frames, lines kept in the widget
+LOG_CAPACITY = 20000
+LOG_MAX_LINES = 5000
+
+# Per-request phase timings (serialize, send, remote, receive, decode) for the
+# Metrics panel, also served on METRICS_ADDRESS (None: no side socket).
+# Disabled, requests carry a no-op timer and the panel is not shown.
+METRICS_ENABLED = True
+METRICS_ADDRESS = "tcp://127.0.0.1:5590"
+METRICS_REFRESH_MS = 1000
+METRICS_PHASES = ("serialize", "cache", "send", "remote", "receive", "decode", "total")
+
+# Identical data and side-effect-free R commands are answered from a local
+# cache of R's replies (result_cache.py); None in the allowlist means any
+# command the denylist does not refuse
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_MB = 64
+RESULT_CACHE_TTL = 300.0
+RESULT_CACHE_ALLOW = None
+
+# Live plot of the Example 5 publisher (sensor_publisher.py): the last
+# PLOT_WINDOW seconds of every topic, decimated to the canvas width
+# ("minmax" or "lttb"), from at most PLOT_CAPACITY samples per topic
+PLOT_ENABLED = True
+PLOT_ADDRESS = "tcp://127.0.0.1:5558"
+PLOT_TOPICS = ("temp", "press", "vib")
+PLOT_WINDOW = 10.0
+PLOT_CAPACITY = 1_000_000
+PLOT_MODE = "minmax"
 
 class EnhancedApp:
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("R-Python Communication (Enhanced)")
-        self.root.geometry("1200x700")
+        self.root.geometry("1200x900")
 
-        self.socket = None
         self.connected = False
-        self.output_queue = queue.Queue()
+
+        # All socket I/O runs on one asyncio loop thread; results come back via root.after.
+        # Requests go to the least busy healthy R server of the pool.
+        self.net = RPool(deliver=lambda fn: self.root.after(0, fn), per_worker=REQUESTS_PER_WORKER,
+                         timeout=REQUEST_TIMEOUT, health_interval=HEARTBEAT_INTERVAL,
+                         ping_timeout=HEARTBEAT_TIMEOUT, max_missed=HEARTBEAT_MISSES,
+                         max_busy_missed=HEARTBEAT_BUSY_MISSES,
+                         max_backoff=RECONNECT_MAX_BACKOFF, on_health=self.worker_health,
+                         on_primary=self.primary_moved)
+        self.net.start()
+        self.r_addresses = None
+
+        self.metrics, self.metrics_endpoint = create_metrics(METRICS_ENABLED, METRICS_ADDRESS)
+        self.cache = ResultCache(int(RESULT_CACHE_MB * 1024 * 1024), RESULT_CACHE_TTL,
+                                 allow=RESULT_CACHE_ALLOW) if RESULT_CACHE_ENABLED else None
 
         self.setup_ui()
-        self.update_display()
+        self.log_view.start()
+        if self.metrics.enabled:
+            self.refresh_metrics()
 
     def setup_ui(self):
         # Status and controls
@@ -37,6 +115,30 @@ class EnhancedApp:
         ttk.Button(status_frame, text="Test (1,2,3,4,5)", command=self.test_simple).pack(side=tk.LEFT, padx=5)
         ttk.Button(status_frame, text="Random Data", command=self.send_random_data).pack(side=tk.LEFT, padx=5)
         ttk.Button(status_frame, text="Large Dataset", command=self.send_large_data).pack(side=tk.LEFT, padx=5)
+        ttk.Button(status_frame, text="Stream 10M", command=self.send_streamed_data).pack(side=tk.LEFT, padx=5)
+        ttk.Button(status_frame, text="Cancel Pending", command=self.cancel_pending).pack(side=tk.LEFT, padx=5)
+        ttk.Button(status_frame, text="Workers", command=self.show_workers).pack(side=tk.LEFT, padx=5)
+        if self.cache is not None:
+            ttk.Button(status_frame, text="Cache", command=self.show_cache).pack(side=tk.LEFT, padx=5)
+        if PLOT_ENABLED:
+            ttk.Button(status_frame, text="Live Plot", command=self.toggle_plot).pack(side=tk.LEFT, padx=5)
+
+        # Request metrics
+        if self.metrics.enabled:
+            metrics_frame = ttk.LabelFrame(self.root, text="Request Metrics", padding=5)
+            metrics_frame.pack(fill=tk.X, padx=10, pady=5)
+            self.metrics_label = ttk.Label(metrics_frame, font=('Consolas', 9), justify=tk.LEFT)
+            self.metrics_label.pack(anchor=tk.W)
+
+        # Live sensor streams
+        self.plot = None
+        if PLOT_ENABLED:
+            plot_frame = ttk.LabelFrame(self.root, text="Live Streams", padding=5)
+            plot_frame.pack(fill=tk.X, padx=10, pady=5)
+            canvas = tk.Canvas(plot_frame, height=180, bg='#1e1e1e', highlightthickness=0)
+            canvas.pack(fill=tk.X, expand=True)
+            self.plot = StreamPlot(canvas, PLOT_TOPICS, window=PLOT_WINDOW, capacity=PLOT_CAPACITY,
+                                   mode=PLOT_MODE)
 
         # Console
         console_frame = ttk.LabelFrame(self.root, text="Communication Log", padding=10)
@@ -47,6 +149,8 @@ class EnhancedApp:
             bg='#1e1e1e', fg='#d4d4d4', font=('Consolas', 9)
         )
         self.console.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+        # Ring-buffered, one insert per frame, trimmed to the newest lines
+        self.log_view = LogView(self.console, capacity=LOG_CAPACITY, max_lines=LOG_MAX_LINES)
 
         # Input sections
         input_frame = ttk.Frame(console_frame)
@@ -68,6 +172,7 @@ class EnhancedApp:
         self.cmd_input = ttk.Entry(cmd_frame, width=50)
         self.cmd_input.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
         self.cmd_input.bind('<Return>', self.send_r_command)
+        ttk.Button(cmd_frame, text="Batch...", command=self.open_batch_dialog).pack(side=tk.RIGHT, padx=(5, 0))
         ttk.Button(cmd_frame, text="Execute", command=self.send_r_command).pack(side=tk.RIGHT)
 
     def log_message(self, message, msg_type="info"):
@@ -81,43 +186,116 @@ class EnhancedApp:
             "receive": "←"
         }.get(msg_type, "•")
 
-        self.output_queue.put(f"[{timestamp}] {prefix} {message}")
+        self.log_view.write(f"[{timestamp}] {prefix} {message}")
 
     def connect_to_r(self):
-        """Connect to R server"""
-        def try_connect():
-            if self.connected:
-                self.log_message("Already connected!", "info")
-                return
-
-            max_attempts = 3
-            for attempt in range(max_attempts):
-                try:
-                    self.log_message(f"Connecting to R server... attempt {attempt + 1}/{max_attempts}", "info")
-
-                    if self.socket:
-                        try:
-                            self.socket.close()
-                        except:
-                            pass
-
-                    self.socket = pynng.Req0()
-                    self.socket.dial("tcp://127.0.0.1:5556")
-
-                    self.connected = True
-                    self.log_message("Connected to R server!", "success")
-                    self.root.after(0, lambda: self.status_label.config(text="Status: Connected", foreground="green"))
-                    return
-
-                except Exception as e:
-                    self.log_message(f"Connection attempt {attempt + 1} failed: {str(e)}", "error")
-                    if attempt < max_attempts - 1:
-                        time.sleep(1)
-
-            self.log_message("Connection failed after all attempts", "error")
-            self.log_message("Make sure R server is running first!", "info")
+        """Connect to the R server pool"""
+        if self.connected:
+            self.log_message("Already connected!", "info")
+            return
 
-        threading.Thread(target=try_connect, daemon=True).start()
+        if self.r_addresses is None:
+            if SPAWN_R_WORKERS > 0:
+                self.log_message(f"Starting {SPAWN_R_WORKERS} Rscript workers...", "info")
+                self.r_addresses = self.net.spawn(SPAWN_R_WORKERS)
+            else:
+                self.r_addresses = R_SERVER_ADDRESSES
+
+        def connected(addresses, error):
+            if error is not None:
+                self.log_message(str(error), "error")
+                self.log_message("Make sure R server is running first!", "info")
+                return
+            self.connected = True
+            self.log_message(f"Connected to {len(addresses)}/{len(self.r_addresses)} R server(s)!", "success")
+            self.show_pool_status()
+
+        self.log_message(f"Connecting to R server(s): {', '.join(self.r_addresses)}", "info")
+        self.net.connect(self.r_addresses, connected)
+
+    def show_workers(self):
+        """Log the health and load of every R server in the pool"""
+        for worker in self.net.stats():
+            state = "up" if worker["healthy"] else f"down ({worker['last_error']})"
+            self.log_message(f"{worker['address']}: {state}, {worker['outstanding']} in flight, "
+                             f"{worker['completed']} done, ping {worker['rtt_ms']} ms "
+                             f"(mean {worker['rtt_mean_ms']}, max {worker['rtt_max_ms']}), "
+                             f"{worker['reconnects']} reconnects", "info")
+
+    def worker_health(self, address, error):
+        """The pool saw an R server go down (error) or come back (None)"""
+        if error is None:
+            self.log_message(f"R server {address} is back", "success")
+        else:
+            self.log_message(f"R server {address} is down ({error}), reconnecting", "error")
+        self.show_pool_status()
+
+    def primary_moved(self, address, error):
+        """R commands moved to another R server: variables defined so far are gone"""
+        self.log_message(f"R commands now run on {address}, a fresh R session", "error")
+        if self.cache is not None:
+            self.cache.invalidate_commands()
+
+    def show_pool_status(self):
+        up = sum(worker["healthy"] for worker in self.net.stats())
+        if up:
+            self.status_label.config(text=f"Status: Connected ({up}/{len(self.r_addresses)} R)",
+                                     foreground="green")
+        else:
+            self.status_label.config(text="Status: Reconnecting...", foreground="orange")
+
+    def refresh_metrics(self):
+        """Redraw the metrics panel from a snapshot, then again in METRICS_REFRESH_MS"""
+        snapshot = self.metrics.snapshot()
+        counters = snapshot["counters"]
+        lines = [
+            f"requests {counters['requests']}   in flight {snapshot['in_flight']}   "
+            f"errors {counters['errors']}   sent {counters['bytes_sent'] / 1e6:.2f} MB   "
+            f"received {counters['bytes_received'] / 1e6:.2f} MB",
+            f"{'phase':<10}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+        ]
+        for phase in METRICS_PHASES:
+            summary = snapshot["phases"].get(phase, {"count": 0})
+            if summary["count"]:
+                lines.append(f"{phase:<10}{summary['count']:>8}{summary['p50_ms']:>10.2f}"
+                             f"{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}{summary['max_ms']:>10.2f}")
+            else:
+                lines.append(f"{phase:<10}{0:>8}{'-':>10}{'-':>10}{'-':>10}{'-':>10}")
+        self.metrics_label.config(text="\n".join(lines))
+        self.root.after(METRICS_REFRESH_MS, self.refresh_metrics)
+
+    def show_cache(self):
+        """Log the result cache counters"""
+        stats = self.cache.stats()
+        self.log_message(f"Result cache: {self.cache.summary()}", "info")
+        self.log_message(f"  expired {stats['expired']}, evicted {stats['evicted']}, "
+                         f"commands not cached {stats['refused']}", "info")
+
+    def toggle_plot(self):
+        """Subscribe the live plot to the sensor publisher, or stop it"""
+        if self.plot.running:
+            self.plot.stop()
+            self.plot.unsubscribe()
+            self.log_message("Live plot stopped", "info")
+        else:
+            self.plot.subscribe(PLOT_ADDRESS)
+            self.plot.start()
+            self.log_message(f"Live plot subscribed to {PLOT_ADDRESS} ({', '.join(PLOT_TOPICS)})", "info")
+
+    def request_failed(self, error, what="Communication"):
+        """Log a failed request; the pool reconnects to failed R servers by itself"""
+        if isinstance(error, RequestCancelled):
+            self.log_message(str(error), "info")
+        elif isinstance(error, TimeoutError):
+            self.log_message(str(error), "error")
+        else:
+            self.log_message(f"{what} error: {error}", "error")
+
+    def cancel_pending(self):
+        """Cancel every queued or in-flight request"""
+        pending = self.net.pending()
+        self.net.cancel_all()
+        self.log_message(f"Cancelling {pending} pending request(s)", "info")
 
     def send_data_to_r(self, data, description="data"):
         """Send numeric data to R with detailed logging"""
@@ -125,51 +303,126 @@ class EnhancedApp:
             self.log_message("Not connected to R server", "error")
             return
 
-        def send():
-            try:
-                # Convert to numpy array
-                data_array = np.array(data).astype(np.float64)
-                data_bytes = data_array.tobytes()
+        if len(data) > STREAM_THRESHOLD:
+            self.stream_data_to_r(iter_chunks(data), len(data), description)
+            return
 
-                # Log what we're sending
-                if len(data) <= 10:
-                    data_preview = f"[{', '.join(f'{x:.2f}' for x in data)}]"
-                else:
-                    data_preview = f"[{', '.join(f'{x:.2f}' for x in data[:5])}, ... {len(data)} total values]"
+        # Convert to numpy array and wrap it in an envelope
+        timer = self.metrics.start()
+        data_array = np.array(data).astype(np.float64)
+
+        # Same data as before: R's earlier reply still holds
+        cache_key = None
+        if self.cache is not None:
+            lookup = time.perf_counter()
+            cache_key = self.cache.key("stats", data_array)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                timer.mark("cache")
+                self.log_message(f"Cache hit for {description} in {(time.perf_counter() - lookup) * 1e6:.0f} µs "
+                                 f"({self.cache.summary()})", "success")
+                self.show_stats_reply(cached, None, timer)
+                return
 
-                self.log_message(f"Sending {description}: {data_preview}", "send")
-                self.log_message(f"Data size: {len(data)} values, {len(data_bytes)} bytes", "info")
+        data_bytes = envelope.encode(envelope.MSG_DATA, {"data": data_array})
+        timer.mark("serialize")
 
-                # Send data
-                self.socket.send(data_bytes)
+        # Log what we're sending
+        if len(data) <= 10:
+            data_preview = f"[{', '.join(f'{x:.2f}' for x in data)}]"
+        else:
+            data_preview = f"[{', '.join(f'{x:.2f}' for x in data[:5])}, ... {len(data)} total values]"
 
-                # Receive response
-                response_bytes = self.socket.recv()
-                response_text = response_bytes.decode('utf-8').strip()
+        self.log_message(f"Sending {description}: {data_preview}", "send")
+        self.log_message(f"Data size: {len(data)} values, {len(data_bytes)} bytes", "info")
 
-                self.log_message(f"Raw response from R: '{response_text}'", "receive")
+        # Queued on the network loop; concurrent clicks are pipelined, not raced
+        def on_reply(reply, error):
+            if error is None and cache_key is not None:
+                self.cache.put(cache_key, reply)
+            self.show_stats_reply(reply, error, timer, len(data_bytes))
 
-                # Parse JSON response
-                try:
-                    result = json.loads(response_text)
-                    self.log_message("R computed statistics:", "success")
-                    for key, value in result.items():
-                        self.log_message(f"  {key}: {value}", "info")
+        self.net.request(data_bytes, on_reply, description=f"Sending {description}", timer=timer)
 
-                except json.JSONDecodeError as je:
-                    self.log_message(f"JSON parsing failed: {je}", "error")
-                    self.log_message(f"Response length: {len(response_text)} chars", "info")
-                    if len(response_text) > 100:
-                        self.log_message(f"First 100 chars: '{response_text[:100]}'", "info")
-                    else:
-                        self.log_message(f"Full response: '{response_text}'", "info")
+    def show_stats_reply(self, response_bytes, error, timer=NULL_TIMER, sent=0):
+        """Log R's reply to a data request (runs on the Tk thread)"""
+        if error is not None:
+            timer.finish(sent, error=not isinstance(error, RequestCancelled))
+            self.request_failed(error)
+            return
 
-            except Exception as e:
-                self.log_message(f"Communication error: {e}", "error")
-                self.connected = False
-                self.root.after(0, lambda: self.status_label.config(text="Status: Disconnected", foreground="red"))
+        # The timer is finished on every path (also when decoding raises)
+        failed = True
+        try:
+            if envelope.is_envelope(response_bytes):
+                reply = envelope.decode(response_bytes)
+                timer.mark("decode")
+                if reply.msg_type == envelope.MSG_ERROR:
+                    self.log_message(f"R error: {reply.get('message')}", "error")
+                    return
+                self.log_message("R computed statistics:", "success")
+                for key, value in reply.fields.items():
+                    self.log_message(f"  {key}: {value}", "info")
+                failed = False
+                return
+
+            # Older R servers reply with JSON text
+            response_text = response_bytes.decode('utf-8', errors='replace').strip()
+
+            self.log_message(f"Raw response from R: '{response_text}'", "receive")
+
+            # Parse JSON response
+            try:
+                result = json.loads(response_text)
+                timer.mark("decode")
+                self.log_message("R computed statistics:", "success")
+                for key, value in result.items():
+                    self.log_message(f"  {key}: {value}", "info")
+                failed = False
+
+            except json.JSONDecodeError as je:
+                self.log_message(f"JSON parsing failed: {je}", "error")
+                self.log_message(f"Response length: {len(response_text)} chars", "info")
+                if len(response_text) > 100:
+                    self.log_message(f"First 100 chars: '{response_text[:100]}'", "info")
+                else:
+                    self.log_message(f"Full response: '{response_text}'", "info")
+        except Exception as e:
+            self.log_message(f"Could not read R's reply: {e}", "error")
+        finally:
+            timer.finish(sent, len(response_bytes), error=failed)
+
+    def stream_data_to_r(self, chunks, total, description="data"):
+        """Send a large dataset as a chunked stream; R keeps running statistics"""
+        if not self.connected:
+            self.log_message("Not connected to R server", "error")
+            return
 
-        threading.Thread(target=send, daemon=True).start()
+        self.log_message(f"Streaming {description}: {total} values in chunks of {DEFAULT_CHUNK_SIZE}", "send")
+        start = time.time()
+        timer = self.metrics.start()  # the whole stream counts as one request
+        next_report = [0.1]
+
+        def progress(chunks_sent, values_sent, partial):
+            # Called on the network loop; log_message only touches the queue
+            if values_sent / total >= next_report[0]:
+                self.log_message(f"  {values_sent}/{total} values sent ({100 * values_sent / total:.0f}%)", "info")
+                next_report[0] += 0.1
+
+        def finished(result, error):
+            timer.finish(total * 8, error=error is not None and not isinstance(error, RequestCancelled))
+            if error is not None:
+                self.request_failed(error)
+                return
+            self.log_message(f"R computed streaming statistics in {time.time() - start:.2f}s:", "success")
+            for key, value in result.items():
+                self.log_message(f"  {key}: {value}", "info")
+
+        # The whole stream runs on one context, so its chunks stay in order
+        self.net.submit(
+            lambda context: astream_chunks(context, chunks, quantiles=[0.25, 0.5, 0.75], progress=progress),
+            finished, timeout=STREAM_TIMEOUT, description=f"Streaming {description}", idempotent=False
+        )
 
     def test_simple(self):
         """Test with simple data"""
@@ -187,6 +440,16 @@ class EnhancedApp:
         data = np.random.uniform(0, 100, 100).tolist()
         self.send_data_to_r(data, "large uniform data (0-100)")
 
+    def send_streamed_data(self):
+        """Stream 10 million values, generated one chunk at a time"""
+        total = 10_000_000
+
+        def chunks():
+            for start in range(0, total, DEFAULT_CHUNK_SIZE):
+                yield np.random.normal(50, 15, min(DEFAULT_CHUNK_SIZE, total - start))
+
+        self.stream_data_to_r(chunks(), total, "streamed normal data (μ=50, σ=15)")
+
     def send_custom_data(self, event=None):
         """Send custom data from input"""
         data_str = self.data_input.get().strip()
@@ -212,59 +475,171 @@ class EnhancedApp:
             self.log_message("Not connected to R server", "error")
             return
 
-        def send():
-            try:
-                self.log_message(f"Executing R command: {command}", "send")
-
-                # Send as text
-                self.socket.send(command.encode('utf-8'))
-                response = self.socket.recv()
-                result = response.decode('utf-8').strip()
-
-                self.log_message(f"R command result:", "receive")
-                # Split long results into multiple lines
-                if len(result) > 80:
-                    lines = result.split('\n')
-                    for line in lines:
-                        self.log_message(f"  {line}", "info")
-                else:
-                    self.log_message(f"  {result}", "info")
+        self.log_message(f"Executing R command: {command}", "send")
 
-                self.root.after(0, lambda: self.cmd_input.delete(0, tk.END))
+        timer = self.metrics.start()
+        payload = envelope.encode(envelope.MSG_COMMAND, {"command": command})
+        timer.mark("serialize")
 
+        def show_result(response, error):
+            if error is not None:
+                timer.finish(len(payload), error=not isinstance(error, RequestCancelled))
+                self.request_failed(error, "Command execution")
+                return
+
+            try:
+                if envelope.is_envelope(response):
+                    reply = envelope.decode(response)
+                    timer.mark("decode")
+                    if reply.msg_type == envelope.MSG_ERROR:
+                        timer.finish(len(payload), len(response), error=True)
+                        self.log_message(f"R error: {reply.get('message')}", "error")
+                        return
+                    result = reply.get("output", "").strip()
+                else:
+                    result = response.decode('utf-8', errors='replace').strip()
+                    timer.mark("decode")
             except Exception as e:
-                self.log_message(f"Command execution error: {e}", "error")
+                timer.finish(len(payload), len(response), error=True)
+                self.log_message(f"Could not read R's reply: {e}", "error")
+                return
+            timer.finish(len(payload), len(response))
+
+            self.log_message(f"R command result:", "receive")
+            # Split long results into multiple lines
+            if len(result) > 80:
+                lines = result.split('\n')
+                for line in lines:
+                    self.log_message(f"  {line}", "info")
+            else:
+                self.log_message(f"  {result}", "info")
+
+        self.cmd_input.delete(0, tk.END)
+
+        cache_key = generation = None
+        if self.cache is not None:
+            if self.cache.cacheable(command):
+                cache_key = self.cache.key("command", command)
+                generation = self.cache.generation
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    timer.mark("cache")
+                    self.log_message(f"Cache hit for R command ({self.cache.summary()})", "success")
+                    show_result(cached, None)
+                    return
+            else:
+                # May change R's state: earlier command results no longer hold
+                self.cache.refuse()
+
+        def on_reply(response, error):
+            if error is None and cache_key is not None:
+                # Not stored if a state-changing command was sent in the meantime
+                self.cache.put(cache_key, response, generation)
+            show_result(response, error)
+
+        # Send as a command envelope
+        # Pinned: every command runs in the same R session (the pool's primary)
+        self.net.request(payload, on_reply, description=f"R command '{command}'", idempotent=False,
+                         timer=timer, pinned=True)
+
+    def open_batch_dialog(self):
+        """Dialog for several R commands (one per line) or a whole script"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Run R Batch")
+        dialog.geometry("640x420")
+
+        text = scrolledtext.ScrolledText(dialog, height=18, font=('Consolas', 9))
+        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+        text.focus_set()
+
+        options = ttk.Frame(dialog)
+        options.pack(fill=tk.X, padx=10, pady=(0, 10))
+        as_script = tk.BooleanVar(value=False)
+        stop_on_error = tk.BooleanVar(value=True)
+        stream = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options, text="Whole script", variable=as_script).pack(side=tk.LEFT)
+        ttk.Checkbutton(options, text="Stop on error", variable=stop_on_error).pack(side=tk.LEFT, padx=10)
+        ttk.Checkbutton(options, text="Stream output", variable=stream).pack(side=tk.LEFT)
+
+        def run():
+            source = text.get("1.0", tk.END).strip()
+            if not source:
+                return
+            if as_script.get():
+                # R splits it into top-level expressions
+                self.run_r_batch(script=source, stop_on_error=stop_on_error.get(), stream=stream.get())
+            else:
+                commands = [line.strip() for line in source.splitlines() if line.strip()]
+                self.run_r_batch(commands, stop_on_error=stop_on_error.get(), stream=stream.get())
+            dialog.destroy()
+
+        ttk.Button(options, text="Run", command=run).pack(side=tk.RIGHT)
+        ttk.Button(options, text="Cancel", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+
+    def run_r_batch(self, commands=None, script=None, stop_on_error=True, stream=True):
+        """Run many R commands in one round trip, with a result per command"""
+        if not self.connected:
+            self.log_message("Not connected to R server", "error")
+            return
 
-        threading.Thread(target=send, daemon=True).start()
+        what = f"{len(commands)} R commands" if script is None else "an R script"
+        self.log_message(f"Running a batch of {what}", "send")
+        start = time.time()
+        timer = self.metrics.start()  # the whole batch counts as one request
+        if self.cache is not None and not all(map(self.cache.cacheable, commands or [script])):
+            # May change R's state: earlier command results no longer hold
+            self.cache.refuse()
+
+        def progress(results, done, total):
+            # Called on the network loop after every reply; log_message only touches the queue
+            for r in results:
+                self.log_message(f"[{r.index + 1}/{total}] {r.command}  ({r.elapsed * 1000:.0f} ms)",
+                                 "receive" if r.ok else "error")
+                for text in (r.output, r.result):
+                    for line in text.splitlines():
+                        self.log_message(f"  {line}", "info")
+                if not r.ok:
+                    self.log_message(f"  Error: {r.error}", "error")
+
+        def finished(batch, error):
+            timer.finish(error=error is not None and not isinstance(error, RequestCancelled))
+            if error is not None:
+                self.request_failed(error, "Batch execution")
+                return
+            failed = sum(not r.ok for r in batch.results)
+            summary = (f"Batch finished in {time.time() - start:.2f}s: "
+                       f"{len(batch.results)}/{batch.total} commands run, {failed} failed")
+            if batch.stopped:
+                summary += " (stopped at the first error)"
+            self.log_message(summary, "error" if failed else "success")
+
+        # One context keeps every slice on one R worker; pinned makes it the same
+        # session as the single commands
+        self.net.submit(
+            lambda context: arun_batch(context, commands, script,
+                                       on_error="stop" if stop_on_error else "continue",
+                                       stream=stream, progress=progress),
+            finished, timeout=STREAM_TIMEOUT, description=f"Batch of {what}", idempotent=False,
+            pinned=True
+        )
 
     def clear_console(self):
         """Clear console"""
-        self.console.delete(1.0, tk.END)
+        self.log_view.clear()
         self.log_message("Console cleared", "info")
 
-    def update_display(self):
-        """Update console from queue"""
-        try:
-            while True:
-                message = self.output_queue.get_nowait()
-                self.console.insert(tk.END, f"{message}\n")
-                self.console.see(tk.END)
-        except queue.Empty:
-            pass
-
-        self.root.after(100, self.update_display)
-
     def run(self):
         try:
             self.log_message("App started - Click 'Connect to R' to begin", "info")
             self.root.mainloop()
         finally:
-            if self.socket:
-                try:
-                    self.socket.send(bytes([255]))  # Shutdown signal
-                    self.socket.close()
-                except:
-                    pass
+            # Shutdown signal
+            shutdown = envelope.encode(envelope.MSG_CONTROL, {"action": "shutdown"})
+            self.net.close(final_message=shutdown if self.connected else None)
+            if self.metrics_endpoint is not None:
+                self.metrics_endpoint.close()
+            if self.plot is not None:
+                self.plot.unsubscribe()
 
 if __name__ == "__main__":
     app = EnhancedApp()
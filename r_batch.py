@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+# Batched R command execution: many commands, one round trip
+# -----------------------------------------------------------------------------
+# A plain command envelope runs one command per Req/Rep exchange, so a script
+# of 200 small commands pays 200 trips through the single-threaded R loop.
+# A batch sends them together and gets one result per command back:
+#
+#   first message : envelope MSG_COMMAND {batch, commands[] | script,
+#                                         on_error, stream, slice_ms}
+#   continuation  : envelope MSG_COMMAND {batch}
+#   reply         : envelope MSG_RESULT  {batch, first, total, done, stopped,
+#                                         command[], ok[], result[],
+#                                         output[], error[], elapsed[]}
+#
+# `commands` are run one by one; a `script` is split by R into its top-level
+# expressions (so multi-line function definitions stay whole). `result` is
+# the printed value of a visible result, `output` anything the command wrote
+# itself, `elapsed` its wall time in seconds. With on_error = "stop" the batch
+# ends at the first failing command ("stopped"), with "continue" it runs on.
+#
+# Streaming: R replies after every slice_ms of work instead of at the end
+# and keeps the rest of the batch; the client asks for the next slice with a
+# continuation until `done`, so output from long batches shows up as it is
+# produced. The whole exchange has to stay on one R worker (RPool.submit).
+#
+#   batch = run_batch(socket, ["x <- rnorm(100)", "mean(x)", "summary(x)"])
+#   for r in batch.results:
+#       print(r.index, r.ok, r.result, r.error, r.elapsed)
+import uuid
+from collections import namedtuple
+
+import envelope
+
+DEFAULT_SLICE_MS = 250  # streamed batches: R replies after this much work
+
+CommandResult = namedtuple("CommandResult", "index command ok result output error elapsed")
+BatchResult = namedtuple("BatchResult", "results stopped total")
+
+
+def batch_message(batch_id, commands=None, script=None, on_error="stop", stream=False,
+                  slice_ms=DEFAULT_SLICE_MS):
+    """The first message of a batch: a list of commands or one script"""
+    if (commands is None) == (script is None):
+        raise ValueError("Give either commands or a script")
+    if on_error not in ("stop", "continue"):
+        raise ValueError(f"on_error must be 'stop' or 'continue', not {on_error!r}")
+
+    fields = {"batch": batch_id}
+    if script is not None:
+        fields["script"] = script
+    else:
+        fields["commands"] = list(commands)
+    fields.update(on_error=on_error, stream=bool(stream), slice_ms=slice_ms)
+    return envelope.encode(envelope.MSG_COMMAND, fields)
+
+
+def continue_message(batch_id):
+    """Ask R for the next slice of a streamed batch"""
+    return envelope.encode(envelope.MSG_COMMAND, {"batch": batch_id})
+
+
+def parse_reply(raw):
+    """(reply fields, [CommandResult]) of one batch reply"""
+    reply = envelope.decode(raw)
+    if reply.msg_type == envelope.MSG_ERROR:
+        raise RuntimeError(reply.get("message"))
+    fields = reply.fields
+
+    first = fields["first"]
+    results = [
+        CommandResult(first + i, command, bool(ok), result, output, error, float(elapsed))
+        for i, (command, ok, result, output, error, elapsed) in enumerate(zip(
+            fields["command"], fields["ok"], fields["result"], fields["output"],
+            fields["error"], fields["elapsed"]))
+    ]
+    return fields, results
+
+
+def run_batch(socket, commands=None, script=None, on_error="stop", stream=False,
+              slice_ms=DEFAULT_SLICE_MS, progress=None):
+    """Run a batch over a Req socket and return a BatchResult
+
+    progress(results, results_so_far, total) is called after every reply
+    with the results it carried (once for an unstreamed batch).
+    """
+    batch_id = uuid.uuid4().hex
+    message = batch_message(batch_id, commands, script, on_error, stream, slice_ms)
+    results = []
+    while True:
+        socket.send(message)
+        fields, part = parse_reply(socket.recv())
+        results.extend(part)
+        if progress is not None:
+            progress(part, len(results), fields["total"])
+        if fields["done"]:
+            return BatchResult(results, fields["stopped"], fields["total"])
+        message = continue_message(batch_id)
+
+
+async def arun_batch(context, commands=None, script=None, on_error="stop", stream=False,
+                     slice_ms=DEFAULT_SLICE_MS, progress=None):
+    """run_batch() over a Req0 context with asend / arecv (for asyncio clients)"""
+    batch_id = uuid.uuid4().hex
+    message = batch_message(batch_id, commands, script, on_error, stream, slice_ms)
+    results = []
+    while True:
+        await context.asend(message)
+        fields, part = parse_reply(await context.arecv())
+        results.extend(part)
+        if progress is not None:
+            progress(part, len(results), fields["total"])
+        if fields["done"]:
+            return BatchResult(results, fields["stopped"], fields["total"])
+        message = continue_message(batch_id)
@@ -0,0 +1,550 @@
+#!/usr/bin/env python
+
+# Client-side load balancing across a pool of R servers
+# -----------------------------------------------------------------------------
+# The R server is one single-threaded interpreter, so one endpoint means
+# every computation is serialized. RPool keeps a Req0 socket per R endpoint
+# (a configured list of addresses, and/or Rscript workers it starts itself)
+# and has the same submit / request / cancel API as NetworkCore:
+#
+#   pool = RPool(deliver=lambda fn: root.after(0, fn)).start()
+#   addresses = pool.spawn(4)                    # Rscript workers on 5570..5573
+#   pool.connect(addresses, on_connected)
+#   pool.request(payload, on_reply)
+#
+# Dispatch is least-outstanding-first over the healthy workers, with at most
+# `per_worker` requests in flight on each. That only suits stateless work
+# (statistics of the data sent along, streams): every worker is its own R
+# session with its own global environment, so `x <- rnorm(100)` and a later
+# `mean(x)` must meet the same one. Requests submitted with pinned=True (the
+# GUI's R commands and batches) all go to one primary worker, kept until it
+# fails; the next healthy worker then takes over, without the old state
+# (on_primary(address, None) tells the client). Requests waiting for a busy
+# primary do not hold up the stateless ones behind them.
+#
+# A spawned worker whose process exits is restarted. When a worker fails it is taken out of rotation and the
+# requests in flight on it are redistributed to the others; requests
+# submitted with idempotent=False (R commands with side effects, streams)
+# fail instead of being sent twice. A worker fails on
+#
+#   connection lost   the TCP/IPC pipe closed (R crashed or was killed):
+#                     noticed at once, not after the request timeout
+#   request timeout   every request carries a deadline; R serves one at a
+#                     time, so no reply in time means it is stuck or gone
+#   heartbeats        every worker is pinged each `health_interval` on a side
+#                     socket, so pings never wait for a request slot; an idle
+#                     R that misses `max_missed` of them in a row is down.
+#                     R answers pings between requests, so a busy one is
+#                     given `max_busy_missed` ping timeouts: a long stream or
+#                     batch (which replies slice by slice) stays up, a hung
+#                     one is down well before its request deadline.
+#                     Round-trip times of idle pings are kept (last, mean, max)
+#
+# A failed worker is probed again with exponential backoff (up to
+# `max_backoff` seconds), and at once when its connection comes back; nng
+# redials on its own. nng's own request resend is switched off: retries are
+# only ever the pool's, and only for idempotent requests.
+#
+#   python r_pool.py --spawn 4 --standin --work-ms 20   # throughput, 1..4 workers
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pynng
+
+import envelope
+from net_core import NetworkCore, RequestCancelled
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+R_SERVER_SCRIPT = os.path.join(HERE, "R_server_run_this_first.R")
+PING = envelope.encode(envelope.MSG_CONTROL, {"action": "ping"})
+SHUTDOWN_SEND_TIMEOUT_MS = 1000
+
+
+def r_worker_command(address):
+    return ["Rscript", R_SERVER_SCRIPT, address]
+
+
+def standin_worker_command(address, work_ms=0.0):
+    return [sys.executable, os.path.join(HERE, "r_standin.py"), "--listen", address,
+            "--work-ms", str(work_ms)]
+
+
+class Worker:
+    def __init__(self, address, command=None):
+        self.address = address
+        self.command = command
+        self.process = None
+        self.socket = None
+
+        self.healthy = False
+        self.outstanding = 0
+        self.inflight = set()
+        self.last_assigned = 0.0
+        self.idle_since = 0.0
+        self.completed = 0
+        self.failures = 0
+        self.restarts = 0
+        self.last_error = None
+        self.reconnects = 0
+
+        self.heartbeat = None  # side socket for pings
+        self.wake = asyncio.Event()  # probe now: a connection came up
+        self.missed = 0
+        self.rtt = None
+        self.rtt_mean = None
+        self.rtt_max = None
+
+    def record_rtt(self, rtt):
+        self.rtt = rtt
+        self.rtt_mean = rtt if self.rtt_mean is None else 0.8 * self.rtt_mean + 0.2 * rtt
+        self.rtt_max = rtt if self.rtt_max is None else max(self.rtt_max, rtt)
+
+    def start_process(self):
+        # The R script sources envelope.R relative to the repo folder
+        self.process = subprocess.Popen(self.command, cwd=HERE, stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.DEVNULL)
+
+    def info(self):
+        return {
+            "address": self.address,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "completed": self.completed,
+            "failures": self.failures,
+            "restarts": self.restarts,
+            "reconnects": self.reconnects,
+            "missed": self.missed,
+            "rtt_ms": None if self.rtt is None else round(self.rtt * 1000, 3),
+            "rtt_mean_ms": None if self.rtt_mean is None else round(self.rtt_mean * 1000, 3),
+            "rtt_max_ms": None if self.rtt_max is None else round(self.rtt_max * 1000, 3),
+            "last_error": self.last_error
+        }
+
+
+class RPool(NetworkCore):
+    def __init__(self, deliver, per_worker=2, timeout=10.0, max_retries=2, health_interval=1.0,
+                 ping_timeout=1.0, max_missed=2, max_busy_missed=30, max_backoff=4.0, respawn=True,
+                 on_health=None, on_primary=None):
+        super().__init__(deliver, max_in_flight=per_worker, timeout=timeout)
+        self.max_retries = max_retries
+        self.health_interval = health_interval
+        self.ping_timeout = ping_timeout
+        self.max_missed = max_missed
+        self.max_busy_missed = max(max_busy_missed, max_missed)
+        self.max_backoff = max_backoff
+        self.respawn = respawn
+        self.on_health = on_health  # on_health(address, reason or None once up again), UI thread
+        self.on_primary = on_primary  # on_primary(address, None) when pinned requests move
+        self.primary = None  # the worker pinned requests run on
+
+        self.workers = []
+        self.changed = None  # set whenever a worker frees up or changes health
+
+    # -- event loop thread ----------------------------------------------------
+
+    async def _dispatch(self):
+        self.queue = asyncio.Queue()
+        self.changed = asyncio.Event()
+        self.ready.set()
+        health = asyncio.ensure_future(self._health_loop())
+
+        # (request, deadline) that no worker can take yet, oldest first. Every
+        # pass starts what it can, so a pinned request waiting for a busy
+        # primary does not hold up stateless ones that idle workers could serve
+        waiting = []
+        incoming = None
+        while True:
+            self.changed.clear()
+            waiting = [(h, deadline) for h, deadline in waiting if not self._place(h, deadline)]
+
+            if incoming is None:
+                incoming = asyncio.ensure_future(self.queue.get())
+            changed = asyncio.ensure_future(self.changed.wait())
+            timeout = None
+            if waiting and not any(w.healthy for w in self.workers):
+                timeout = max(0.0, min(deadline for _, deadline in waiting) - self.loop.time())
+            done, _ = await asyncio.wait({incoming, changed}, timeout=timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            changed.cancel()
+            if incoming not in done:
+                continue
+
+            handles = [incoming.result()]
+            incoming = None
+            while not self.queue.empty():
+                handles.append(self.queue.get_nowait())
+            if None in handles:
+                break
+            waiting.extend((h, self.loop.time() + h.timeout) for h in handles)
+
+        if incoming is not None:
+            incoming.cancel()
+        health.cancel()
+        tasks = [h.task for h in self.handles.values() if h.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(health, *tasks, return_exceptions=True)
+
+    def _place(self, handle, deadline):
+        """Start a request on a worker if one can take it now; False if it has to wait"""
+        if handle.cancelled:
+            return True
+        worker = self._acquire(handle)
+        if worker is None:
+            # Give a restarting worker until the request's timeout
+            if any(w.healthy for w in self.workers) or self.loop.time() < deadline:
+                return False
+            self.handles.pop(handle.id, None)
+            self._deliver(handle.callback, None, ConnectionError("No healthy R workers"))
+            return True
+
+        handle.task = asyncio.ensure_future(self._execute(handle, worker))
+        handle.task.add_done_callback(
+            lambda task, h=handle, w=worker: self._cancelled_early(task, h, w)
+        )
+        return True
+
+    def _acquire(self, handle):
+        """Least-outstanding healthy worker with a free slot, the primary if pinned (or None)"""
+        healthy = [w for w in self.workers if w.healthy]
+        candidates = healthy
+        if handle.pinned and healthy:
+            if self.primary not in healthy:
+                moved = self.primary is not None
+                self.primary = healthy[0]
+                if moved:
+                    self._deliver(self.on_primary, self.primary.address, None)
+            candidates = [self.primary]
+        free = [w for w in candidates if w.outstanding < self.max_in_flight]
+        if not free:
+            return None
+        worker = min(free, key=lambda w: (w.outstanding, w.last_assigned))
+        worker.outstanding += 1
+        worker.last_assigned = time.monotonic()
+        return worker
+
+    def _release(self, worker, handle):
+        worker.outstanding -= 1
+        worker.inflight.discard(handle)
+        if not worker.outstanding:
+            worker.idle_since = time.monotonic()
+        self.changed.set()
+
+    def _mark_failed(self, worker, reason, current=None, redistribute=True):
+        """Take a worker out of rotation and move its other requests elsewhere"""
+        worker.last_error = str(reason)
+        if not worker.healthy:
+            return
+        worker.healthy = False
+        worker.failures += 1
+        for handle in list(worker.inflight) if redistribute else []:
+            if handle is not current and handle.task is not None and not handle.task.done():
+                handle.redistribute = True
+                handle.task.cancel()
+        self.changed.set()
+        self._deliver(self.on_health, worker.address, worker.last_error)
+
+    def _mark_healthy(self, worker):
+        worker.healthy = True
+        worker.missed = 0
+        self.changed.set()
+        if worker.failures:
+            worker.reconnects += 1
+            self._deliver(self.on_health, worker.address, None)
+
+    def _connection_lost(self, worker):
+        # Without resend, nng fails the requests in flight on the lost pipe with
+        # ConnectionReset and _execute retries the idempotent ones
+        if worker.healthy:
+            self._mark_failed(worker, "connection lost", redistribute=False)
+
+    def _retry_or_fail(self, handle, worker):
+        """Requeue a request whose worker failed, if that is safe"""
+        if handle.idempotent and handle.attempts < self.max_retries:
+            handle.attempts += 1
+            handle.redistribute = False
+            handle.task = None
+            self.queue.put_nowait(handle)
+            return None
+        return ConnectionError(f"{handle.description}: R worker {worker.address} failed "
+                               f"({worker.last_error})")
+
+    async def _execute(self, handle, worker):
+        result, error = None, None
+        worker.inflight.add(handle)
+        try:
+            context = worker.socket.new_context()
+            try:
+                result = await asyncio.wait_for(handle.fn(context), handle.timeout)
+            finally:
+                context.close()
+            worker.completed += 1
+        except asyncio.CancelledError:
+            if handle.redistribute:
+                error = self._retry_or_fail(handle, worker)
+            else:
+                error = RequestCancelled(f"{handle.description} cancelled")
+        except asyncio.TimeoutError:
+            # R serves one request at a time: no reply in time means it is stuck or gone
+            error = TimeoutError(f"{handle.description} timed out after {handle.timeout}s")
+            self._mark_failed(worker, error, handle)
+        except pynng.NNGException as e:
+            self._mark_failed(worker, e, handle)
+            error = self._retry_or_fail(handle, worker)
+        except Exception as e:
+            error = e
+        finally:
+            self._release(worker, handle)
+
+        if error is None and handle.task is None:
+            return  # requeued on another worker
+        self.handles.pop(handle.id, None)
+        self._deliver(handle.callback, result, error)
+
+    def _cancelled_early(self, task, handle, worker):
+        if not task.cancelled():
+            return
+        self._release(worker, handle)
+        if handle.redistribute:
+            error = self._retry_or_fail(handle, worker)
+            if error is None:
+                return
+        else:
+            error = RequestCancelled(f"{handle.description} cancelled")
+        self.handles.pop(handle.id, None)
+        self._deliver(handle.callback, None, error)
+
+    async def _ping(self, worker):
+        """One heartbeat on the side socket; True if R answered"""
+        context = worker.heartbeat.new_context()
+        up = worker.healthy  # a first ping also waits for the dial
+        sent = time.monotonic()
+        start = time.perf_counter()
+        reply = None
+        try:
+            await context.asend(PING)
+            reply = asyncio.ensure_future(context.arecv())
+            while True:
+                done, _ = await asyncio.wait({reply}, timeout=self.ping_timeout)
+                if done:
+                    reply.result()
+                    break
+                # R answers pings between requests, so keep waiting while it
+                # works and for one timeout after that; a busy R still counts
+                # a miss every timeout, so a hung long request is noticed
+                # after max_busy_missed of them, not at its own deadline
+                if not worker.outstanding and time.monotonic() - worker.idle_since >= self.ping_timeout:
+                    return False
+                if worker.missed + 1 >= self.max_busy_missed:
+                    return False
+                worker.missed += 1
+        except pynng.NNGException:
+            return False
+        finally:
+            if reply is not None:
+                reply.cancel()
+            context.close()
+            if reply is not None:
+                await asyncio.gather(reply, return_exceptions=True)
+
+        if up and not worker.outstanding and worker.idle_since < sent:
+            worker.record_rtt(time.perf_counter() - start)  # time queued behind a request is not RTT
+        return True
+
+    async def _check(self, worker):
+        """Restart an exited worker process, or send it a heartbeat"""
+        if worker.process is not None and worker.process.poll() is not None:
+            self._mark_failed(worker, f"process exited with code {worker.process.returncode}")
+            if self.respawn:
+                worker.start_process()
+                worker.restarts += 1
+            return
+
+        if worker.heartbeat is None:
+            return
+        if await self._ping(worker):
+            worker.missed = 0
+            # Up once the request socket is connected too (it dials on its own)
+            if not worker.healthy and worker.socket.pipes:
+                self._mark_healthy(worker)
+            return
+
+        worker.missed += 1
+        if worker.missed >= self.max_missed or not worker.healthy:
+            self._mark_failed(worker, f"missed {worker.missed} heartbeat(s)")
+
+    async def _supervise(self, worker):
+        """Heartbeat one worker; a failed one is probed with exponential backoff"""
+        delay = self.health_interval
+        while True:
+            worker.wake.clear()
+            try:
+                await asyncio.wait_for(worker.wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            await self._check(worker)
+            delay = self.health_interval if worker.healthy else min(2 * delay, self.max_backoff)
+
+    async def _health_loop(self):
+        supervisors = {}
+        try:
+            while True:
+                for worker in self.workers:
+                    if worker not in supervisors:
+                        supervisors[worker] = asyncio.ensure_future(self._supervise(worker))
+                await asyncio.sleep(self.health_interval)
+        finally:
+            for task in supervisors.values():
+                task.cancel()
+            await asyncio.gather(*supervisors.values(), return_exceptions=True)
+
+    def _dial(self, address):
+        socket = pynng.Req0()
+        socket.recv_max_size = 0
+        socket.resend_time = -1  # never resent behind the pool's back
+        socket.reconnect_time_min = 100
+        socket.reconnect_time_max = int(self.max_backoff * 1000)
+        # Non-blocking dial: keeps retrying until the server is up
+        socket.dial(address, block=False)
+        return socket
+
+    def _watch(self, worker):
+        """Connection drops and reconnects of the request socket (nng threads)"""
+        def removed(pipe):
+            if not self.closing:
+                self.loop.call_soon_threadsafe(self._connection_lost, worker)
+
+        def connected(pipe):
+            if not self.closing:
+                self.loop.call_soon_threadsafe(worker.wake.set)
+
+        worker.socket.add_post_pipe_remove_cb(removed)
+        worker.socket.add_post_pipe_connect_cb(connected)
+
+    async def _connect_pool(self, addresses, wait):
+        known = {w.address: w for w in self.workers}
+        for address in addresses:
+            worker = known.get(address) or Worker(address)
+            if worker.socket is None:
+                worker.socket = self._dial(address)
+                worker.heartbeat = self._dial(address)
+                self._watch(worker)
+            if address not in known:
+                self.workers.append(worker)
+
+        deadline = self.loop.time() + wait
+        pool = [w for w in self.workers if w.address in addresses]
+        while True:
+            await asyncio.gather(*(self._check(w) for w in pool if not w.healthy),
+                                 return_exceptions=True)
+            if all(w.healthy for w in pool) or self.loop.time() >= deadline:
+                break
+            await asyncio.sleep(0.2)
+
+        healthy = [w.address for w in pool if w.healthy]
+        if not healthy:
+            raise ConnectionError(f"No R server answered at {', '.join(addresses)}")
+        return healthy
+
+    # -- any thread -----------------------------------------------------------
+
+    def spawn(self, n, base_port=5570, host="127.0.0.1", command=r_worker_command):
+        """Start n R servers on consecutive ports; returns their addresses"""
+        addresses = []
+        for i in range(n):
+            address = f"tcp://{host}:{base_port + i}"
+            worker = Worker(address, command(address))
+            worker.start_process()
+            self.loop.call_soon_threadsafe(self.workers.append, worker)
+            addresses.append(address)
+        return addresses
+
+    def connect(self, addresses, callback, wait=10.0):
+        """Dial every address; callback(healthy addresses, error) once they answer"""
+        future = asyncio.run_coroutine_threadsafe(self._connect_pool(list(addresses), wait), self.loop)
+        future.add_done_callback(
+            lambda f: self._deliver(callback, None if f.exception() else f.result(), f.exception())
+        )
+
+    def stats(self):
+        return [dict(worker.info(), primary=worker is self.primary) for worker in list(self.workers)]
+
+    def close(self, final_message=None):
+        """Stop the loop, send final_message to every healthy worker, stop spawned ones"""
+        super().close()
+        for worker in self.workers:
+            if worker.socket is not None:
+                # A worker that is down has no pipe to send on: skip it, and
+                # bound the send in case it went down just now
+                try:
+                    if worker.healthy and (final_message is not None or worker.process is not None):
+                        worker.socket.send_timeout = SHUTDOWN_SEND_TIMEOUT_MS
+                        worker.socket.send(final_message or envelope.encode(
+                            envelope.MSG_CONTROL, {"action": "shutdown"}))
+                except pynng.NNGException:
+                    pass
+                worker.socket.close()
+                worker.heartbeat.close()
+            if worker.process is not None:
+                try:
+                    worker.process.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    worker.process.terminate()
+
+
+def benchmark(max_workers, requests, work_ms, standin, per_worker):
+    """Throughput of independent stats requests for 1..max_workers workers"""
+    payload = envelope.encode(envelope.MSG_DATA, {"data": np.random.normal(50, 15, 1000)})
+    command = (lambda a: standin_worker_command(a, work_ms)) if standin else r_worker_command
+
+    for n in range(1, max_workers + 1):
+        pool = RPool(deliver=lambda fn: fn(), per_worker=per_worker).start()
+        done = threading.Event()
+        ready = threading.Event()
+        remaining = [requests]
+        errors = []
+
+        def finished(reply, error):
+            if error is not None:
+                errors.append(error)
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                done.set()
+
+        pool.connect(pool.spawn(n, command=command), lambda addresses, error: ready.set())
+        ready.wait()
+
+        start = time.perf_counter()
+        for _ in range(requests):
+            pool.request(payload, finished)
+        done.wait()
+        elapsed = time.perf_counter() - start
+
+        print(f"{n} worker(s): {requests / elapsed:8.1f} req/s  "
+              f"({elapsed:.2f}s, {len(errors)} errors, per worker "
+              f"{[w['completed'] for w in pool.stats()]})")
+        pool.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="R worker pool throughput")
+    parser.add_argument("--spawn", type=int, default=4, help="largest pool size to measure")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--per-worker", type=int, default=2, help="requests in flight per worker")
+    parser.add_argument("--standin", action="store_true",
+                        help="spawn r_standin.py instead of Rscript")
+    parser.add_argument("--work-ms", type=float, default=20.0,
+                        help="simulated R time per request (with --standin)")
+    args = parser.parse_args(argv)
+
+    benchmark(args.spawn, args.requests, args.work_ms, args.standin, args.per_worker)
+
+
+if __name__ == "__main__":
+    main()
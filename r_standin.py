@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+# Python stand-in for R_server_run_this_first.R (tests and benchmarks)
+# -----------------------------------------------------------------------------
+# Speaks the same envelope protocol as the R server, on one thread like the
+# R interpreter: data envelopes get the summary statistics, streams are
+# folded chunk by chunk, commands are echoed back (there is no R to run
+# them) and a "ping" control envelope is answered with {status = "ok"}.
+# Batches (r_batch.py) echo every command too, one per line of a script;
+# commands starting with "stop(" fail, to exercise on_error.
+# --work-ms adds a fixed cost per request to model R's evaluation time.
+#
+#   python r_standin.py --listen tcp://127.0.0.1:5570 --work-ms 20
+import argparse
+import time
+
+import numpy as np
+
+import envelope
+from metrics import NULL_TIMER
+from stats_server import StatsServer
+
+
+class RStandIn(StatsServer):
+    def __init__(self, address="tcp://127.0.0.1:5556", work_ms=0.0):
+        # One context: requests are served strictly one at a time, as in R
+        super().__init__(address, workers=1)
+        self.work = work_ms / 1000
+        self.batches = {}  # batch id -> [commands, next index, stop on error, slice seconds]
+
+    def batch(self, fields):
+        batch_id = fields["batch"]
+        if "commands" in fields or "script" in fields:
+            commands = fields.get("commands")
+            if commands is None:
+                commands = [line for line in fields["script"].splitlines() if line.strip()]
+            slice_s = fields.get("slice_ms", 250) / 1000 if fields.get("stream") else float("inf")
+            state = [list(commands), 0, fields.get("on_error") != "continue", slice_s]
+        elif batch_id in self.batches:
+            state = self.batches.pop(batch_id)
+        else:
+            return envelope.error(f"Unknown or expired batch: {batch_id}")
+
+        commands, first, stop_on_error, slice_s = state
+        rows, stopped, started = [], False, time.perf_counter()
+        for command in commands[first:]:
+            time.sleep(self.work)
+            ok = not command.startswith("stop(")
+            rows.append((command, ok, "" if not ok else f"[stand-in] {command}", "",
+                         "" if ok else f"[stand-in] {command}", self.work))
+            if not ok and stop_on_error:
+                stopped = True
+                break
+            if time.perf_counter() - started >= slice_s:
+                break
+
+        done = stopped or first + len(rows) == len(commands)
+        if not done:
+            self.batches[batch_id] = [commands, first + len(rows), stop_on_error, slice_s]
+        columns = list(zip(*rows)) or [()] * 6
+        return envelope.result(
+            batch=batch_id, first=first, total=len(commands), done=done, stopped=stopped,
+            command=list(columns[0]), ok=np.array(columns[1], dtype=bool), result=list(columns[2]),
+            output=list(columns[3]), error=list(columns[4]),
+            elapsed=np.array(columns[5], dtype=np.float64))
+
+    def handle(self, raw_data, timer=NULL_TIMER):
+        if envelope.is_envelope(raw_data):
+            try:
+                message = envelope.decode(raw_data)
+            except envelope.EnvelopeError as e:
+                return envelope.error(e)
+            if message.msg_type == envelope.MSG_CONTROL and message.get("action") == "ping":
+                return envelope.result(status="ok")
+            if message.msg_type == envelope.MSG_COMMAND and message.get("batch") is not None:
+                return self.batch(message.fields)
+            if message.msg_type == envelope.MSG_COMMAND:
+                time.sleep(self.work)
+                return envelope.result(output=f"[stand-in] {message.get('command', '')}")
+
+        time.sleep(self.work)
+        return super().handle(raw_data, timer)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Python stand-in for the R server")
+    parser.add_argument("--listen", default="tcp://127.0.0.1:5556")
+    parser.add_argument("--work-ms", type=float, default=0.0,
+                        help="simulated R evaluation time per request")
+    args = parser.parse_args(argv)
+
+    RStandIn(args.listen, work_ms=args.work_ms).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+
+# Sequence numbers, a replay buffer and gap backfill for the Pub/Sub streams
+# -----------------------------------------------------------------------------
+# Every frame sensor_publisher.py sends carries two extra envelope fields:
+#
+#   seq     per-topic frame number, 0, 1, 2, ... for the publisher's lifetime
+#   epoch   publisher start time in ms; a new epoch means seq starts over
+#
+# The publisher keeps the last `capacity` frames of every topic in a
+# ReplayBuffer (references to the bytes it already sent, no copies) and a
+# ReplayServer answers for them on a Rep0 side channel:
+#
+#   request   {action: "replay", topic, from, to}         (envelope or JSON)
+#   reply     {topic, epoch, first, oldest, newest,
+#              offsets[n + 1], frames[uint8]}             frame i is
+#                                                         frames[offsets[i]:offsets[i + 1]]
+#
+# Frames that have already left the ring are simply not returned: `first`
+# says where the reply starts, and at most `max_frames` come back at once.
+#
+# GapFillingSubscriber wraps a Sub0 socket: it yields frames in sequence
+# order per topic, notices gaps (seq ahead of what it expected), fetches the
+# missing frames from the replay channel before the frame that revealed
+# them, drops duplicates, and counts what could not be recovered:
+#
+#   sub = GapFillingSubscriber("tcp://127.0.0.1:5558", "tcp://127.0.0.1:5563",
+#                              ["temp", "press", "vib"])
+#   for topic, fields, replayed in sub:
+#       ...
+#   sub.stats()   # received, backfilled, duplicates, lost per topic
+#
+# replay.R does the same for the R subscribers.
+import itertools
+import threading
+from collections import deque
+
+import numpy as np
+import pynng
+
+import envelope
+
+DEFAULT_CAPACITY = 1024   # frames kept per topic
+MAX_REPLAY_FRAMES = 1024  # frames per replay reply
+
+
+def split_frame(raw):
+    """(topic, decoded fields) of one topic + b"\\0" + envelope frame"""
+    sep = raw.find(b"\0")
+    return raw[:sep].decode(), envelope.decode(memoryview(raw)[sep + 1:]).fields
+
+
+class ReplayBuffer:
+    """The last `capacity` frames of every topic, by sequence number"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.frames = {}    # topic -> deque of frames, oldest first
+        self.next_seq = {}  # topic -> seq of the next frame
+        self.lock = threading.Lock()
+
+    def add(self, topic, seq, frame):
+        with self.lock:
+            ring = self.frames.get(topic)
+            if ring is None:
+                ring = self.frames[topic] = deque(maxlen=self.capacity)
+            ring.append(frame)
+            self.next_seq[topic] = seq + 1
+
+    def range(self, topic, first, last, max_frames=MAX_REPLAY_FRAMES):
+        """(oldest, newest, first, frames) for seq first..last that are still held"""
+        with self.lock:
+            ring = self.frames.get(topic)
+            if not ring:
+                return None, None, first, []
+            newest = self.next_seq[topic] - 1
+            oldest = newest - len(ring) + 1
+            first = max(first, oldest)
+            last = min(last, newest, first + max_frames - 1)
+            if last < first:
+                return oldest, newest, first, []
+            frames = list(itertools.islice(ring, first - oldest, last - oldest + 1))
+        return oldest, newest, first, frames
+
+
+class ReplayServer:
+    """Rep0 side channel answering replay requests from a ReplayBuffer"""
+
+    def __init__(self, buffer, address, epoch, max_frames=MAX_REPLAY_FRAMES):
+        self.buffer = buffer
+        self.address = address
+        self.epoch = epoch
+        self.max_frames = max_frames
+        self.socket = pynng.Rep0(listen=address)
+        self.thread = threading.Thread(target=self.serve, name="replay", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        print(f"Replay channel on {self.address} (last {self.buffer.capacity} frames per topic)")
+        return self
+
+    def answer(self, request):
+        if request.get("action") != "replay":
+            return {"status": "error", "message": f"Invalid action: {request.get('action')}"}
+        topic = request["topic"]
+        oldest, newest, first, frames = self.buffer.range(
+            topic, int(request["from"]), int(request.get("to", request["from"])), self.max_frames)
+        offsets = np.zeros(len(frames) + 1, dtype=np.int64)
+        np.cumsum([len(f) for f in frames], out=offsets[1:])
+        return {
+            "status": "success",
+            "topic": topic,
+            "epoch": self.epoch,
+            "first": first,
+            "oldest": -1 if oldest is None else oldest,
+            "newest": -1 if newest is None else newest,
+            "offsets": offsets,
+            "frames": np.frombuffer(b"".join(frames), dtype=np.uint8)
+        }
+
+    def serve(self):
+        while True:
+            try:
+                raw_data = self.socket.recv()
+            except pynng.Closed:
+                break
+            use_envelope = False
+            try:
+                request, use_envelope = envelope.unpack_request(raw_data)
+                response = self.answer(request)
+            except Exception as e:
+                response = {"status": "error", "message": str(e)}
+            try:
+                self.socket.send(envelope.pack_reply(response, use_envelope))
+            except pynng.Closed:
+                break
+
+    def close(self):
+        self.socket.close()
+
+
+def fetch(socket, topic, first, last):
+    """Frames first..last from a replay channel, as far as it still has them
+
+    Returns (seq of the first frame returned, [frames], epoch); asks again
+    while replies are capped at max_frames.
+    """
+    frames, start, epoch = [], None, None
+    while first <= last:
+        socket.send(envelope.encode(envelope.MSG_CONTROL,
+                                    {"action": "replay", "topic": topic, "from": first, "to": last}))
+        reply = envelope.decode(socket.recv()).fields
+        if reply.get("status") != "success":
+            raise RuntimeError(reply.get("message", "replay failed"))
+        offsets, data = reply["offsets"], reply["frames"]
+        count = len(offsets) - 1
+        if count == 0:
+            break
+        if start is None:
+            start, epoch = reply["first"], reply["epoch"]
+        frames.extend(bytes(data[offsets[i]:offsets[i + 1]]) for i in range(count))
+        first = reply["first"] + count
+    return start, frames, epoch
+
+
+class GapFillingSubscriber:
+    def __init__(self, address, replay_address, topics, recv_timeout=None, replay_timeout=2000):
+        self.socket = pynng.Sub0(recv_max_size=0)
+        if recv_timeout is not None:
+            self.socket.recv_timeout = recv_timeout
+        for topic in topics:
+            self.socket.subscribe(topic)
+        self.socket.dial(address, block=False)
+        self.replay = pynng.Req0(recv_max_size=0, recv_timeout=replay_timeout)
+        self.replay.dial(replay_address, block=False)
+
+        self.expected = {}  # topic -> (epoch, next seq)
+        self.counters = {}  # topic -> received / backfilled / duplicates / lost
+
+    def _count(self, topic, key, n=1):
+        counters = self.counters.setdefault(
+            topic, {"received": 0, "backfilled": 0, "duplicates": 0, "lost": 0})
+        counters[key] += n
+
+    def accept(self, raw):
+        """In-order (topic, fields, replayed) triples for one received frame"""
+        topic, fields = split_frame(raw)
+        seq, epoch = fields.get("seq"), fields.get("epoch")
+        self._count(topic, "received")
+        if seq is None:
+            return [(topic, fields, False)]  # an unsequenced publisher
+
+        out = []
+        known_epoch, expected = self.expected.get(topic, (epoch, seq))
+        if known_epoch == epoch and seq < expected:
+            self._count(topic, "duplicates")
+            return out
+        if known_epoch == epoch and seq > expected:
+            try:
+                first, frames, replay_epoch = fetch(self.replay, topic, expected, seq - 1)
+            except (pynng.Timeout, RuntimeError):
+                first, frames, replay_epoch = None, [], None
+            if replay_epoch != epoch:
+                frames = []  # the publisher restarted in between
+            out = [(topic, split_frame(frame)[1], True) for frame in frames]
+            self._count(topic, "backfilled", len(out))
+            self._count(topic, "lost", seq - expected - len(out))
+        self.expected[topic] = (epoch, seq + 1)
+        out.append((topic, fields, False))
+        return out
+
+    def recv(self):
+        """The next in-order batch of (topic, fields, replayed) triples"""
+        return self.accept(self.socket.recv())
+
+    def __iter__(self):
+        while True:
+            try:
+                yield from self.recv()
+            except pynng.Closed:
+                return
+
+    def stats(self):
+        return {topic: dict(c) for topic, c in self.counters.items()}
+
+    def close(self):
+        self.socket.close()
+        self.replay.close()
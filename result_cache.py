@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+# Content-addressed cache of R replies for the Tk client (python_gui_app.py)
+# -----------------------------------------------------------------------------
+# Replies are keyed by a BLAKE2b digest of (message kind, dtype, raw bytes),
+# so sending the same array or the same R command again is answered locally
+# without a round trip:
+#
+#   cache = ResultCache(max_bytes=64 << 20, ttl=300)
+#   key = cache.key("stats", data_array)
+#   reply = cache.get(key)          # None on a miss or after the TTL
+#   cache.put(key, reply)
+#
+# A command reply is stored with the `generation` read at lookup time
+# (cache.generation): if the cache was invalidated while the command was in
+# flight, the reply may predate the change and is not stored.
+#
+# Entries are evicted least recently used first once their total size
+# passes `max_bytes`. Error replies are never stored.
+#
+# R commands are only cached when cacheable(command) says so: a command is
+# refused if it matches any `deny` pattern (assignments, file and connection
+# I/O, randomness, package / environment changes, plotting) and, when an
+# `allow` list is given, accepted only if it matches one of its patterns.
+# A refused command may change R's state, so it also drops every cached
+# command result (cached statistics depend on their data alone and stay).
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import envelope
+
+DEFAULT_DENY = (
+    r"<<?-|->>?",                                   # assignment
+    r"(^|;)\s*[\w.$@\[\]\"']+\s*=(?!=)",            # x = 1
+    r"\b(assign|rm|remove|attach|detach|setwd|options|Sys\.set\w*|set\.seed)\s*\(",
+    r"\b(library|require|requireNamespace|install\.packages|source|sys\.source)\s*\(",
+    r"\b(read|write|save|load|readRDS|saveRDS|file|url|gzfile|sink|cat|unlink|"
+    r"download\.file|system2?|shell|dir\.create|file\.\w+)[\w.]*\s*\(",
+    r"\b(r(norm|unif|binom|pois|exp|gamma|beta|t|chisq)|sample)\s*\(",
+    r"\b(plot|hist|lines|points|abline|barplot|boxplot|dev\.\w+|png|pdf|jpeg)\s*\(",
+    r"\b(Sys\.time|Sys\.Date|date|proc\.time)\s*\(",
+)
+
+
+class ResultCache:
+    def __init__(self, max_bytes=64 << 20, ttl=300.0, allow=None, deny=DEFAULT_DENY):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.allow = [re.compile(p) for p in allow] if allow is not None else None
+        self.deny = [re.compile(p) for p in deny]
+
+        self.entries = OrderedDict()  # key -> (kind, reply, stored_at)
+        self.bytes = 0
+        self.generation = 0  # bumped whenever command results are invalidated
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0,
+                         "refused": 0, "invalidated": 0}
+
+    @staticmethod
+    def key(kind, value, dtype=None):
+        """Digest of (kind, dtype, raw bytes); value is an array, bytes or str"""
+        if isinstance(value, str):
+            value, dtype = value.encode("utf-8"), dtype or "str"
+        elif isinstance(value, np.ndarray):
+            value, dtype = np.ascontiguousarray(value), dtype or value.dtype.str
+            value = value.reshape(-1).view(np.uint8)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{kind}\0{dtype}\0".encode())
+        digest.update(value)
+        return kind, digest.hexdigest()
+
+    def cacheable(self, command):
+        """True if an R command's result may be served from the cache"""
+        if any(p.search(command) for p in self.deny):
+            return False
+        return self.allow is None or any(p.search(command) for p in self.allow)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            if time.monotonic() - entry[2] > self.ttl:
+                self._drop(key)
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry[1]
+
+    def put(self, key, reply, generation=None):
+        """Store a successful reply; errors and oversized replies are skipped
+
+        With `generation`, the reply is also skipped if the cache has been
+        invalidated since that generation was read.
+        """
+        if envelope.message_type(reply) == envelope.MSG_ERROR or len(reply) > self.max_bytes:
+            return
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (key[0], reply, time.monotonic())
+            self.bytes += len(reply)
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+                self.counters["evicted"] += 1
+
+    def refuse(self):
+        """Record a command that will not be cached and drop cached command results"""
+        with self.lock:
+            self.counters["refused"] += 1
+        self.invalidate_commands()
+
+    def invalidate_commands(self):
+        """Drop cached command results (R's state changed or R is a new session)"""
+        with self.lock:
+            self.generation += 1
+            stale = [k for k in self.entries if k[0] == "command"]
+            for key in stale:
+                self._drop(key)
+            self.counters["invalidated"] += len(stale)
+
+    def _drop(self, key):
+        _, reply, _ = self.entries.pop(key)
+        self.bytes -= len(reply)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return dict(self.counters, entries=len(self.entries), bytes=self.bytes,
+                        hit_rate=self.counters["hits"] / lookups if lookups else 0.0)
+
+    def summary(self):
+        s = self.stats()
+        return (f"{s['hits']} hits / {s['misses']} misses ({100 * s['hit_rate']:.0f}%), "
+                f"{s['entries']} entries, {s['bytes'] / 1024:.1f} KB")
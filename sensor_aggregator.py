@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+
+# Rolling aggregates of the Example 2 / 5 sensor feeds, republished at a fixed rate
+# -----------------------------------------------------------------------------
+# Subscribes to the publishers in sensor_publisher.py ("temp", "press", "vib"
+# on 5558, "sensor_data" on 5556) and keeps every series (topic + value
+# column) in a fixed-size NumPy ring buffer. Frames are folded in as whole
+# batches, so the per-sample work is a few vectorized operations:
+#
+#   sliding   last --window seconds: count, mean, std, min, max
+#   tumbling  fixed --tumble buckets aligned to the clock, emitted when closed
+#   ewma      exponentially weighted mean (--ewma-alpha per sample)
+#   spikes    vib only: samples above --spike-level or --spike-z sigmas over
+#             the sliding mean
+#
+# Every --every seconds one compact frame per series goes out on our own
+# Pub0 socket, in the publisher's format:
+#
+#   b"agg.temp\0" + envelope MSG_DATA {t, count, mean, std, min, max, ewma,
+#                   window, tumble_start[k], tumble_count[k], tumble_mean[k], ...
+#                   spikes, spike_max, spike_times[m]}
+#
+# Topics are "agg.<topic>" ("agg.sensor_data.temperature" for Example 2's
+# columns), so consumers read summaries at a steady rate whatever the raw
+# sample rate is:
+#
+#   python sensor_aggregator.py --every 1 --window 10 --tumble 5
+#   sub <- socket("sub", dial = "tcp://127.0.0.1:5561"); subscribe(sub, "agg.vib")
+import argparse
+import time
+from collections import deque
+
+import numpy as np
+import pynng
+
+import envelope
+
+SOURCES = {
+    "tcp://127.0.0.1:5558": {"temp": ["value"], "press": ["value"], "vib": ["value"]},
+    "tcp://127.0.0.1:5556": {"sensor_data": ["temperature", "humidity"]},
+}
+SPIKE_TOPICS = ("vib",)
+AGGREGATE_ADDRESS = "tcp://127.0.0.1:5561"
+
+
+class RingBuffer:
+    """Fixed-capacity (timestamp, value) ring indexed by absolute sample number"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.t = np.empty(capacity)
+        self.v = np.empty(capacity)
+        self.end = 0  # absolute index of the next sample
+
+    def extend(self, t, v):
+        if len(v) > self.capacity:
+            t, v = t[-self.capacity:], v[-self.capacity:]
+        start = self.end % self.capacity
+        first = min(len(v), self.capacity - start)
+        self.t[start:start + first], self.v[start:start + first] = t[:first], v[:first]
+        self.t[:len(v) - first], self.v[:len(v) - first] = t[first:], v[first:]
+        self.end += len(v)
+
+    def span(self, begin, end):
+        """(t, v) for absolute indices [begin, end) that are still in the ring"""
+        begin = max(begin, self.end - self.capacity)
+        n = end - begin
+        if n <= 0:
+            return self.t[:0], self.v[:0]
+        i = begin % self.capacity
+        if i + n <= self.capacity:
+            return self.t[i:i + n], self.v[i:i + n]
+        j = n - (self.capacity - i)
+        return np.concatenate((self.t[i:], self.t[:j])), np.concatenate((self.v[i:], self.v[:j]))
+
+
+def summarize(begin, t, v):
+    """Frame summary: [begin, end, t_first, t_last, count, sum, sumsq, min, max]"""
+    return [begin, begin + len(v), float(t[0]), float(t[-1]), len(v), float(v.sum()),
+            float(np.dot(v, v)), float(v.min()), float(v.max())]
+
+
+class SlidingWindow:
+    """Stats of the last `seconds`, from per-frame summaries over a ring buffer
+
+    Every frame adds one summary; frames that leave the window are dropped
+    whole in O(1), and only the one straddling the edge is recomputed, with
+    a vectorized pass over its part of the ring. Sums are taken over the
+    summaries when read, so nothing drifts however long the stream runs.
+    """
+
+    def __init__(self, seconds, capacity):
+        self.seconds = seconds
+        self.ring = RingBuffer(capacity)
+        self.frames = deque()
+
+    def add(self, t, v):
+        self.ring.extend(t, v)
+        if len(v) > self.ring.capacity:
+            t, v = t[-self.ring.capacity:], v[-self.ring.capacity:]
+        self.frames.append(summarize(self.ring.end - len(v), t, v))
+        self._evict(float(t[-1]) - self.seconds)
+
+    def _evict(self, cutoff):
+        """Drop samples at or before cutoff, or already overwritten in the ring"""
+        oldest = self.ring.end - self.ring.capacity
+        while self.frames:
+            begin, end, t_first, t_last = self.frames[0][:4]
+            if end <= oldest or t_last <= cutoff:
+                self.frames.popleft()
+                continue
+            if begin >= oldest and t_first > cutoff:
+                break
+            t, v = self.ring.span(begin, end)
+            keep = int(np.searchsorted(t, cutoff, side="right"))
+            self.frames[0] = summarize(end - len(v) + keep, t[keep:], v[keep:])
+            break
+
+    def stats(self):
+        count = sum(f[4] for f in self.frames)
+        if not count:
+            return {"count": 0}
+        mean = sum(f[5] for f in self.frames) / count
+        var = max(0.0, sum(f[6] for f in self.frames) / count - mean * mean)
+        return {
+            "count": count,
+            "mean": mean,
+            "std": var ** 0.5,
+            "min": min(f[7] for f in self.frames),
+            "max": max(f[8] for f in self.frames)
+        }
+
+
+class TumblingWindow:
+    """Clock-aligned buckets of `seconds`; closed buckets are queued for the next publish"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.bucket = None  # [start, count, sum, sumsq, min, max]
+        self.closed = []
+
+    def add(self, t, v):
+        index = np.floor(t / self.seconds)
+        # Split the batch where it crosses bucket boundaries
+        edges = np.flatnonzero(np.diff(index)) + 1
+        for part_t, part_v in zip(np.split(t, edges), np.split(v, edges)):
+            start = float(np.floor(part_t[0] / self.seconds) * self.seconds)
+            if self.bucket is not None and self.bucket[0] != start:
+                self.closed.append(self.bucket)
+                self.bucket = None
+            if self.bucket is None:
+                self.bucket = [start, 0, 0.0, 0.0, np.inf, -np.inf]
+            b = self.bucket
+            b[1] += len(part_v)
+            b[2] += float(part_v.sum())
+            b[3] += float(np.dot(part_v, part_v))
+            b[4] = min(b[4], float(part_v.min()))
+            b[5] = max(b[5], float(part_v.max()))
+
+    def take(self):
+        """Columns for the buckets closed since the last call"""
+        closed, self.closed = self.closed, []
+        if not closed:
+            return {}
+        start, count, total, sumsq, low, high = (np.array(c) for c in zip(*closed))
+        mean = total / count
+        return {
+            "tumble_start": start,
+            "tumble_count": count.astype(np.int64),
+            "tumble_mean": mean,
+            "tumble_std": np.sqrt(np.maximum(0.0, sumsq / count - mean * mean)),
+            "tumble_min": low,
+            "tumble_max": high
+        }
+
+
+class Series:
+    def __init__(self, name, window, capacity, tumble, ewma_alpha, spikes=False,
+                 spike_level=0.5, spike_z=4.0):
+        self.name = name
+        self.sliding = SlidingWindow(window, capacity)
+        self.tumbling = TumblingWindow(tumble)
+        self.alpha = ewma_alpha
+        self.ewma = None
+        self.spikes = spikes
+        self.spike_level = spike_level
+        self.spike_z = spike_z
+        self.spike_times = []
+        self.spike_max = 0.0
+        self.samples = 0
+
+    def add(self, t, v):
+        t = np.asarray(t, dtype=np.float64).ravel()
+        v = np.asarray(v, dtype=np.float64).ravel()
+        if not len(v):
+            return
+        if self.spikes:
+            # Judge the batch against the window before it
+            before = self.sliding.stats()
+            limit = self.spike_level
+            if before["count"] > 1 and before["std"] > 0:
+                limit = min(limit, before["mean"] + self.spike_z * before["std"])
+            hits = v > limit
+            if hits.any():
+                self.spike_times.extend(t[hits].tolist())
+                self.spike_max = max(self.spike_max, float(v[hits].max()))
+
+        # y[i] = a x[i] + (1 - a) y[i-1] unrolled over the batch: the last value is
+        # (1 - a)^n y[-1] + sum a (1 - a)^k x[n-1-k], one dot product
+        if self.ewma is None:
+            self.ewma = float(v[0])
+        decay = 1 - self.alpha
+        weights = self.alpha * decay ** np.arange(len(v) - 1, -1, -1, dtype=np.float64)
+        self.ewma = float(decay ** len(v) * self.ewma + weights @ v)
+
+        self.sliding.add(t, v)
+        self.tumbling.add(t, v)
+        self.samples += len(v)
+
+    def summary(self, now):
+        fields = dict(self.sliding.stats(), t=now, window=self.sliding.seconds, samples=self.samples)
+        if self.ewma is not None:
+            fields["ewma"] = self.ewma
+        fields.update(self.tumbling.take())
+        if self.spikes:
+            fields["spikes"] = len(self.spike_times)
+            fields["spike_max"] = self.spike_max
+            fields["spike_times"] = np.array(self.spike_times)
+            self.spike_times, self.spike_max = [], 0.0
+        return fields
+
+
+class SensorAggregator:
+    def __init__(self, sources=None, address=AGGREGATE_ADDRESS, every=1.0, window=10.0, tumble=5.0,
+                 capacity=1 << 20, ewma_alpha=0.05, spike_level=0.5, spike_z=4.0):
+        self.sources = sources or SOURCES
+        self.address = address
+        self.every = every
+        self.series = {}
+        self.make_series = lambda name, spikes: Series(
+            name, window, capacity, tumble, ewma_alpha, spikes, spike_level, spike_z)
+        self.columns = {topic: fields for topics in self.sources.values()
+                        for topic, fields in topics.items()}
+        self.frames = 0
+        self.bad_frames = 0  # malformed or missing a column, skipped
+
+    def ingest(self, raw):
+        sep = raw.find(b"\0")
+        topic = raw[:sep].decode(errors="replace")
+        fields = self.columns.get(topic)
+        if fields is None:
+            return
+        # Check the whole frame before any series sees it; a bad one is skipped
+        try:
+            columns = envelope.decode(memoryview(raw)[sep + 1:]).fields
+            timestamps = np.asarray(columns["timestamp"], dtype=np.float64).ravel()
+            values = [np.asarray(columns[field], dtype=np.float64).ravel() for field in fields]
+        except (envelope.EnvelopeError, KeyError, ValueError, TypeError):
+            self.bad_frames += 1
+            return
+        if any(len(v) != len(timestamps) for v in values):
+            self.bad_frames += 1
+            return
+
+        for field, v in zip(fields, values):
+            name = topic if fields == ["value"] else f"{topic}.{field}"
+            series = self.series.get(name)
+            if series is None:
+                series = self.series[name] = self.make_series(name, topic in SPIKE_TOPICS)
+            series.add(timestamps, v)
+        self.frames += 1
+
+    def publish(self, pub, now):
+        for name, series in self.series.items():
+            pub.send(f"agg.{name}".encode() + b"\0" +
+                     envelope.encode(envelope.MSG_DATA, series.summary(now)))
+
+    def run(self, duration=None):
+        sub = pynng.Sub0(recv_max_size=0)
+        for address, topics in self.sources.items():
+            for topic in topics:
+                sub.subscribe(topic)
+            sub.dial(address, block=False)
+        pub = pynng.Pub0(listen=self.address)
+        print(f"Aggregating {', '.join(self.columns)} -> {self.address} every {self.every:g}s")
+
+        start = time.monotonic()
+        tick = 1
+        try:
+            while duration is None or time.monotonic() - start < duration:
+                # Drift-free: tick k is due at start + k * every
+                deadline = start + tick * self.every
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    sub.recv_timeout = max(1, int(remaining * 1000))
+                    try:
+                        self.ingest(sub.recv())
+                    except pynng.Timeout:
+                        pass
+                    continue
+                self.publish(pub, time.time())
+                tick += 1
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sub.close()
+            pub.close()
+        print(f"Aggregator stopped after {self.frames} frames ({self.bad_frames} malformed, skipped)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rolling aggregates of the sensor feeds")
+    parser.add_argument("--listen", default=AGGREGATE_ADDRESS, help="Pub0 address for the aggregates")
+    parser.add_argument("--every", type=float, default=1.0, help="seconds between published summaries")
+    parser.add_argument("--window", type=float, default=10.0, help="sliding window in seconds")
+    parser.add_argument("--tumble", type=float, default=5.0, help="tumbling bucket in seconds")
+    parser.add_argument("--capacity", type=int, default=1 << 20,
+                        help="ring buffer samples per series (caps the sliding window)")
+    parser.add_argument("--ewma-alpha", type=float, default=0.05)
+    parser.add_argument("--spike-level", type=float, default=0.5, help="vib values above this are spikes")
+    parser.add_argument("--spike-z", type=float, default=4.0,
+                        help="...as are values this many sigmas above the sliding mean")
+    parser.add_argument("--duration", type=float, default=None, help="stop after N seconds")
+    args = parser.parse_args(argv)
+
+    SensorAggregator(address=args.listen, every=args.every, window=args.window, tumble=args.tumble,
+                     capacity=args.capacity, ewma_alpha=args.ewma_alpha, spike_level=args.spike_level,
+                     spike_z=args.spike_z).run(args.duration)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+
+# Batched, columnar sensor publisher for Examples 2 and 5 (from_p.py)
+# -----------------------------------------------------------------------------
+# Instead of one JSON message per sample, samples are generated with
+# vectorized NumPy and grouped into time windows: every window sends one
+# frame per topic,
+#
+#   topic + b"\0" + envelope MSG_DATA {timestamp[n], value[n], sensor_type, seq, epoch}
+#
+# (Example 2 frames carry sensor_id / temperature / humidity columns). The
+# topic prefix is unchanged, so subscribe(sub, "temp") keeps working.
+#
+# seq numbers each topic's frames and epoch identifies this run (replay.py).
+# The last --replay-frames frames per topic are kept and served on the
+# example's replay address, so a subscriber that missed some can fetch them
+# (GapFillingSubscriber in replay.py, gap_filler() in replay.R).
+#
+# The scheduler is drift-free: window k is due at start + k * window, and the
+# number of samples in a frame is whatever the target rate says should have
+# been produced by now, so late wakeups are caught up instead of slowing the
+# stream down. Anything from 10 Hz to 100 kHz per topic works.
+#
+#   python sensor_publisher.py --example 5 --rate 1000
+#   python sensor_publisher.py --example 2 --rate 10 --window 0.5
+import argparse
+import time
+
+import numpy as np
+import pynng
+
+import envelope
+from replay import DEFAULT_CAPACITY, ReplayBuffer, ReplayServer
+
+EXAMPLES = {
+    2: ("tcp://127.0.0.1:5556", ["sensor_data"]),
+    5: ("tcp://127.0.0.1:5558", ["temp", "press", "vib"]),
+}
+REPLAY_ADDRESSES = {
+    2: "tcp://127.0.0.1:5562",
+    5: "tcp://127.0.0.1:5563",
+}
+
+
+def sensor_data(timestamps, first_index, rng):
+    """Example 2: temperature / humidity readings"""
+    n = len(timestamps)
+    return {
+        "sensor_id": np.arange(first_index, first_index + n, dtype=np.int64),
+        "timestamp": timestamps,
+        "temperature": np.round(20 + 10 * np.sin(timestamps / 100) + rng.normal(0, 2, n), 2),
+        "humidity": np.round(60 + 20 * np.cos(timestamps / 150) + rng.normal(0, 5, n), 2)
+    }
+
+
+def temperature(timestamps, first_index, rng):
+    """Example 5: temperature with daily cycle + noise"""
+    value = 20 + 10 * np.sin(timestamps / 3600) + rng.normal(0, 2, len(timestamps))
+    return {"timestamp": timestamps, "value": np.round(value, 3), "sensor_type": "temperature"}
+
+
+def pressure(timestamps, first_index, rng):
+    """Example 5: pressure with some trend + noise"""
+    value = 1013 + 5 * np.sin(timestamps / 7200) + rng.normal(0, 3, len(timestamps))
+    return {"timestamp": timestamps, "value": np.round(value, 3), "sensor_type": "pressure"}
+
+
+def vibration(timestamps, first_index, rng):
+    """Example 5: vibration with occasional spikes"""
+    n = len(timestamps)
+    base = rng.normal(0.1, 0.02, n)
+    spike = np.where(rng.random(n) < 0.05, rng.exponential(0.5, n), 0.0)
+    return {"timestamp": timestamps, "value": np.round(base + spike, 3), "sensor_type": "vibration"}
+
+
+GENERATORS = {
+    "sensor_data": sensor_data,
+    "temp": temperature,
+    "press": pressure,
+    "vib": vibration,
+}
+
+
+def encode_frame(topic, columns, seq=None, epoch=None):
+    if seq is not None:
+        columns = dict(columns, seq=seq, epoch=epoch)
+    return topic.encode() + b'\0' + envelope.encode(envelope.MSG_DATA, columns)
+
+
+class SensorPublisher:
+    def __init__(self, address, topics, rate=10.0, window=0.1, report_every=5.0, seed=None,
+                 replay_address=None, replay_frames=DEFAULT_CAPACITY):
+        self.address = address
+        self.topics = topics
+        self.rate = float(rate)
+        self.window = float(window)
+        self.report_every = report_every
+        self.rng = np.random.default_rng(seed)
+
+        # Never build a frame bigger than a few windows' worth after a stall
+        self.max_frame = max(1, int(self.rate * self.window * 4))
+
+        self.emitted = 0
+        self.frames = 0
+        self.achieved_rate = 0.0
+
+        self.epoch = int(time.time() * 1000)
+        self.seq = dict.fromkeys(topics, 0)
+        self.replay_address = replay_address
+        self.replay = ReplayBuffer(replay_frames) if replay_frames else None
+
+    def publish_due(self, pub, start, wall_start, now):
+        """Send the samples that should exist by `now`; return how many"""
+        due = min(int((now - start) * self.rate) - self.emitted, self.max_frame)
+        if due <= 0:
+            return 0
+
+        timestamps = wall_start + (self.emitted + np.arange(due)) / self.rate
+        for topic in self.topics:
+            columns = GENERATORS[topic](timestamps, self.emitted, self.rng)
+            seq = self.seq[topic]
+            frame = encode_frame(topic, columns, seq, self.epoch)
+            pub.send(frame)
+            if self.replay is not None:
+                self.replay.add(topic, seq, frame)
+            self.seq[topic] = seq + 1
+            self.frames += 1
+
+        self.emitted += due
+        return due
+
+    def run(self, duration=None):
+        """Publish until interrupted (or for `duration` seconds)"""
+        pub = pynng.Pub0(listen=self.address)
+        replay_server = None
+        if self.replay is not None and self.replay_address:
+            replay_server = ReplayServer(self.replay, self.replay_address, self.epoch).start()
+        print(f"Python publisher started on {self.address} "
+              f"({', '.join(self.topics)} at {self.rate:g} samples/s per topic, "
+              f"{self.window * 1000:g} ms frames)")
+
+        start = time.perf_counter()
+        wall_start = time.time()
+        tick = 0
+        last_report = start
+        last_emitted = 0
+
+        try:
+            while duration is None or time.perf_counter() - start < duration:
+                # Absolute deadlines: sleeping late never shifts later frames
+                tick += 1
+                delay = start + tick * self.window - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+                now = time.perf_counter()
+                self.publish_due(pub, start, wall_start, now)
+
+                if now - last_report >= self.report_every:
+                    self.achieved_rate = (self.emitted - last_emitted) / (now - last_report)
+                    print(f"Published {self.achieved_rate:,.0f} samples/s per topic "
+                          f"(target {self.rate:,.0f}), {self.frames} frames so far")
+                    last_report = now
+                    last_emitted = self.emitted
+
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pub.close()
+            if replay_server is not None:
+                replay_server.close()
+
+        elapsed = time.perf_counter() - start
+        if elapsed > 0:
+            self.achieved_rate = self.emitted / elapsed
+        print(f"Publisher stopped: {self.emitted} samples per topic in {elapsed:.1f}s "
+              f"({self.achieved_rate:,.0f} samples/s)")
+
+
+def run_example(example, rate=None, window=0.1, duration=None, address=None,
+                replay_address=None, replay_frames=DEFAULT_CAPACITY):
+    default_address, topics = EXAMPLES[example]
+    if rate is None:
+        rate = 1.0 if example == 2 else 10.0  # the original per-sample pace
+    SensorPublisher(address or default_address, topics, rate=rate, window=window,
+                    replay_address=replay_address or REPLAY_ADDRESSES[example],
+                    replay_frames=replay_frames).run(duration)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batched columnar sensor publisher")
+    parser.add_argument("--example", type=int, choices=sorted(EXAMPLES), default=5)
+    parser.add_argument("--listen", default=None, help="override the example's address")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="samples per second per topic (10 to 100000)")
+    parser.add_argument("--window", type=float, default=0.1, help="frame window in seconds")
+    parser.add_argument("--duration", type=float, default=None, help="stop after N seconds")
+    parser.add_argument("--replay", default=None, metavar="ADDRESS",
+                        help="override the example's replay address")
+    parser.add_argument("--replay-frames", type=int, default=DEFAULT_CAPACITY,
+                        help="frames kept per topic for replay (0: no replay channel)")
+    args = parser.parse_args(argv)
+
+    run_example(args.example, rate=args.rate, window=args.window,
+                duration=args.duration, address=args.listen,
+                replay_address=args.replay, replay_frames=args.replay_frames)
+
+
+if __name__ == "__main__":
+    main()
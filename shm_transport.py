@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+
+# Shared-memory transport for large arrays between co-located processes
+# -----------------------------------------------------------------------------
+# Instead of copying an array through the socket, the sender writes it into a
+# memory-mapped segment under /dev/shm and sends a small descriptor in its
+# place (a JSON envelope field):
+#
+#   {"shm": "rpy-1234-7", "offset": 0, "dtype": "<f8", "shape": [50000000]}
+#
+# and the receiver maps that segment and gets a NumPy view, no copy.
+#
+#   pool = SegmentPool()
+#   channel = ShmChannel(pool)
+#   fields = channel.pack({"data": big_array})   # descriptor instead of bytes
+#   socket.send(envelope.encode(envelope.MSG_DATA, fields))
+#   ...
+#   fields, via_shm = channel.unpack(envelope.decode(socket.recv()).fields)
+#
+# Lifetime: segments are owned by the process that created them and are
+# reference counted. pack() holds a reference for the message in flight;
+# channel.complete() drops it once the peer has answered (on a Pair / Req
+# socket, the peer's next message means it is done with the last one).
+# Released segments go back to a free list by power-of-two size class, so a
+# steady stream of large arrays reuses the same mapped pages: after warm-up
+# a transfer costs one memcpy into the segment and no allocation, ftruncate
+# or page faults, whatever the array size.
+#
+# Views returned by unpack() alias the peer's segment and are only valid
+# until the reply is sent; copy anything that must outlive the request.
+# The R side (shm.R) writes requests into its own files and reads replies
+# with readBin, which is one copy but none through the socket.
+import itertools
+import mmap
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+SHM_THRESHOLD = 1 << 20   # arrays smaller than this still go inline
+MIN_SEGMENT = 1 << 16
+
+
+class ShmError(Exception):
+    pass
+
+
+def size_class(nbytes):
+    """Segment size for nbytes: next power of two, at least MIN_SEGMENT"""
+    return max(MIN_SEGMENT, 1 << max(0, int(nbytes) - 1).bit_length())
+
+
+def is_descriptor(value):
+    return isinstance(value, dict) and "shm" in value
+
+
+class Segment:
+    def __init__(self, name, path, size):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.refs = 0
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            os.ftruncate(fd, size)
+            self.buffer = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    def array(self, shape, dtype, offset=0):
+        dtype = np.dtype(dtype)
+        return np.ndarray(shape, dtype=dtype, buffer=self.buffer, offset=offset)
+
+    def close(self):
+        try:
+            self.buffer.close()
+        except BufferError:
+            # A view is still alive; the mapping goes when it does
+            pass
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class Attachment:
+    """A peer's segment, mapped read/write and cached between messages"""
+
+    def __init__(self, path):
+        fd = os.open(path, os.O_RDWR)
+        try:
+            stat = os.fstat(fd)
+            self.inode, self.size = stat.st_ino, stat.st_size
+            self.buffer = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        try:
+            self.buffer.close()
+        except BufferError:
+            pass
+
+
+class SegmentPool:
+    def __init__(self, prefix=None, directory=SHM_DIR, max_free_bytes=2 << 30):
+        self.prefix = prefix or f"rpy-{os.getpid()}"
+        self.directory = directory
+        self.max_free_bytes = max_free_bytes
+
+        self.lock = threading.Lock()
+        self.counter = itertools.count(1)
+        self.segments = {}      # name -> Segment (ours, in use or free)
+        self.free = {}          # size class -> [Segment]
+        self.free_bytes = 0
+        self.attached = {}      # name -> Attachment (the peer's)
+
+        self.created = 0
+        self.reused = 0
+
+    # -- our segments ---------------------------------------------------------
+
+    def acquire(self, nbytes):
+        """A segment of at least nbytes with one reference"""
+        size = size_class(nbytes)
+        with self.lock:
+            free = self.free.get(size)
+            if free:
+                segment = free.pop()
+                self.free_bytes -= size
+                self.reused += 1
+            else:
+                name = f"{self.prefix}-{next(self.counter)}"
+                segment = Segment(name, os.path.join(self.directory, name), size)
+                self.segments[name] = segment
+                self.created += 1
+            segment.refs = 1
+        return segment
+
+    def retain(self, segment):
+        with self.lock:
+            segment.refs += 1
+
+    def release(self, segment):
+        """Drop one reference; unreferenced segments are kept for reuse"""
+        with self.lock:
+            segment.refs -= 1
+            if segment.refs > 0:
+                return
+            self.free.setdefault(segment.size, []).append(segment)
+            self.free_bytes += segment.size
+            # Over budget: unmap the biggest free segments first
+            for size in sorted(self.free, reverse=True):
+                while self.free_bytes > self.max_free_bytes and self.free[size]:
+                    victim = self.free[size].pop()
+                    self.free_bytes -= victim.size
+                    del self.segments[victim.name]
+                    victim.close()
+
+    def empty(self, shape, dtype=np.float64):
+        """(segment, array) to fill in place, e.g. as the out= of a NumPy call"""
+        dtype = np.dtype(dtype)
+        segment = self.acquire(int(np.prod(shape, dtype=np.int64)) * dtype.itemsize)
+        return segment, segment.array(shape, dtype)
+
+    def put(self, array):
+        """Copy array into a segment; returns (segment, descriptor)"""
+        array = np.asarray(array)
+        segment, view = self.empty(array.shape, array.dtype.newbyteorder("<"))
+        np.copyto(view, array)
+        return segment, self.describe(segment, view)
+
+    def describe(self, segment, view, offset=0):
+        return {"shm": segment.name, "offset": offset, "dtype": view.dtype.str,
+                "shape": list(view.shape)}
+
+    # -- the peer's segments --------------------------------------------------
+
+    def attach(self, descriptor):
+        """NumPy view of the array a descriptor points to (no copy)"""
+        name = descriptor["shm"]
+        if os.sep in name or name.startswith("."):
+            raise ShmError(f"Invalid segment name '{name}'")
+        path = os.path.join(self.directory, name)
+
+        dtype = np.dtype(descriptor.get("dtype", "<f8"))
+        shape = descriptor.get("shape", [])
+        shape = (int(shape),) if np.isscalar(shape) else tuple(int(n) for n in shape)
+        offset = int(descriptor.get("offset", 0))
+        end = offset + int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+
+        with self.lock:
+            if name in self.segments:
+                buffer = self.segments[name].buffer  # one of ours (same process)
+            else:
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    raise ShmError(f"Segment '{name}' does not exist") from None
+                attachment = self.attached.get(name)
+                # Remap if the peer recreated or grew the file since last time
+                if (attachment is None or attachment.inode != stat.st_ino
+                        or attachment.size < stat.st_size):
+                    if attachment is not None:
+                        attachment.close()
+                    self._prune_attached()
+                    attachment = self.attached[name] = Attachment(path)
+                buffer = attachment.buffer
+
+        if end > len(buffer):
+            raise ShmError(f"Descriptor overruns segment '{name}' ({end} > {len(buffer)} bytes)")
+        return np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+
+    def _prune_attached(self):
+        """Unmap peer segments that the peer has unlinked"""
+        for name in [n for n in self.attached if not os.path.exists(os.path.join(self.directory, n))]:
+            self.attached.pop(name).close()
+
+    def detach(self, name):
+        with self.lock:
+            attachment = self.attached.pop(name, None)
+        if attachment is not None:
+            attachment.close()
+
+    # -------------------------------------------------------------------------
+
+    def stats(self):
+        with self.lock:
+            return {
+                "segments": len(self.segments),
+                "in_use": sum(1 for s in self.segments.values() if s.refs > 0),
+                "free_bytes": self.free_bytes,
+                "mapped_bytes": sum(s.size for s in self.segments.values()),
+                "attached": len(self.attached),
+                "created": self.created,
+                "reused": self.reused
+            }
+
+    def close(self):
+        """Unmap and unlink our segments, unmap the peer's"""
+        with self.lock:
+            segments, self.segments, self.free = list(self.segments.values()), {}, {}
+            attached, self.attached = list(self.attached.values()), {}
+            self.free_bytes = 0
+        for segment in segments:
+            segment.close()
+        for attachment in attached:
+            attachment.close()
+
+
+class ShmChannel:
+    """Swap large arrays for descriptors on the way out, and back on the way in"""
+
+    def __init__(self, pool, threshold=SHM_THRESHOLD):
+        self.pool = pool
+        self.threshold = threshold
+        self.in_flight = []  # segments referenced by the last message sent
+
+    def pack(self, fields):
+        """Fields with every numeric array of at least `threshold` bytes in shared memory"""
+        packed = {}
+        for name, value in fields.items():
+            if (isinstance(value, np.ndarray) and value.dtype.kind in "biuf"
+                    and value.nbytes >= self.threshold):
+                segment, packed[name] = self.pool.put(value)
+                self.in_flight.append(segment)
+            else:
+                packed[name] = value
+        return packed
+
+    def share(self, segment, view):
+        """Descriptor for an array built in place in one of our segments (pool.empty)"""
+        self.in_flight.append(segment)
+        return self.pool.describe(segment, view)
+
+    def unpack(self, fields):
+        """(fields with descriptors replaced by views, whether any were)"""
+        via_shm = False
+        unpacked = {}
+        for name, value in fields.items():
+            if is_descriptor(value):
+                unpacked[name] = self.pool.attach(value)
+                via_shm = True
+            else:
+                unpacked[name] = value
+        return unpacked, via_shm
+
+    def complete(self):
+        """The peer has answered: release the segments of the last message sent"""
+        segments, self.in_flight = self.in_flight, []
+        for segment in segments:
+            self.pool.release(segment)
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+
+# Concurrent version of the Example 1 stats server (from_p.py)
+# -----------------------------------------------------------------------------
+# One Rep0 socket, one pynng context per worker. Every context receives a
+# request, computes the statistics and replies on that same context, so the
+# reply always goes back to the R session that asked for it while the other
+# contexts keep serving other clients.
+#
+# Threads are the default: the NumPy reductions release the GIL, so several
+# large arrays are reduced in parallel. With --processes the contexts hand
+# the work to a process pool instead.
+#
+#   python stats_server.py --workers 8
+#   python stats_server.py --workers 8 --processes
+#
+# Requests are either an envelope (envelope.py, field "data") or the legacy
+# bare float64 payload; replies come back in the same format. Sending -999
+# (one float64) or a "shutdown" control envelope from any R client shuts the
+# whole pool down.
+#
+# Envelopes carrying a "stream" field are chunks of one large dataset
+# (streaming_stats.py): each chunk is folded into running statistics kept
+# per stream id, and the final message gets the complete result.
+#
+# With --metrics ADDRESS every request is timed (decode, compute, serialize,
+# send; metrics.py) and a snapshot is served on that side socket.
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pynng
+
+import envelope
+from metrics import NULL_METRICS, NULL_TIMER, create_metrics
+from streaming_stats import QUANTILE_SAMPLE_SIZE, RunningStats
+
+SHUTDOWN_SIGNAL = -999
+STREAM_IDLE_TIMEOUT = 600  # seconds before an abandoned stream is dropped
+
+
+def compute_stats(data):
+    """Same statistics as the single-threaded Example 1 server"""
+    return {
+        "mean": float(np.mean(data)),
+        "std": float(np.std(data)),
+        "min": float(np.min(data)),
+        "max": float(np.max(data)),
+        "length": int(data.size)
+    }
+
+
+def handle_request(raw_data, timer=NULL_TIMER):
+    """Decode one request and encode its reply (picklable for the process pool)"""
+    if envelope.is_envelope(raw_data):
+        try:
+            message = envelope.decode(raw_data)
+            data = np.atleast_1d(np.asarray(message["data"], dtype=np.float64))
+            timer.mark("decode")
+            stats = compute_stats(data)
+            timer.mark("compute")
+            reply = envelope.result(**stats)
+            timer.mark("serialize")
+            return reply
+        except Exception as e:
+            return envelope.error(e)
+
+    try:
+        data = np.frombuffer(raw_data, dtype=np.float64)
+        timer.mark("decode")
+        result = compute_stats(data)
+        timer.mark("compute")
+    except Exception as e:
+        result = {"status": "error", "message": str(e)}
+    reply = json.dumps(result).encode('utf-8')
+    timer.mark("serialize")
+    return reply
+
+
+def is_shutdown(raw_data):
+    """True for the float64 -999 sentinel or a shutdown control envelope"""
+    if envelope.is_envelope(raw_data):
+        try:
+            message = envelope.decode(raw_data)
+        except envelope.EnvelopeError:
+            return False
+        return message.msg_type == envelope.MSG_CONTROL and message.get("action") == "shutdown"
+    if len(raw_data) != 8:
+        return False
+    return np.frombuffer(raw_data, dtype=np.float64)[0] == SHUTDOWN_SIGNAL
+
+
+class StatsServer:
+    def __init__(self, address="tcp://127.0.0.1:5555", workers=None, processes=False,
+                 metrics=NULL_METRICS):
+        self.address = address
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = processes
+        self.metrics = metrics
+
+        self.socket = None
+        self.pool = None
+        self.contexts = []
+        self.threads = []
+        self.stop_event = threading.Event()
+
+        self.streams = {}
+        self.streams_lock = threading.Lock()
+
+    def handle(self, raw_data, timer=NULL_TIMER):
+        """Compute the reply for one request (runs on a context thread)"""
+        if envelope.is_envelope(raw_data):
+            try:
+                message = envelope.decode(raw_data)
+                if "stream" in message.fields:
+                    timer.mark("decode")
+                    reply = self.handle_stream(message)
+                    timer.mark("compute")
+                    return reply
+            except Exception as e:
+                return envelope.error(e)
+
+        if self.pool is not None:
+            reply = self.pool.submit(handle_request, raw_data).result()
+            timer.mark("compute")
+            return reply
+        return handle_request(raw_data, timer)
+
+    def handle_stream(self, message):
+        """Fold one chunk into its stream; reply with an ack, partial or final stats"""
+        stream_id = message["stream"]
+        now = time.monotonic()
+
+        with self.streams_lock:
+            stream = self.streams.get(stream_id)
+            if stream is None:
+                # Drop streams whose client went away mid-transfer
+                for old_id in [k for k, v in self.streams.items()
+                               if now - v["last_seen"] > STREAM_IDLE_TIMEOUT]:
+                    del self.streams[old_id]
+
+                probs = message.get("quantiles")
+                stream = {
+                    "stats": RunningStats(QUANTILE_SAMPLE_SIZE if probs is not None else 0),
+                    "probs": probs,
+                    "lock": threading.Lock(),
+                    "last_seen": now
+                }
+                self.streams[stream_id] = stream
+            stream["last_seen"] = now
+
+        with stream["lock"]:
+            data = message.get("data")
+            if data is not None:
+                stream["stats"].update(data)
+
+            if message.get("final", False):
+                with self.streams_lock:
+                    self.streams.pop(stream_id, None)
+                return envelope.result(final=True, **stream["stats"].to_dict(stream["probs"]))
+
+            if message.get("partial", False):
+                return envelope.result(final=False, **stream["stats"].to_dict(stream["probs"]))
+
+            return envelope.result(stream=stream_id, length=stream["stats"].count)
+
+    def context_loop(self, context):
+        """Serve requests on one context until the socket is closed"""
+        while not self.stop_event.is_set():
+            try:
+                raw_data = context.recv()
+            except pynng.Closed:
+                break
+
+            if is_shutdown(raw_data):
+                print("Received shutdown signal from R")
+                self.stop_event.set()
+                break
+
+            timer = self.metrics.start()
+            response, sent, failed = b"", False, False
+            try:
+                try:
+                    response = self.handle(raw_data, timer)
+                except Exception as e:
+                    # e.g. a broken process pool: still answer the request
+                    failed = True
+                    response = envelope.pack_reply({"status": "error", "message": str(e)},
+                                                   envelope.is_envelope(raw_data))
+                context.send(response)
+                sent = True
+                timer.mark("send")
+            except pynng.Closed:
+                break
+            except pynng.NNGException as e:
+                print(f"Error: {e}")
+            finally:
+                # Every request is finished, or in_flight drifts upward
+                timer.finish(sent=len(response) if sent else 0, received=len(raw_data),
+                             error=failed or not sent or envelope.message_type(response) == envelope.MSG_ERROR)
+
+    def serve_forever(self):
+        """Start the contexts and block until shutdown"""
+        self.socket = pynng.Rep0(listen=self.address)
+        self.socket.recv_max_size = 0  # large arrays: no 1 MB default cap
+        if self.processes:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+
+        mode = "processes" if self.processes else "threads"
+        print(f"Python server listening on {self.address} ({self.workers} workers, {mode})")
+
+        for _ in range(self.workers):
+            context = self.socket.new_context()
+            self.contexts.append(context)
+            thread = threading.Thread(target=self.context_loop, args=(context,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+        try:
+            self.stop_event.wait()
+        except KeyboardInterrupt:
+            print("Interrupted")
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Close the contexts and socket, join the threads, stop the pool"""
+        self.stop_event.set()
+        # Closing a context wakes the thread blocked in its recv()
+        for context in self.contexts:
+            context.close()
+        if self.socket:
+            self.socket.close()
+        for thread in self.threads:
+            thread.join()
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+        print("Socket closed")
+
+
+def serve_stats(address="tcp://127.0.0.1:5555", workers=None, processes=False, metrics_address=None):
+    metrics, endpoint = create_metrics(metrics_address is not None, metrics_address)
+    try:
+        StatsServer(address, workers=workers, processes=processes, metrics=metrics).serve_forever()
+    finally:
+        if endpoint is not None:
+            endpoint.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent Example 1 stats server")
+    parser.add_argument("--listen", default="tcp://127.0.0.1:5555")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of contexts / workers (default: CPU count)")
+    parser.add_argument("--processes", action="store_true",
+                        help="compute in a process pool instead of threads")
+    parser.add_argument("--metrics", default=None, metavar="ADDRESS",
+                        help="time every request and serve the metrics on this address")
+    args = parser.parse_args(argv)
+
+    serve_stats(args.listen, workers=args.workers, processes=args.processes,
+                metrics_address=args.metrics)
+
+
+if __name__ == "__main__":
+    main()
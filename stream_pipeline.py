@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+
+# Stateful incremental scaling for the Example 3 pipeline (from_p.py)
+# -----------------------------------------------------------------------------
+# Every named stream keeps its own chain of transformers. A batch updates
+# each step with partial_fit and is then transformed by it, so scaling is
+# cumulative over everything the stream has seen and costs O(batch) per
+# message instead of refitting from scratch on every batch.
+#
+#   pipelines = PipelineStore("pipelines")
+#   scaled, pipeline = pipelines.process("sensor-a", batch, steps=["scaler", "pca:2"])
+#
+# Steps are looked up in STEPS ("name" or "name:arg"); the chain always
+# starts with a StandardScaler, and register_step() adds more. A stream keeps
+# the steps it was created with: asking for others is an error until it is
+# reset. Streams are snapshotted to <directory>/<stream>.joblib every
+# `snapshot_interval` seconds and on close, and picked up again after a
+# restart.
+#
+# Control actions (CONTROL envelopes on the Example 3 socket):
+#   inspect   stream   steps, samples seen and fitted parameters
+#   reset     stream   forget the state (and the snapshot)
+#   snapshot  [stream] write snapshots now
+#   list               known streams
+import os
+import re
+import threading
+import time
+
+import joblib
+import numpy as np
+from sklearn.decomposition import IncrementalPCA
+from sklearn.preprocessing import MaxAbsScaler, MinMaxScaler, StandardScaler
+
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+$")
+DEFAULT_STEPS = ("scaler",)
+
+
+class PipelineError(LookupError):
+    pass
+
+
+STEPS = {
+    "scaler": lambda arg: StandardScaler(),
+    "minmax": lambda arg: MinMaxScaler(),
+    "maxabs": lambda arg: MaxAbsScaler(),
+    # IncrementalPCA needs batches of at least n_components rows
+    "pca": lambda arg: IncrementalPCA(n_components=int(arg or 1)),
+}
+
+
+def register_step(name, factory):
+    """Make factory(arg) available as a pipeline step; it must support partial_fit"""
+    STEPS[name] = factory
+
+
+def normalize_steps(steps):
+    """Step specs as a list that starts with the scaler"""
+    steps = [steps] if isinstance(steps, str) else list(steps)
+    if not steps or steps[0] != "scaler":
+        steps.insert(0, "scaler")
+    return steps
+
+
+def make_step(spec):
+    name, _, arg = spec.partition(":")
+    if name not in STEPS:
+        raise PipelineError(f"Unknown pipeline step {name!r} (known: {', '.join(sorted(STEPS))})")
+    return spec, STEPS[name](arg or None)
+
+
+class StreamPipeline:
+    def __init__(self, steps=DEFAULT_STEPS):
+        self.steps = [make_step(spec) for spec in normalize_steps(steps)]
+        self.batches = 0
+        self.created = time.time()
+        self.updated = None
+        self.lock = threading.Lock()
+
+    @property
+    def n_samples_seen(self):
+        return int(np.max(self.steps[0][1].n_samples_seen_)) if self.batches else 0
+
+    def update(self, X):
+        """partial_fit every step on the batch and return it transformed"""
+        with self.lock:
+            for _, step in self.steps:
+                step.partial_fit(X)
+                X = step.transform(X)
+            self.batches += 1
+            self.updated = time.time()
+            return X
+
+    def inspect(self):
+        """Steps and their fitted parameters (JSON-friendly)"""
+        with self.lock:
+            steps = []
+            for spec, step in self.steps:
+                info = {"step": spec, "type": type(step).__name__}
+                if self.batches:
+                    for attr in ("mean_", "var_", "scale_", "data_min_", "data_max_", "max_abs_",
+                                 "explained_variance_ratio_"):
+                        value = getattr(step, attr, None)
+                        if value is not None:
+                            info[attr.rstrip("_")] = np.asarray(value).tolist()
+                steps.append(info)
+            return {
+                "steps": steps,
+                "batches": self.batches,
+                "n_samples_seen": self.n_samples_seen,
+                "created": self.created,
+                "updated": self.updated
+            }
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+
+def batch_result(name, X, transformed, pipeline):
+    """Reply for one processed batch: the transformed rows plus running statistics"""
+    scaler = pipeline.steps[0][1]
+    return {
+        "stream": name,
+        "scaled_data": transformed.ravel() if transformed.shape[1] == 1 else transformed,
+        "n_points": len(X),
+        "n_samples_seen": pipeline.n_samples_seen,
+        "batches": pipeline.batches,
+        "original_mean": float(np.mean(X)),
+        "original_std": float(np.std(X)),
+        "scaled_mean": float(np.mean(transformed)),
+        "scaled_std": float(np.std(transformed)),
+        "running_mean": scaler.mean_,
+        "running_std": scaler.scale_
+    }
+
+
+class PipelineStore:
+    def __init__(self, directory="pipelines", snapshot_interval=5.0):
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        self.pipelines = {}
+        self.dirty = set()
+        self.last_snapshot = time.monotonic()
+        self.lock = threading.RLock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _check_name(self, name):
+        if not NAME_PATTERN.match(name or ""):
+            raise PipelineError(f"Invalid stream name: {name!r}")
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.joblib")
+
+    def get(self, name, steps=None, create=True):
+        """The stream's pipeline: in memory, else from its snapshot, else new
+
+        `steps` must match an existing stream's chain; changing it needs a reset.
+        """
+        self._check_name(name)
+        with self.lock:
+            pipeline = self.pipelines.get(name)
+            if pipeline is None and os.path.exists(self._path(name)):
+                pipeline = self.pipelines[name] = joblib.load(self._path(name))
+                print(f"Restored stream {name} ({pipeline.n_samples_seen} samples seen)")
+            if pipeline is None:
+                if not create:
+                    raise PipelineError(f"No stream named {name!r}")
+                pipeline = self.pipelines[name] = StreamPipeline(steps or DEFAULT_STEPS)
+            elif steps is not None:
+                current = [spec for spec, _ in pipeline.steps]
+                if normalize_steps(steps) != current:
+                    raise PipelineError(f"Stream {name!r} runs steps {current}, not "
+                                        f"{normalize_steps(steps)}; reset it to change them")
+            return pipeline
+
+    def process(self, name, X, steps=None):
+        """Update the stream with a batch; returns (transformed batch, pipeline)"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(-1, 1)
+        pipeline = self.get(name, steps)
+        transformed = pipeline.update(X)
+        with self.lock:
+            self.dirty.add(name)
+            due = time.monotonic() - self.last_snapshot >= self.snapshot_interval
+        if due:
+            self.snapshot()
+        return transformed, pipeline
+
+    def snapshot(self, name=None):
+        """Write changed streams (or just `name`) to disk; returns their names"""
+        with self.lock:
+            names = [name] if name is not None else sorted(self.dirty)
+            for stream in names:
+                pipeline = self.get(stream, create=False)
+                with pipeline.lock:
+                    # Temporary file first so a crash never leaves half a snapshot
+                    joblib.dump(pipeline, self._path(stream) + ".tmp")
+                os.replace(self._path(stream) + ".tmp", self._path(stream))
+                self.dirty.discard(stream)
+            self.last_snapshot = time.monotonic()
+        return names
+
+    def reset(self, name):
+        self._check_name(name)
+        with self.lock:
+            existed = self.pipelines.pop(name, None) is not None
+            self.dirty.discard(name)
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+                existed = True
+        return existed
+
+    def inspect(self, name):
+        return dict(self.get(name, create=False).inspect(), stream=name)
+
+    def list(self):
+        with self.lock:
+            on_disk = {f[:-len(".joblib")] for f in os.listdir(self.directory) if f.endswith(".joblib")}
+            return sorted(on_disk | set(self.pipelines))
+
+    def handle_control(self, request):
+        """Answer an inspect / reset / snapshot / list control request"""
+        action = request.get("action")
+        name = request.get("stream")
+        if action == "inspect":
+            return dict(self.inspect(name), status="success")
+        if action == "reset":
+            return {"status": "success", "stream": name, "reset": self.reset(name)}
+        if action == "snapshot":
+            return {"status": "success", "saved": self.snapshot(name)}
+        if action == "list":
+            return {"status": "success", "streams": self.list()}
+        return {"status": "error", "message": f"Invalid action: {action}"}
+
+    def close(self):
+        self.snapshot()
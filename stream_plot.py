@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+
+# Live, decimated plot of the Example 5 sensor streams for the Tk GUI
+# -----------------------------------------------------------------------------
+# A subscriber thread decodes the publisher's frames (sensor_publisher.py)
+# and appends them to one bounded NumPy ring buffer per topic; nothing it
+# does touches Tk. On every tick the Tk thread cuts the visible time window
+# out of each buffer, reduces it to about one point pair per pixel column
+# and moves one canvas line per topic with a single coords() call:
+#
+#   minmax  min and max of every pixel column (np.minimum.reduceat): every
+#           spike stays visible, cost is O(samples in the window)
+#   lttb    Largest-Triangle-Three-Buckets, `width` points that keep the
+#           shape of the curve (a Python loop over the buckets)
+#
+# so drawing costs the same for 1 000 or 1 000 000 samples on screen. Like
+# log_view.py, the redraw adapts to a frame budget: when a frame takes too
+# long the tick interval grows, and it shrinks back when there is headroom.
+#
+#   plot = StreamPlot(canvas, ["temp", "press", "vib"], window=10)
+#   plot.subscribe("tcp://127.0.0.1:5558")
+#   plot.start()
+import threading
+import time
+from bisect import bisect_left
+
+import numpy as np
+import pynng
+import tkinter as tk
+
+import envelope
+from sensor_aggregator import RingBuffer
+
+COLORS = ("#4fc1ff", "#ce9178", "#b5cea8", "#c586c0", "#dcdcaa")
+
+
+def minmax_decimate(t, v, t0, t1, width):
+    """(pixel x, value) pairs: min then max of every non-empty pixel column"""
+    if len(t) <= 2 * width:
+        return (t - t0) / (t1 - t0) * width, v
+    edges = np.searchsorted(t, t0 + (t1 - t0) * np.arange(width + 1) / width)
+    starts = edges[:-1]
+    filled = edges[1:] > starts
+    starts = starts[filled]
+    # Segments run from each start to the next one, the last to the end of v
+    v = v[:edges[-1]]
+    x = np.repeat(np.flatnonzero(filled) + 0.5, 2)
+    y = np.column_stack((np.minimum.reduceat(v, starts), np.maximum.reduceat(v, starts))).ravel()
+    return x, y
+
+
+def lttb(t, v, t0, t1, width):
+    """Largest-Triangle-Three-Buckets down to `width` points, in pixel x"""
+    x = (t - t0) / (t1 - t0) * width
+    n = len(x)
+    if n <= width or width < 3:
+        return x, v
+    # Bucket i (1 .. width-2) covers [edges[i-1], edges[i]); first and last points stay
+    edges = (np.arange(width - 1) * (n - 2) / (width - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(v[:n - 1], edges[:-1]) / counts
+    avg_x = np.append(avg_x[1:], x[-1])  # the next bucket's average, per bucket
+    avg_y = np.append(avg_y[1:], v[-1])
+
+    keep = np.empty(width, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(width - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i]) * (v[lo:hi] - v[a]) - (x[a] - x[lo:hi]) * (avg_y[i] - v[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return x[keep], v[keep]
+
+
+DECIMATORS = {"minmax": minmax_decimate, "lttb": lttb}
+
+
+class StreamBuffer:
+    """Thread-safe bounded (timestamp, value) history of one topic"""
+
+    def __init__(self, capacity):
+        self.ring = RingBuffer(capacity)
+        self.lock = threading.Lock()
+        self.received = 0
+
+    def extend(self, t, v):
+        with self.lock:
+            self.ring.extend(t, v)
+            self.received += len(v)
+
+    def window(self, t0, t1, width, decimate):
+        """Samples with timestamp >= t0 reduced to `width` columns
+
+        Returns (x, y, samples in the window, last value). The reduction runs
+        on views into the ring under the lock, so only the few points that are
+        drawn get copied.
+        """
+        ring = self.ring
+        with self.lock:
+            begin = max(0, ring.end - ring.capacity)
+            first = bisect_left(range(begin, ring.end), t0, key=lambda i: ring.t[i % ring.capacity])
+            t, v = ring.span(begin + first, ring.end)
+            if len(v) < 2:
+                return None, None, len(v), None
+            x, y = decimate(t, v, t0, t1, width)
+            return x, np.array(y), len(v), float(v[-1])
+
+
+class StreamPlot:
+    def __init__(self, canvas, topics, window=10.0, capacity=1_000_000, mode="minmax",
+                 field="value", frame_budget=0.016, min_interval=0.033, max_interval=0.5):
+        self.canvas = canvas
+        self.topics = list(topics)
+        self.window = window
+        self.decimate = DECIMATORS[mode]
+        self.field = field
+        self.frame_budget = frame_budget
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+
+        self.buffers = {topic: StreamBuffer(capacity) for topic in self.topics}
+        self.lines = {}
+        self.labels = {}
+        self.socket = None
+        self.thread = None
+        self.running = False
+        self.last_render = 0.0
+
+        for i, topic in enumerate(self.topics):
+            color = COLORS[i % len(COLORS)]
+            self.lines[topic] = canvas.create_line(0, 0, 0, 0, fill=color, width=1)
+            self.labels[topic] = canvas.create_text(6, 0, anchor=tk.NW, fill=color,
+                                                    font=('Consolas', 9), text=topic)
+
+    # -- subscriber thread ----------------------------------------------------
+
+    def subscribe(self, address):
+        """Start receiving the topics from a publisher (idempotent)"""
+        if self.socket is not None:
+            return
+        self.socket = pynng.Sub0(recv_max_size=0)
+        for topic in self.topics:
+            self.socket.subscribe(topic)
+        self.socket.dial(address, block=False)
+        self.thread = threading.Thread(target=self._receive, name="stream-plot", daemon=True)
+        self.thread.start()
+
+    def _receive(self):
+        socket = self.socket
+        while True:
+            try:
+                raw = socket.recv()
+            except pynng.Closed:
+                break
+            sep = raw.find(b"\0")
+            buffer = self.buffers.get(raw[:sep].decode())
+            if buffer is None:
+                continue
+            try:
+                fields = envelope.decode(memoryview(raw)[sep + 1:]).fields
+                t = np.asarray(fields["timestamp"], dtype=np.float64).ravel()
+                v = np.asarray(fields[self.field], dtype=np.float64).ravel()
+            except (envelope.EnvelopeError, KeyError):
+                continue
+            buffer.extend(t, v)
+
+    def unsubscribe(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.thread.join(timeout=2)
+            self.socket = self.thread = None
+
+    # -- Tk thread ------------------------------------------------------------
+
+    def render(self):
+        width = max(self.canvas.winfo_width(), 10)
+        height = max(self.canvas.winfo_height(), 10)
+        lane = height / len(self.topics)
+        t1 = time.time()
+        t0 = t1 - self.window
+
+        for i, topic in enumerate(self.topics):
+            x, y, count, last = self.buffers[topic].window(t0, t1, width, self.decimate)
+            top = i * lane
+            if x is None:
+                self.canvas.coords(self.lines[topic], 0, 0, 0, 0)
+                self.canvas.coords(self.labels[topic], 6, top + 2)
+                self.canvas.itemconfig(self.labels[topic], text=f"{topic}  (waiting)")
+                continue
+
+            low, high = float(y.min()), float(y.max())
+            span = (high - low) or 1.0
+            # Lane with a small margin; larger values draw higher
+            py = top + lane - 4 - (y - low) / span * (lane - 18)
+            points = np.column_stack((x, py)).ravel()
+            self.canvas.coords(self.lines[topic], *points.tolist())
+            self.canvas.coords(self.labels[topic], 6, top + 2)
+            self.canvas.itemconfig(
+                self.labels[topic],
+                text=f"{topic}  {last:.3f}  [{low:.3f}, {high:.3f}]  "
+                     f"{count:,} pts / {self.window:g}s → {len(x):,} drawn")
+
+    def adapt(self, elapsed):
+        """Stretch the redraw interval while frames run over budget"""
+        if elapsed > self.frame_budget:
+            self.interval = min(self.max_interval, self.interval * 1.5)
+        elif elapsed < self.frame_budget / 2:
+            self.interval = max(self.min_interval, self.interval / 1.5)
+
+    def tick(self):
+        if not self.running:
+            return
+        start = time.perf_counter()
+        self.render()
+        self.last_render = time.perf_counter() - start
+        self.adapt(self.last_render)
+        self.canvas.after(int(self.interval * 1000), self.tick)
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.canvas.after(int(self.interval * 1000), self.tick)
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+# Incremental statistics for chunked (streaming) transfers
+# -----------------------------------------------------------------------------
+# The client sends a large dataset as a sequence of chunks; the server folds
+# every chunk into a RunningStats and only ever holds one chunk at a time,
+# so peak memory is bounded by the chunk size, not the dataset size.
+#
+#   chunk message : envelope MSG_DATA {stream, data, [partial], [quantiles]}
+#   final message : envelope MSG_DATA {stream, final = TRUE, [data]}
+#
+# Each chunk is reduced with vectorized NumPy and merged with the running
+# state (Chan et al. parallel form of Welford's update), min/max/count are
+# tracked exactly and a fixed-size reservoir sample gives approximate
+# quantiles when the first chunk asks for them.
+import uuid
+
+import numpy as np
+
+import envelope
+
+DEFAULT_CHUNK_SIZE = 262144  # float64 values per chunk (2 MB)
+QUANTILE_SAMPLE_SIZE = 8192
+
+
+class RunningStats:
+    def __init__(self, quantile_sample=0, seed=None):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+        self.sample = np.empty(quantile_sample) if quantile_sample else None
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, chunk):
+        """Fold one chunk into the running state"""
+        chunk = np.asarray(chunk, dtype=np.float64).ravel()
+        n = chunk.size
+        if n == 0:
+            return
+
+        chunk_mean = float(np.mean(chunk))
+        chunk_m2 = float(np.var(chunk)) * n
+
+        if self.sample is not None:
+            self._update_sample(chunk)
+
+        delta = chunk_mean - self.mean
+        total = self.count + n
+        self.mean += delta * n / total
+        self.m2 += chunk_m2 + delta * delta * self.count * n / total
+        self.count = total
+
+        self.min = min(self.min, float(np.min(chunk)))
+        self.max = max(self.max, float(np.max(chunk)))
+
+    def _update_sample(self, chunk):
+        """Reservoir sampling (Algorithm R), vectorized over the chunk"""
+        k = len(self.sample)
+        seen = self.count
+
+        # Fill the empty slots first
+        take = max(0, min(k - seen, chunk.size))
+        if take:
+            self.sample[seen:seen + take] = chunk[:take]
+
+        rest = chunk[take:]
+        if rest.size:
+            # Element i (0-based over the whole stream) replaces slot j with
+            # j uniform in [0, i]; only j < k lands in the reservoir
+            positions = np.arange(seen + take, seen + chunk.size, dtype=np.float64)
+            slots = (self.rng.random(rest.size) * (positions + 1)).astype(np.int64)
+            keep = slots < k
+            self.sample[slots[keep]] = rest[keep]
+
+    def variance(self, ddof=0):
+        if self.count - ddof <= 0:
+            return float("nan")
+        return self.m2 / (self.count - ddof)
+
+    def quantiles(self, probs):
+        if self.sample is None or self.count == 0:
+            return None
+        filled = self.sample[:min(self.count, len(self.sample))]
+        return np.quantile(filled, probs)
+
+    def to_dict(self, probs=None):
+        """Same keys as the Example 1 stats reply, plus optional quantiles"""
+        result = {
+            "mean": self.mean if self.count else float("nan"),
+            "std": float(np.sqrt(self.variance())),
+            "min": self.min if self.count else float("nan"),
+            "max": self.max if self.count else float("nan"),
+            "length": self.count
+        }
+        if probs is not None and self.sample is not None:
+            result["probs"] = np.asarray(probs, dtype=np.float64)
+            result["quantiles"] = self.quantiles(probs)
+        return result
+
+
+def iter_chunks(data, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield views of data in chunk_size slices (no copies)"""
+    data = np.asarray(data, dtype=np.float64).ravel()
+    for start in range(0, data.size, chunk_size):
+        yield data[start:start + chunk_size]
+
+
+def stream_messages(chunks, quantiles=None, partial_every=0):
+    """Yield (message, values in it, wants partial stats) for one stream
+
+    The last message is the `final` one, yielded with a size of None.
+    """
+    stream_id = uuid.uuid4().hex
+
+    for index, chunk in enumerate(chunks, start=1):
+        fields = {"stream": stream_id, "data": np.asarray(chunk, dtype=np.float64)}
+        if index == 1 and quantiles is not None:
+            fields["quantiles"] = np.asarray(quantiles, dtype=np.float64)
+        want_partial = bool(partial_every and index % partial_every == 0)
+        if want_partial:
+            fields["partial"] = True
+        yield envelope.encode(envelope.MSG_DATA, fields), fields["data"].size, want_partial
+
+    yield envelope.encode(envelope.MSG_DATA, {"stream": stream_id, "final": True}), None, False
+
+
+def _stream_reply(raw):
+    reply = envelope.decode(raw)
+    if reply.msg_type == envelope.MSG_ERROR:
+        raise RuntimeError(reply.get("message"))
+    return reply.fields
+
+
+def stream_chunks(socket, chunks, quantiles=None, partial_every=0, progress=None):
+    """Send chunks over a Req socket as one stream and return the final stats
+
+    chunks is any iterable of arrays (a generator keeps client memory bounded
+    too). progress(chunks_sent, values_sent, partial_stats) is called after
+    each chunk; partial_stats is only filled every partial_every chunks.
+    """
+    sent = 0
+    for index, (message, size, want_partial) in enumerate(
+            stream_messages(chunks, quantiles, partial_every), start=1):
+        socket.send(message)
+        fields = _stream_reply(socket.recv())
+        if size is None:
+            return fields
+
+        sent += size
+        if progress is not None:
+            progress(index, sent, fields if want_partial else None)
+
+
+async def astream_chunks(context, chunks, quantiles=None, partial_every=0, progress=None):
+    """stream_chunks() over a Req0 context with asend / arecv (for asyncio clients)"""
+    sent = 0
+    for index, (message, size, want_partial) in enumerate(
+            stream_messages(chunks, quantiles, partial_every), start=1):
+        await context.asend(message)
+        fields = _stream_reply(await context.arecv())
+        if size is None:
+            return fields
+
+        sent += size
+        if progress is not None:
+            progress(index, sent, fields if want_partial else None)
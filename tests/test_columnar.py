@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import columnar
+import envelope
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        "f8": [1.5, np.nan, -2.0, 0.0],
+        "f4": np.array([1, 2, 3, 4], dtype=np.float32),
+        "i8": np.array([1, -2, 3, 2 ** 40], dtype=np.int64),
+        "i4": np.array([1, 2, 3, 4], dtype=np.int32),
+        "flag": [True, False, True, False],
+        "when": pd.to_datetime(["2024-01-01", None, "2024-03-01", "1970-01-01"]).astype("datetime64[ns]"),
+        "label": pd.Categorical(["a", "b", None, "a"]),
+        "nullable_int": pd.array([1, None, 3, 4], dtype="Int64"),
+        "nullable_bool": pd.array([True, None, False, True], dtype="boolean"),
+    })
+
+
+def test_typed_columns_roundtrip(frame):
+    decoded = columnar.decode_frame(columnar.encode_frame(frame))
+    pd.testing.assert_frame_equal(decoded, frame)
+
+
+def test_strings_keep_missing_values():
+    frame = pd.DataFrame({"s": ["x", None, "y", "x"]})
+    decoded = columnar.decode_frame(columnar.encode_frame(frame))
+    assert decoded["s"].isna().tolist() == [False, True, False, False]
+    assert decoded["s"].dropna().tolist() == ["x", "y", "x"]
+
+
+def test_schema_and_buffers(frame):
+    fields = envelope.decode(columnar.encode_frame(frame)).fields
+    types = {c["name"]: c["type"] for c in fields["schema"]["columns"]}
+    assert types["f8"] == "float" and types["i4"] == "int" and types["label"] == "category"
+    assert types["nullable_int"] == "int" and types["nullable_bool"] == "bool"
+    names = list(frame.columns)
+    assert fields[f"c{names.index('i4')}"].dtype == np.dtype("<i4")
+    valid = fields[f"c{names.index('nullable_int')}.valid"]
+    np.testing.assert_array_equal(valid, [True, False, True, True])
+
+
+def test_index_is_kept_as_a_column():
+    frame = pd.DataFrame({"v": [1.0, 2.0]}, index=pd.Index([10, 20], name="id"))
+    decoded = columnar.decode_frame(columnar.encode_frame(frame, index=True))
+    assert decoded["id"].tolist() == [10, 20]
+
+
+def test_empty_frame():
+    frame = pd.DataFrame({"v": np.array([], dtype=np.float64)})
+    decoded = columnar.decode_frame(columnar.encode_frame(frame))
+    assert len(decoded) == 0 and list(decoded.columns) == ["v"]
+
+
+def test_table_formats(frame):
+    records = columnar.table(frame[["i4"]], "json")
+    assert records == [{"i4": 1}, {"i4": 2}, {"i4": 3}, {"i4": 4}]
+    packed = columnar.table(frame, "columnar")
+    assert packed.dtype == np.uint8
+    pd.testing.assert_frame_equal(columnar.decode_frame(packed.tobytes()), frame)
+    with pytest.raises(ValueError):
+        columnar.table(frame, "parquet")
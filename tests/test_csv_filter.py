@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from csv_filter import CursorStore, FilterCursor, iter_filtered
+
+
+@pytest.fixture
+def csv(tmp_path):
+    frame = pd.DataFrame({
+        "x": np.arange(100),
+        "value": np.arange(100) * 2.0,
+        "group": ["a", "b", "c", "d"] * 25,
+    })
+    path = tmp_path / "data.csv"
+    frame.to_csv(path, index=False)
+    return str(path), frame
+
+
+def drain(cursor):
+    pages = []
+    while not cursor.done:
+        pages.append(cursor.next_page())
+    return pages
+
+
+def test_pages_cover_every_match(csv):
+    path, frame = csv
+    cursor = FilterCursor(path, {"x": {"op": "ge", "value": 10}}, page_size=25, chunk_rows=7)
+    pages = drain(cursor)
+    assert [len(p) for p in pages] == [25, 25, 25, 15]
+    pd.testing.assert_frame_equal(pd.concat(pages), frame[frame.x >= 10])
+    assert cursor.scanned_rows == 100 and cursor.returned_rows == 90
+
+
+@pytest.mark.parametrize("condition, expected", [
+    ({"op": "gt", "value": 95}, [96, 97, 98, 99]),
+    ({"op": "le", "value": 2}, [0, 1, 2]),
+    ({"op": "between", "value": [10, 12]}, [10, 11, 12]),
+    ({"op": "in", "value": [3, 50]}, [3, 50]),
+    ({"op": "eq", "value": 7}, [7]),
+    ([{"op": "gt", "value": 5}, {"op": "lt", "value": 8}], [6, 7]),
+])
+def test_filter_ops(csv, condition, expected):
+    path, _ = csv
+    rows = pd.concat(drain(FilterCursor(path, {"x": condition})))
+    assert rows["x"].tolist() == expected
+
+
+def test_string_filters_and_unknown_filter_columns(csv):
+    path, _ = csv
+    filters = {"group": {"op": "eq", "value": "b"}, "missing": {"op": "gt", "value": 0}}
+    rows = pd.concat(drain(FilterCursor(path, filters)))
+    assert len(rows) == 25 and set(rows["group"]) == {"b"}
+
+
+def test_projection(csv):
+    path, _ = csv
+    cursor = FilterCursor(path, {"x": {"op": "lt", "value": 3}}, columns=["value", "group"])
+    assert list(cursor.next_page().columns) == ["value", "group"]
+
+
+def test_single_column_projection_as_a_string(csv):
+    # R sends a one-element character vector as a scalar string
+    path, _ = csv
+    page = FilterCursor(path, {"x": {"op": "lt", "value": 3}}, columns="value").next_page()
+    assert list(page.columns) == ["value"]
+    assert page["value"].tolist() == [0.0, 2.0, 4.0]
+
+
+def test_unknown_columns_and_ops(csv):
+    path, _ = csv
+    with pytest.raises(ValueError, match="Unknown columns: nope"):
+        FilterCursor(path, columns=["x", "nope"])
+    with pytest.raises(ValueError, match="Unknown filter op"):
+        FilterCursor(path, {"x": {"op": "like", "value": 1}})
+
+
+def test_numbers_from_r_are_coerced(csv):
+    path, _ = csv
+    cursor = FilterCursor(path, page_size=40.0, chunk_rows=16.0)
+    assert [len(p) for p in drain(cursor)] == [40, 40, 20]
+
+
+def test_parsed_frame_gives_the_same_pages(csv):
+    path, frame = csv
+    filters = {"value": {"op": "gt", "value": 51}}
+    from_file = pd.concat(drain(FilterCursor(path, filters, page_size=10, chunk_rows=9)))
+    from_frame = pd.concat(drain(FilterCursor(path, filters, page_size=10, chunk_rows=9, frame=frame)))
+    pd.testing.assert_frame_equal(from_file, from_frame)
+
+
+def test_iter_filtered(csv):
+    path, _ = csv
+    rows = sum(len(p) for p in iter_filtered(path, {"x": {"op": "lt", "value": 30}}, chunk_rows=8))
+    assert rows == 30
+
+
+class ClosingCursor(FilterCursor):
+    closed = False
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+
+def test_store_closes_evicted_and_closed_cursors(csv):
+    path, _ = csv
+    store = CursorStore(max_cursors=1)
+    first, second = ClosingCursor(path, page_size=10), ClosingCursor(path, page_size=10)
+    first.next_page()
+    store.add(first)
+    store.add(second)
+    assert first.closed and first.done
+    with pytest.raises(KeyError):
+        store.get(first.id)
+
+    assert store.close(second.id) and second.closed
+    assert not store.close(second.id)
+
+
+def test_store_expires_idle_cursors(csv):
+    path, _ = csv
+    store = CursorStore(ttl=0)
+    cursor = ClosingCursor(path)
+    store.add(cursor)
+    cursor.last_used -= 1
+    with pytest.raises(KeyError):
+        store.get(cursor.id)
+    assert cursor.closed
@@ -0,0 +1,95 @@
+import json
+
+import numpy as np
+import pytest
+
+import envelope
+
+
+def roundtrip(value):
+    return envelope.decode(envelope.encode(envelope.MSG_DATA, {"x": value}))["x"]
+
+
+@pytest.mark.parametrize("dtype", ["<f8", "<f4", "<i4", "<i8", "|u1", "?"])
+def test_numeric_arrays_keep_dtype_and_shape(dtype):
+    array = (np.arange(12) % 3).astype(dtype).reshape(3, 4)
+    decoded = roundtrip(array)
+    assert decoded.dtype == np.dtype(dtype)
+    np.testing.assert_array_equal(decoded, array)
+
+
+def test_scalars():
+    assert roundtrip(3) == 3
+    assert roundtrip(2.5) == 2.5
+    assert roundtrip(True) is True
+    assert roundtrip(np.float32(1.5)) == 1.5
+    assert roundtrip("text") == "text"
+
+
+def test_big_endian_arrays_are_swapped():
+    decoded = roundtrip(np.arange(4, dtype=">f8"))
+    assert decoded.dtype == np.dtype("<f8")
+    np.testing.assert_array_equal(decoded, np.arange(4.0))
+
+
+def test_string_lists_and_arrays():
+    assert roundtrip(["a", "bc", ""]) == ["a", "bc", ""]
+    assert roundtrip(np.array(["lo", "hi"])) == ["lo", "hi"]
+    assert roundtrip(np.array(["lo", "hi"], dtype=object)) == ["lo", "hi"]
+    assert roundtrip(np.array([b"x", b"y"])) == ["x", "y"]
+
+
+def test_other_object_arrays_go_as_json():
+    assert roundtrip(np.array([1, "a", None], dtype=object)) == [1, "a", None]
+    assert roundtrip(np.array([["a", "b"], ["c", "d"]])) == [["a", "b"], ["c", "d"]]
+
+
+def test_equal_length_rows_become_a_matrix():
+    decoded = roundtrip([[1, 2], [3, 4]])
+    assert decoded.shape == (2, 2)
+    np.testing.assert_array_equal(decoded, [[1, 2], [3, 4]])
+
+
+@pytest.mark.parametrize("ragged", [
+    [[1, 2], [3]],
+    [1, [2, 3]],
+    [[[1], [1, 2]], [[1], [1]]],
+])
+def test_ragged_lists_fall_back_to_json(ragged):
+    assert roundtrip(ragged) == ragged
+
+
+def test_json_fields_accept_numpy_values():
+    value = {"mean": np.float64(1.5), "n": np.int64(3), "v": np.arange(2)}
+    assert roundtrip(value) == {"mean": 1.5, "n": 3, "v": [0, 1]}
+
+
+def test_numeric_fields_are_views_into_the_buffer():
+    buf = envelope.encode(envelope.MSG_DATA, {"data": np.arange(1000.0)})
+    data = envelope.decode(buf)["data"]
+    assert not data.flags.owndata
+
+
+def test_pack_reply_picks_the_message_type():
+    ok = envelope.decode(envelope.pack_reply({"status": "success", "v": 1}, True))
+    failed = envelope.decode(envelope.pack_reply({"status": "error", "message": "no"}, True))
+    assert ok.msg_type == envelope.MSG_RESULT
+    assert failed.msg_type == envelope.MSG_ERROR
+
+
+def test_pack_reply_legacy_json():
+    reply = envelope.pack_reply({"scaled": np.arange(3.0), "n": np.int64(3)}, False)
+    assert json.loads(reply) == {"scaled": [0.0, 1.0, 2.0], "n": 3}
+
+
+def test_unpack_request_both_formats():
+    assert envelope.unpack_request(b'{"action": "list"}') == ({"action": "list"}, False)
+    fields, is_envelope = envelope.unpack_request(
+        envelope.encode(envelope.MSG_COMMAND, {"action": "list"}))
+    assert is_envelope and fields == {"action": "list"}
+
+
+def test_truncated_envelope_is_rejected():
+    buf = envelope.encode(envelope.MSG_DATA, {"data": np.arange(100.0)})
+    with pytest.raises(envelope.EnvelopeError):
+        envelope.decode(buf[:-16])
@@ -0,0 +1,193 @@
+import os
+import signal
+import subprocess
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import envelope
+from r_pool import RPool, standin_worker_command
+
+pytestmark = pytest.mark.skipif(not hasattr(signal, "SIGSTOP"), reason="needs SIGSTOP")
+
+DATA = envelope.encode(envelope.MSG_DATA, {"data": np.arange(10.0)})
+COMMAND = envelope.encode(envelope.MSG_COMMAND, {"command": "x"})
+
+
+class Reply:
+    """A request callback that can be waited on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = self.error = self.at = None
+
+    def __call__(self, value, error):
+        self.value, self.error, self.at = value, error, time.perf_counter()
+        self.event.set()
+
+    def wait(self, timeout=10.0):
+        assert self.event.wait(timeout), "no reply"
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+@pytest.fixture
+def standins(tmp_path):
+    """start(n, work_ms) runs n r_standin.py workers; returns {address: process}"""
+    processes = {}
+
+    def start(n, work_ms=0.0):
+        started = {}
+        for _ in range(n):
+            address = f"ipc://{tmp_path}/r{len(processes)}.ipc"
+            processes[address] = started[address] = subprocess.Popen(
+                standin_worker_command(address, work_ms),
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return started
+
+    yield start
+    for process in processes.values():
+        process.send_signal(signal.SIGCONT)
+        process.kill()
+        process.wait()
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(addresses, **kwargs):
+        pool = RPool(deliver=lambda fn: fn(), **kwargs).start()
+        pools.append(pool)
+        connected = Reply()
+        pool.connect(list(addresses), connected)
+        assert sorted(connected.wait()) == sorted(addresses)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def completed(pool):
+    return {w["address"]: w["completed"] for w in pool.stats()}
+
+
+def test_stats_requests_spread_over_workers(standins, make_pool):
+    workers = standins(3, work_ms=50)
+    pool = make_pool(workers, per_worker=1)
+
+    replies = [Reply() for _ in range(6)]
+    for reply in replies:
+        pool.request(DATA, reply)
+    for reply in replies:
+        assert envelope.decode(reply.wait()).fields["mean"] == pytest.approx(4.5)
+    assert sorted(completed(pool).values()) == [2, 2, 2]
+
+
+def test_pinned_requests_stay_on_the_primary(standins, make_pool):
+    pool = make_pool(standins(3), per_worker=1)
+
+    replies = [Reply() for _ in range(5)]
+    for reply in replies:
+        pool.request(COMMAND, reply, pinned=True, idempotent=False)
+    for reply in replies:
+        reply.wait()
+
+    primary = [w for w in pool.stats() if w["primary"]]
+    assert len(primary) == 1 and primary[0]["completed"] == 5
+    assert sum(completed(pool).values()) == 5
+
+
+def test_pinned_backlog_does_not_hold_up_stateless_requests(standins, make_pool):
+    pool = make_pool(standins(3, work_ms=200), per_worker=1)
+
+    pinned = [Reply() for _ in range(3)]
+    stateless = [Reply() for _ in range(2)]
+    for reply in pinned:
+        pool.request(COMMAND, reply, pinned=True, idempotent=False)
+    for reply in stateless:
+        pool.request(DATA, reply)
+    for reply in pinned + stateless:
+        reply.wait()
+
+    # The stats requests ran on the idle workers while the primary worked
+    # through the pinned ones
+    assert max(r.at for r in stateless) < pinned[1].at
+
+
+def test_primary_moves_when_it_fails(standins, make_pool):
+    workers = standins(2)
+    moved = []
+    pool = make_pool(workers, on_primary=lambda address, error: moved.append(address))
+
+    pool.request(COMMAND, first := Reply(), pinned=True)
+    first.wait()
+    old = next(w["address"] for w in pool.stats() if w["primary"])
+    workers[old].kill()
+
+    deadline = time.monotonic() + 5
+    while not moved and time.monotonic() < deadline:
+        pool.request(COMMAND, reply := Reply(), pinned=True)
+        reply.event.wait(5)
+    new = next(a for a in workers if a != old)
+    assert moved == [new]
+    assert next(w["address"] for w in pool.stats() if w["primary"]) == new
+
+
+def test_idle_worker_that_stops_answering_is_marked_down(standins, make_pool):
+    workers = standins(2)
+    down = threading.Event()
+    health = []
+
+    def on_health(address, reason):
+        health.append((address, reason))
+        down.set()
+
+    pool = make_pool(workers, health_interval=0.1, ping_timeout=0.2, max_missed=2,
+                     on_health=on_health)
+    hung = next(iter(workers))
+    workers[hung].send_signal(signal.SIGSTOP)
+
+    assert down.wait(5)
+    assert health[0][0] == hung and "heartbeat" in health[0][1]
+
+    # Work goes to the worker that is left
+    replies = [Reply() for _ in range(3)]
+    for reply in replies:
+        pool.request(DATA, reply)
+    for reply in replies:
+        reply.wait()
+    assert completed(pool)[hung] == 0
+
+
+def test_busy_worker_that_hangs_is_marked_down_before_the_deadline(standins, make_pool):
+    workers = standins(2, work_ms=200)
+    pool = make_pool(workers, timeout=60, health_interval=0.1, ping_timeout=0.2,
+                     max_busy_missed=4)
+
+    pool.request(COMMAND, reply := Reply(), pinned=True, idempotent=False)
+    time.sleep(0.05)
+    primary = next(w["address"] for w in pool.stats() if w["primary"])
+    workers[primary].send_signal(signal.SIGSTOP)
+
+    started = time.perf_counter()
+    with pytest.raises(ConnectionError, match="heartbeat"):
+        reply.wait()
+    assert reply.at - started < 5
+    assert not next(w for w in pool.stats() if w["address"] == primary)["healthy"]
+
+
+def test_busy_worker_that_keeps_answering_stays_up(standins, make_pool):
+    pool = make_pool(standins(1, work_ms=100), health_interval=0.05, ping_timeout=0.1,
+                     max_missed=1, max_busy_missed=3, per_worker=1)
+
+    # Back-to-back requests keep R busy for well over max_busy_missed ping
+    # timeouts, but it answers pings between them
+    for _ in range(10):
+        pool.request(COMMAND, reply := Reply(), pinned=True)
+        reply.wait()
+    assert pool.stats()[0]["healthy"] and pool.stats()[0]["failures"] == 0
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+import envelope
+from streaming_stats import RunningStats, iter_chunks, stream_messages
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000, 10 ** 6])
+def test_running_stats_match_numpy(chunk_size):
+    data = np.random.default_rng(0).normal(100, 15, 20000)
+    stats = RunningStats()
+    for chunk in iter_chunks(data, chunk_size):
+        stats.update(chunk)
+
+    assert stats.count == data.size
+    assert stats.mean == pytest.approx(np.mean(data), rel=1e-12)
+    assert stats.variance() == pytest.approx(np.var(data), rel=1e-9)
+    assert stats.variance(ddof=1) == pytest.approx(np.var(data, ddof=1), rel=1e-9)
+    assert (stats.min, stats.max) == (data.min(), data.max())
+
+
+def test_merging_is_stable_with_a_large_offset():
+    data = 1e9 + np.random.default_rng(1).random(10000)
+    stats = RunningStats()
+    for chunk in iter_chunks(data, 333):
+        stats.update(chunk)
+    assert stats.variance() == pytest.approx(np.var(data), rel=1e-6)
+
+
+def test_empty_chunks_and_empty_stream():
+    stats = RunningStats()
+    stats.update([])
+    result = stats.to_dict()
+    assert result["length"] == 0 and np.isnan(result["mean"]) and np.isnan(result["std"])
+
+    stats.update([1.0, 3.0])
+    stats.update(np.array([]))
+    assert stats.to_dict()["mean"] == 2.0
+
+
+def test_quantiles_exact_while_the_reservoir_holds_everything():
+    data = np.random.default_rng(2).random(5000)
+    stats = RunningStats(quantile_sample=8192, seed=0)
+    for chunk in iter_chunks(data, 999):
+        stats.update(chunk)
+    np.testing.assert_allclose(stats.quantiles([0.25, 0.5, 0.75]),
+                               np.quantile(data, [0.25, 0.5, 0.75]))
+
+
+def test_quantiles_approximate_from_the_reservoir():
+    data = np.random.default_rng(3).random(200000)
+    stats = RunningStats(quantile_sample=8192, seed=0)
+    for chunk in iter_chunks(data, 10000):
+        stats.update(chunk)
+    assert stats.quantiles([0.5])[0] == pytest.approx(0.5, abs=0.03)
+
+
+def test_iter_chunks_yields_views():
+    data = np.arange(10.0)
+    chunks = list(iter_chunks(data, 4))
+    assert [len(c) for c in chunks] == [4, 4, 2]
+    assert all(np.shares_memory(c, data) for c in chunks)
+
+
+def test_stream_messages():
+    chunks = [np.arange(3.0), np.arange(2.0)]
+    messages = list(stream_messages(chunks, quantiles=[0.5], partial_every=2))
+    assert [(size, partial) for _, size, partial in messages] == [(3, False), (2, True), (None, False)]
+
+    fields = [envelope.decode(m).fields for m, _, _ in messages]
+    assert len({f["stream"] for f in fields}) == 1
+    assert "quantiles" in fields[0] and "quantiles" not in fields[1]
+    assert fields[-1]["final"] is True